@@ -0,0 +1,460 @@
+"""
+Asynchronous AWS log collection built on aiobotocore.
+"""
+
+import asyncio
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta
+
+from scope.aws.collector import (
+    crawl_step, date_range, is_region_name, parse_log_records, record_matches, report_failed_keys
+)
+from scope.aws.retry import RetryPolicy
+from scope.common.batching import RecordBatcher
+
+try:
+    from aiobotocore.config import AioConfig
+    from aiobotocore.session import get_session
+except ImportError:
+    get_session = None
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stream of work items on a queue
+_DONE = object()
+
+class AsyncAWSLogCollector:
+    """
+    Collects CloudTrail logs and resource inventories with asyncio.
+
+    This is the asynchronous counterpart of AWSLogCollector. All requests run
+    on a single event loop, with up to max_concurrency of them in flight at
+    once, and results are exposed as async generators so the collector can be
+    embedded in other asyncio services.
+    """
+
+    def __init__(self, aws_access_key=None, aws_secret_key=None, aws_session_token=None, region='us-east-1',
+                 max_concurrency=256, endpoint_url=None):
+        """
+        Initialize the asynchronous AWS log collector.
+
+        Args:
+            aws_access_key (str, optional): AWS access key. If not provided, will use environment variables or AWS config.
+            aws_secret_key (str, optional): AWS secret key. If not provided, will use environment variables or AWS config.
+            aws_session_token (str, optional): AWS session token for temporary credentials.
+            region (str, optional): AWS region to use. Defaults to 'us-east-1'.
+            max_concurrency (int, optional): Maximum number of requests in flight at once.
+            endpoint_url (str, optional): Custom endpoint, e.g. a local S3-compatible service.
+
+        Raises:
+            ImportError: If aiobotocore is not installed
+        """
+        if get_session is None:
+            raise ImportError("The async collector requires aiobotocore: pip install scope-forensics[aio]")
+
+        self.session = get_session()
+        self.credentials = {
+            'aws_access_key_id': aws_access_key,
+            'aws_secret_access_key': aws_secret_key,
+            'aws_session_token': aws_session_token
+        }
+        self.region = region
+        self.max_concurrency = max_concurrency
+        self.endpoint_url = endpoint_url
+        self.config = AioConfig(max_pool_connections=max_concurrency)
+
+    def client(self, service_name, region=None):
+        """
+        Create an aiobotocore client, to be used as an async context manager.
+
+        Args:
+            service_name (str): AWS service name, e.g. 's3'.
+            region (str, optional): Region for the client. Defaults to the collector's region.
+
+        Returns:
+            ClientCreatorContext: Async context manager yielding the client.
+        """
+        return self.session.create_client(
+            service_name,
+            region_name=region or self.region,
+            endpoint_url=self.endpoint_url,
+            config=self.config,
+            **self.credentials
+        )
+
+    async def iter_s3_batches(self, bucket_name, prefix="", start_date=None, end_date=None, regions=None,
+                              batch_size=1000, memory_budget=None, accounts=None, all_accounts=False,
+                              event_names=None, event_sources=None, max_attempts=5, failed_keys_file=None):
+        """
+        Collect CloudTrail logs from an S3 bucket.
+
+        Takes the same selection options as AWSLogCollector.collect_from_s3.
+        Downloads of all accounts, regions and days are spread over
+        max_concurrency worker tasks fed from a bounded queue of keys.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket containing CloudTrail logs.
+            prefix (str, optional): CloudTrail prefix, e.g. 'AWSLogs/123456789012/CloudTrail/'.
+                If empty, the first account found in the bucket is used.
+            start_date (str, optional): Start date in YYYY-MM-DD format. Defaults to 7 days ago.
+            end_date (str, optional): End date in YYYY-MM-DD format. Defaults to today.
+            regions (list, optional): List of AWS regions to collect logs from. If None, collects from all regions.
+            batch_size (int, optional): Number of events to process in memory before yielding a batch.
+            memory_budget (int, optional): Estimated size in bytes a batch may occupy in memory.
+            accounts (list, optional): Account IDs to collect from an organization or multi-account bucket.
+            all_accounts (bool, optional): Collect from every account found in the bucket.
+            event_names (list, optional): Only collect events with one of these eventName values.
+            event_sources (list, optional): Only collect events with one of these eventSource values.
+            max_attempts (int, optional): Attempts per download. Throttling and transient errors are
+                retried with exponential backoff, like in the synchronous collector.
+            failed_keys_file (str, optional): File to write the s3:// URLs of objects that could not
+                be collected, so they can be retried later.
+
+        Returns:
+            async generator: Yields batches of raw CloudTrail events.
+        """
+        filters = {}
+        if event_names:
+            filters['eventName'] = set(event_names)
+        if event_sources:
+            filters['eventSource'] = set(event_sources)
+
+        days = date_range(start_date, end_date)
+        policy = RetryPolicy(max_attempts=max_attempts)
+        failed = {'units': [], 'keys': []}
+        semaphore = asyncio.Semaphore(max(1, self.max_concurrency // 4))
+        loop = asyncio.get_running_loop()
+
+        async with self.client('s3') as s3:
+            if accounts or all_accounts or not prefix:
+                layout = await self.discover_accounts(bucket_name, s3=s3)
+                if accounts:
+                    selected = [account_id for account_id in sorted(layout) if account_id in accounts]
+                elif all_accounts:
+                    selected = sorted(layout)
+                else:
+                    selected = sorted(layout)[:1]
+                sources = [(account_id, layout[account_id]['prefix'], layout[account_id]['regions'])
+                           for account_id in selected]
+            else:
+                if not prefix.endswith('/'):
+                    prefix += '/'
+                children = await self._list_child_prefixes(s3, bucket_name, prefix, semaphore)
+                found_regions = [child.rstrip('/').split('/')[-1] for child in children]
+                sources = [(None, prefix, [region for region in found_regions if is_region_name(region)])]
+
+            units = [
+                (f"{source_prefix}{region}/{day.strftime('%Y/%m/%d')}/", region)
+                for _, source_prefix, source_regions in sources
+                for region in source_regions
+                if not regions or region in regions
+                for day in days
+            ]
+            logger.info(f"Collecting {len(units)} region-days from {len(sources)} account(s) in bucket {bucket_name}")
+
+            keys = asyncio.Queue(maxsize=self.max_concurrency * 2)
+            results = asyncio.Queue(maxsize=self.max_concurrency)
+
+            # Listings get their own limit so that listers blocked on a full key queue
+            # never hold up the fetch workers draining it
+            async def list_unit(unit_prefix, region):
+                async with semaphore:
+                    paginator = s3.get_paginator('list_objects_v2')
+                    async for page in paginator.paginate(Bucket=bucket_name, Prefix=unit_prefix):
+                        for obj in page.get('Contents', []):
+                            if obj['Key'].endswith('.gz'):
+                                await keys.put((obj['Key'], region))
+
+            async def list_all():
+                # Let every lister finish before the end markers go out: a lister still
+                # running after the workers have stopped would block forever on a full queue
+                try:
+                    listed = await asyncio.gather(*(list_unit(unit_prefix, region) for unit_prefix, region in units),
+                                                  return_exceptions=True)
+                finally:
+                    for _ in range(self.max_concurrency):
+                        await keys.put(_DONE)
+                errors = [result for result in listed if isinstance(result, Exception)]
+                if errors:
+                    raise errors[0]
+
+            async def download(key):
+                resp = await s3.get_object(Bucket=bucket_name, Key=key)
+                async with resp['Body'] as stream:
+                    return await stream.read()
+
+            async def fetch_worker():
+                while True:
+                    item = await keys.get()
+                    if item is _DONE:
+                        await results.put(_DONE)
+                        return
+                    key, region = item
+                    try:
+                        raw_body = await policy.call_async(download, key)
+                        # Decompression and parsing are CPU work, keep them off the event loop
+                        records, source_bytes = await loop.run_in_executor(None, _parse_gzip_log, raw_body, region)
+                        if filters:
+                            records = [record for record in records if record_matches(record, filters)]
+                        await results.put((records, source_bytes))
+                    except Exception as e:
+                        logger.error(f"Error processing file {key}: {e}")
+                        failed['keys'].append((None, key))
+
+            tasks = [asyncio.ensure_future(list_all())]
+            tasks.extend(asyncio.ensure_future(fetch_worker()) for _ in range(self.max_concurrency))
+
+            batcher = RecordBatcher(batch_size=batch_size, memory_budget=memory_budget)
+            total_events = 0
+            finished = 0
+            try:
+                while finished < self.max_concurrency:
+                    result = await results.get()
+                    if result is _DONE:
+                        finished += 1
+                        continue
+                    records, source_bytes = result
+                    total_events += len(records)
+                    for batch in batcher.add(records, source_bytes):
+                        yield batch
+                for batch in batcher.flush():
+                    yield batch
+                report_failed_keys(bucket_name, failed, failed_keys_file)
+                # Surface listing errors
+                await tasks[0]
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            logger.info(f"Collected {total_events} CloudTrail events from bucket {bucket_name}")
+
+    async def discover_accounts(self, bucket_name, max_depth=3, s3=None):
+        """
+        Find the CloudTrail prefix and regions of every account in a bucket.
+
+        Each level of prefixes is listed concurrently, following the same
+        layout rules as AWSLogCollector.discover_bucket_structure.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket to explore.
+            max_depth (int, optional): Maximum number of levels to descend looking for an AWSLogs/ prefix.
+            s3 (optional): Existing aiobotocore S3 client to use.
+
+        Returns:
+            dict: Mapping of account ID to {'prefix': ..., 'regions': [...]}
+        """
+        if s3 is None:
+            async with self.client('s3') as s3:
+                return await self.discover_accounts(bucket_name, max_depth, s3)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        accounts = {}
+        top_prefixes = await self._list_child_prefixes(s3, bucket_name, '', semaphore)
+        frontier = [(prefix, 1) for prefix in top_prefixes]
+
+        while frontier:
+            listings = await asyncio.gather(
+                *(self._list_child_prefixes(s3, bucket_name, prefix, semaphore) for prefix, _ in frontier)
+            )
+            next_frontier = []
+            for (prefix, depth), children in zip(frontier, listings):
+                next_frontier.extend(crawl_step(prefix, depth, children, accounts, max_depth))
+            frontier = next_frontier
+
+        logger.info(f"Found {len(accounts)} accounts with CloudTrail logs in bucket {bucket_name}")
+        return accounts
+
+    async def iter_management_events(self, start_time=None, end_time=None, lookup_attributes=None,
+                                     regions=None, time_slices=1):
+        """
+        Collect CloudTrail management events using the LookupEvents API.
+
+        Every region, and optionally every slice of the time range, is paged
+        through concurrently. LookupEvents is rate limited per region, so
+        splitting into more slices mainly helps with multiple regions.
+
+        Args:
+            start_time (datetime, optional): Start time for events. Defaults to 7 days ago.
+            end_time (datetime, optional): End time for events. Defaults to now.
+            lookup_attributes (list, optional): List of attribute dictionaries to filter events.
+            regions (list, optional): Regions to query. Defaults to the collector's region.
+            time_slices (int, optional): Number of equal time slices to query in parallel per region.
+
+        Returns:
+            async generator: Yields pages (lists) of CloudTrail events.
+
+        Raises:
+            ValueError: If time_slices is less than 1
+        """
+        if time_slices < 1:
+            raise ValueError(f"time_slices must be at least 1, got {time_slices}")
+        if not start_time:
+            start_time = datetime.now() - timedelta(days=7)
+        if not end_time:
+            end_time = datetime.now()
+
+        slice_length = (end_time - start_time) / time_slices
+        queries = [
+            (region, start_time + slice_length * i, start_time + slice_length * (i + 1))
+            for region in (regions or [self.region])
+            for i in range(time_slices)
+        ]
+        pages = asyncio.Queue(maxsize=self.max_concurrency)
+
+        async def query(region, slice_start, slice_end):
+            params = {'StartTime': slice_start, 'EndTime': slice_end}
+            if lookup_attributes:
+                params['LookupAttributes'] = lookup_attributes
+            try:
+                async with self.client('cloudtrail', region) as cloudtrail:
+                    paginator = cloudtrail.get_paginator('lookup_events')
+                    async for page in paginator.paginate(**params):
+                        await pages.put(page.get('Events', []))
+            except Exception as e:
+                logger.error(f"Error retrieving management events in {region}: {e}")
+            finally:
+                await pages.put(_DONE)
+
+        tasks = [asyncio.ensure_future(query(*q)) for q in queries]
+        total_events = 0
+        finished = 0
+        try:
+            while finished < len(tasks):
+                page = await pages.get()
+                if page is _DONE:
+                    finished += 1
+                    continue
+                total_events += len(page)
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        logger.info(f"Collected {total_events} management events")
+
+    async def iter_resources(self, resource_types=None, regions=None):
+        """
+        Discover AWS resources across regions concurrently.
+
+        Yields resources in the same format as AWSLogCollector.discover_resources.
+
+        Args:
+            resource_types (list, optional): Any of 'ec2', 's3', 'iam_users', 'iam_roles', 'lambda', 'rds'.
+                If None, discovers all supported resource types.
+            regions (list, optional): Regions to search for regional resources. If None, searches all
+                regions available for each service.
+
+        Returns:
+            async generator: Yields resource dicts.
+        """
+        if not resource_types:
+            resource_types = ['ec2', 's3', 'iam_users', 'iam_roles', 'lambda', 'rds']
+
+        resources = asyncio.Queue(maxsize=self.max_concurrency)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run(service_name, region, fetch):
+            try:
+                async with semaphore, self.client(service_name, region) as client:
+                    async for resource in fetch(client, region):
+                        await resources.put(resource)
+            except Exception as e:
+                logger.error(f"Error discovering {service_name} resources in {region or 'global'}: {e}")
+            finally:
+                await resources.put(_DONE)
+
+        jobs = []
+        for resource_type in resource_types:
+            service_name, fetch, regional = _RESOURCE_FETCHERS[resource_type]
+            if regional:
+                service_regions = regions or self.session.get_available_regions(service_name)
+                jobs.extend((service_name, region, fetch) for region in service_regions)
+            else:
+                jobs.append((service_name, None, fetch))
+
+        tasks = [asyncio.ensure_future(run(*job)) for job in jobs]
+        finished = 0
+        try:
+            while finished < len(tasks):
+                resource = await resources.get()
+                if resource is _DONE:
+                    finished += 1
+                    continue
+                yield resource
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _list_child_prefixes(self, s3, bucket_name, prefix, semaphore):
+        children = []
+        async with semaphore:
+            paginator = s3.get_paginator('list_objects_v2')
+            async for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+                children.extend(common_prefix.get('Prefix') for common_prefix in page.get('CommonPrefixes', []))
+        return children
+
+def _parse_gzip_log(raw_body, region):
+    file_data = gzip.decompress(raw_body).decode('utf-8')
+    return parse_log_records(file_data, region), len(file_data)
+
+def _serialize(value):
+    return json.loads(json.dumps(value, default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v)))
+
+def _resource(resource_id, resource_type, name, details, region):
+    return {
+        'resource_id': resource_id,
+        'resource_type': resource_type,
+        'resource_name': name,
+        'resource_details': _serialize(details),
+        'aws_region': region,
+    }
+
+async def _fetch_ec2_instances(client, region):
+    async for page in client.get_paginator('describe_instances').paginate():
+        for reservation in page.get('Reservations', []):
+            for instance in reservation.get('Instances', []):
+                name = next((tag.get('Value') for tag in instance.get('Tags', []) if tag.get('Key') == 'Name'), None)
+                resource_region = instance.get('Placement', {}).get('AvailabilityZone', region)[:-1]
+                yield _resource(instance.get('InstanceId'), 'EC2', name or instance.get('InstanceId'),
+                                instance, resource_region)
+
+async def _fetch_s3_buckets(client, region):
+    response = await client.list_buckets()
+    for bucket in response.get('Buckets', []):
+        location = await client.get_bucket_location(Bucket=bucket['Name'])
+        yield _resource(bucket['Name'], 'S3', bucket['Name'], bucket,
+                        location.get('LocationConstraint') or 'us-east-1')
+
+async def _fetch_iam_users(client, region):
+    async for page in client.get_paginator('list_users').paginate():
+        for user in page.get('Users', []):
+            yield _resource(user.get('UserId'), 'IAM User', user.get('UserName'), user, 'global')
+
+async def _fetch_iam_roles(client, region):
+    async for page in client.get_paginator('list_roles').paginate():
+        for role in page.get('Roles', []):
+            yield _resource(role.get('RoleId'), 'IAM Role', role.get('RoleName'), role, 'global')
+
+async def _fetch_lambda_functions(client, region):
+    async for page in client.get_paginator('list_functions').paginate():
+        for function in page.get('Functions', []):
+            yield _resource(function.get('FunctionArn'), 'Lambda Function', function.get('FunctionName'),
+                            function, region)
+
+async def _fetch_rds_instances(client, region):
+    async for page in client.get_paginator('describe_db_instances').paginate():
+        for instance in page.get('DBInstances', []):
+            yield _resource(instance.get('DBInstanceIdentifier'), 'RDS', instance.get('DBInstanceIdentifier'),
+                            instance, region)
+
+# resource type -> (service name, fetch function, whether the service is regional)
+_RESOURCE_FETCHERS = {
+    'ec2': ('ec2', _fetch_ec2_instances, True),
+    's3': ('s3', _fetch_s3_buckets, False),
+    'iam_users': ('iam', _fetch_iam_users, False),
+    'iam_roles': ('iam', _fetch_iam_roles, False),
+    'lambda': ('lambda', _fetch_lambda_functions, True),
+    'rds': ('rds', _fetch_rds_instances, True),
+}
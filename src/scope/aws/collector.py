@@ -3,15 +3,375 @@ AWS log collection module for retrieving CloudTrail logs.
 """
 
 import boto3
+import calendar
 import json
 import gzip
 import logging
 import os
-from datetime import datetime, timedelta
+import re
+import tarfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import date, datetime, timedelta, timezone
+from itertools import chain, zip_longest
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from scope.common.archives import is_archive, iter_archive_members
+from scope.common.batching import RecordBatcher
+from scope.common.pipeline import bounded_map
+from scope.aws.follow import FollowState, PollInterval, utc_now
+from scope.aws.integrity import DigestValidator, hash_log_object, is_digest_key
+from scope.aws.notifications import parse_s3_notification
+from scope.aws.retry import AdaptiveConcurrencyLimiter, RetryPolicy, is_retryable_error
+
 logger = logging.getLogger(__name__)
 
+ACCOUNT_ID_PATTERN = re.compile(r'^\d{12}$')
+ORG_ID_PATTERN = re.compile(r'^o-[a-z0-9]{10,32}$')
+REGION_PATTERN = re.compile(r'^[a-z]{2}(-gov|-iso[a-z]?)?-[a-z]+-\d+$')
+
+# <account>_CloudTrail_<region>_<YYYYMMDDTHHMMZ>_<unique string>.json.gz
+LOG_FILENAME_PATTERN = re.compile(r'^(\d{12})_CloudTrail_([a-z0-9-]+)_(\d{8}T\d{4}Z)_')
+
+# Seconds before the newest file or event processed that are polled again when following
+FOLLOW_LOOKBACK_SECONDS = 15 * 60
+
+# Failed attempts after which a followed log file is given up on
+FOLLOW_MAX_FAILURES = 3
+
+# Longest wait in seconds before receiving again after SQS receives kept failing
+SQS_MAX_RECEIVE_BACKOFF = 60
+
+# Seconds to wait for IAM to generate a credential report
+CREDENTIAL_REPORT_TIMEOUT = 60
+
+# S3 Select error codes meaning the feature is unusable for this bucket or account
+S3_SELECT_UNSUPPORTED_ERRORS = {'MethodNotAllowed', 'NotImplemented', 'AccessDenied', 'UnsupportedOperation'}
+
+def record_matches(record, filters):
+    """
+    Check whether a raw CloudTrail record matches all event filters.
+    
+    Args:
+        record (dict): Raw CloudTrail record
+        filters (dict): Mapping of record field to a set of accepted values
+        
+    Returns:
+        bool: True if every filtered field has one of its accepted values
+    """
+    return all(record.get(field) in values for field, values in filters.items())
+
+def date_range(start_date=None, end_date=None):
+    """
+    List the days between two dates, inclusive.
+    
+    Args:
+        start_date (str, optional): Start date in YYYY-MM-DD format. Defaults to 7 days ago.
+        end_date (str, optional): End date in YYYY-MM-DD format. Defaults to today.
+        
+    Returns:
+        list: date objects from start_date to end_date
+    """
+    # Set default dates if not provided
+    if not start_date:
+        start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    if not end_date:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        
+    current_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+    end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
+    
+    days = []
+    while current_date <= end_date_obj:
+        days.append(current_date)
+        current_date += timedelta(days=1)
+    return days
+
+def parse_log_records(file_data, region=None):
+    """
+    Parse the records of a decompressed CloudTrail log file.
+    
+    Args:
+        file_data (str): JSON content of the log file
+        region (str, optional): Region added to records without an awsRegion
+        
+    Returns:
+        list: Raw CloudTrail records
+        
+    Raises:
+        json.JSONDecodeError: If the file is not valid JSON
+    """
+    records = json.loads(file_data).get("Records", [])
+    
+    # Add region information to each record
+    if region:
+        for record in records:
+            if 'awsRegion' not in record:
+                record['awsRegion'] = region
+                
+    return records
+
+def saved_log_filename(key):
+    """
+    Get the name under which a downloaded log object is saved decompressed in output_dir.
+    
+    Args:
+        key (str): S3 key of the log object
+        
+    Returns:
+        str: File name of the saved copy
+    """
+    return os.path.basename(key)[:-3] + '.json'  # Remove .gz extension
+
+def parse_log_filename(name):
+    """
+    Parse the account, region and delivery time from a CloudTrail log file name.
+    
+    Args:
+        name (str): File name or path, e.g. '123456789012_CloudTrail_us-east-1_20240301T0105Z_abc.json.gz'
+        
+    Returns:
+        tuple or None: (account ID, region, delivery datetime), or None if the name is not
+            in the CloudTrail format
+    """
+    match = LOG_FILENAME_PATTERN.match(os.path.basename(name))
+    if not match:
+        return None
+    account_id, region, timestamp = match.groups()
+    try:
+        return account_id, region, datetime.strptime(timestamp, '%Y%m%dT%H%MZ')
+    except ValueError:
+        return None
+
+def log_dir_in_range(parts, first_day=None, last_day=None, regions=None):
+    """
+    Check whether a directory of the CloudTrail layout may hold logs of the selected days and regions.
+    
+    Only directories ending in <region>[/YYYY[/MM[/DD]]] are judged; any other
+    directory may hold wanted logs.
+    
+    Args:
+        parts (list): Components of the directory path
+        first_day (date, optional): First day to keep
+        last_day (date, optional): Last day to keep
+        regions (list, optional): Regions to keep
+        
+    Returns:
+        bool: False if the directory can be skipped
+    """
+    date_parts = []
+    i = len(parts)
+    while i > 0 and len(date_parts) < 3 and parts[i - 1].isdigit():
+        date_parts.insert(0, parts[i - 1])
+        i -= 1
+    if i == 0 or not is_region_name(parts[i - 1]):
+        return True
+    if regions and parts[i - 1] not in regions:
+        return False
+    if not date_parts or (first_day is None and last_day is None):
+        return True
+        
+    try:
+        year = int(date_parts[0])
+        first_month, last_month = (int(date_parts[1]),) * 2 if len(date_parts) > 1 else (1, 12)
+        low = date(year, first_month, int(date_parts[2]) if len(date_parts) > 2 else 1)
+        high = date(year, last_month, int(date_parts[2]) if len(date_parts) > 2 else
+                    calendar.monthrange(year, last_month)[1])
+    except ValueError:
+        return True
+    return not ((last_day and low > last_day) or (first_day and high < first_day))
+
+def scan_log_files(directory, recursive=False, dir_filter=None, workers=1):
+    """
+    List the files of a directory tree with os.scandir.
+    
+    With one worker, files come in the same order as from os.walk. With more,
+    the directories of each level are listed in parallel, which pays off on
+    network file systems, and files come level by level.
+    
+    Args:
+        directory (str): Directory to list
+        recursive (bool, optional): Whether to descend into subdirectories
+        dir_filter (callable, optional): Called with the components of each subdirectory's
+            path relative to directory; subdirectories for which it returns False are skipped
+        workers (int, optional): Number of threads listing directories
+        
+    Yields:
+        str: Path of each file
+    """
+    def scan(path):
+        files, subdirectories = [], []
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.is_dir() and not entry.is_symlink():
+                        if recursive and (dir_filter is None or
+                                          dir_filter(os.path.relpath(entry.path, directory).split(os.sep))):
+                            subdirectories.append(entry.path)
+                    elif entry.is_file():
+                        files.append(entry.path)
+        except OSError as e:
+            logger.warning(f"Cannot list directory {path}: {e}")
+        return files, subdirectories
+        
+    if workers <= 1:
+        stack = [directory]
+        while stack:
+            files, subdirectories = scan(stack.pop())
+            yield from files
+            stack.extend(reversed(subdirectories))
+        return
+        
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        level = [directory]
+        while level:
+            next_level = []
+            for files, subdirectories in bounded_map(executor, scan, level, workers * 4):
+                yield from files
+                next_level.extend(subdirectories)
+            level = next_level
+
+def report_failed_keys(bucket_name, failed, failed_keys_file=None):
+    """
+    Log the objects and prefixes that could not be collected and optionally write them to a file.
+    
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        failed (dict): Failed region-day units under 'units' and (unit, key) pairs under 'keys'
+        failed_keys_file (str, optional): File to write one s3:// URL per failed object or prefix
+    """
+    urls = [f"s3://{bucket_name}/{key}" for _, key in failed['keys']]
+    urls.extend(f"s3://{bucket_name}/{source_prefix}{region}/{day.strftime('%Y/%m/%d')}/"
+                for _, source_prefix, region, day in failed['units'])
+    
+    if urls:
+        logger.warning(f"{len(failed['keys'])} files and {len(failed['units'])} region-days could not be collected; "
+                       f"the timeline is incomplete")
+    if failed_keys_file:
+        with open(failed_keys_file, 'w') as f:
+            for url in urls:
+                f.write(url + '\n')
+        logger.info(f"Wrote {len(urls)} failed S3 locations to {failed_keys_file}")
+
+def decode_log_object(item):
+    """
+    Decompress and parse a downloaded CloudTrail log object.
+    
+    This is the parse stage of the S3 collection pipeline. It is a
+    module-level function so it can run in a worker process.
+    
+    Args:
+        item (tuple): (unit, key, raw_body, result, save_dir, filters). If raw_body is None,
+            result already holds the records (e.g. from S3 Select) and is passed through.
+            
+    Returns:
+        tuple: (unit, key, result) where result is (records, decompressed size in bytes),
+            or None if the object could not be processed
+    """
+    unit, key, raw_body, result, save_dir, filters = item
+    if raw_body is None:
+        return unit, key, result
+        
+    region = unit[2]
+    try:
+        # Decompress gzipped content
+        content = gzip.decompress(raw_body)
+        file_data = content.decode("utf-8")
+        
+        # Save raw file if output directory is specified
+        if save_dir:
+            os.makedirs(save_dir, exist_ok=True)
+            
+            # Save the decompressed JSON file byte for byte, as validation hashes it against the
+            # digests; writing to a temporary file first means a copy is either complete or absent
+            path = os.path.join(save_dir, saved_log_filename(key))
+            with open(f"{path}.tmp", 'wb') as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+        
+        # Parse the JSON data
+        try:
+            records = parse_log_records(file_data, region)
+        except json.JSONDecodeError as e:
+            logger.error(f"Error parsing JSON from {key}: {e}")
+            return unit, key, None
+            
+        source_bytes = len(file_data)
+        if filters:
+            matching = [record for record in records if record_matches(record, filters)]
+            source_bytes = source_bytes * len(matching) // max(1, len(records))
+            records = matching
+            
+        return unit, key, (records, source_bytes)
+        
+    except Exception as e:
+        logger.error(f"Error processing file {key}: {e}")
+        return unit, key, None
+
+def crawl_step(prefix, depth, children, accounts, max_depth):
+    """
+    Process the listing of one prefix during a CloudTrail bucket crawl.
+    
+    Inside AWSLogs/ only organization IDs, account IDs and CloudTrail/ are
+    followed; an AWSLogs/[o-xxxx/]<account>/CloudTrail/ prefix is recorded in
+    accounts together with the regions listed under it. Outside AWSLogs/,
+    every child is followed until max_depth.
+    
+    Args:
+        prefix (str): Prefix that was listed
+        depth (int): Depth of the prefix, 1 for top-level prefixes
+        children (list): Child prefixes of the prefix
+        accounts (dict): Mapping of account ID to its CloudTrail prefix and regions, updated in place
+        max_depth (int): Maximum depth to descend looking for an AWSLogs/ prefix
+        
+    Returns:
+        list: (prefix, depth) tuples to list next
+    """
+    parts = prefix.rstrip('/').split('/')
+    
+    # AWSLogs/[o-xxxx/]<account>/CloudTrail/ - its children are regions
+    if parts[-1] == 'CloudTrail' and len(parts) >= 3 and ACCOUNT_ID_PATTERN.match(parts[-2]):
+        accounts[parts[-2]] = {
+            'prefix': prefix,
+            'regions': sorted(
+                child.rstrip('/').split('/')[-1] for child in children
+                if is_region_name(child.rstrip('/').split('/')[-1])
+            )
+        }
+        return []
+        
+    next_prefixes = []
+    for child in children:
+        name = child.rstrip('/').split('/')[-1]
+        if 'AWSLogs' in parts:
+            # Inside AWSLogs only follow organization IDs, account IDs and CloudTrail
+            parent = parts[-1]
+            if parent == 'AWSLogs' and (ACCOUNT_ID_PATTERN.match(name) or ORG_ID_PATTERN.match(name)):
+                next_prefixes.append((child, depth + 1))
+            elif ORG_ID_PATTERN.match(parent) and ACCOUNT_ID_PATTERN.match(name):
+                next_prefixes.append((child, depth + 1))
+            elif ACCOUNT_ID_PATTERN.match(parent) and name == 'CloudTrail':
+                next_prefixes.append((child, depth + 1))
+        elif name == 'AWSLogs' or depth < max_depth:
+            next_prefixes.append((child, depth + 1))
+    return next_prefixes
+
+def is_region_name(name):
+    """
+    Check whether a path component looks like an AWS region name.
+    
+    Args:
+        name (str): Path component, e.g. 'us-east-1'
+        
+    Returns:
+        bool: True if the name has the shape of a region
+    """
+    return bool(REGION_PATTERN.match(name))
+
 class AWSLogCollector:
     """
     Collects CloudTrail logs from AWS, either from S3 buckets or via the LookupEvents API.
@@ -34,6 +394,7 @@ class AWSLogCollector:
             region_name=region
         )
         self.region = region
+        self._bucket_layouts = {}
         
     def validate_credentials(self):
         """
@@ -51,17 +412,31 @@ class AWSLogCollector:
             logger.error(f"Credential validation failed: {str(e)}")
             return False, str(e)
     
-    def discover_bucket_structure(self, bucket_name, max_prefixes=10):
+    def discover_bucket_structure(self, bucket_name, max_prefixes=10, max_depth=3, max_workers=16, refresh=False):
         """
         Discover the directory structure of an S3 bucket to help identify CloudTrail logs.
         
+        Prefixes are crawled breadth-first with the listings of each level running
+        in parallel. Once an AWSLogs/ prefix is found, only the CloudTrail layout
+        (AWSLogs/[o-xxxx/]<account>/CloudTrail/<region>/) is followed, so large
+        organization buckets are mapped with one listing per account. Results are
+        cached per bucket for the lifetime of the collector.
+        
         Args:
             bucket_name (str): Name of the S3 bucket to explore
-            max_prefixes (int, optional): Maximum number of prefixes to display at each level
+            max_prefixes (int, optional): Maximum number of top-level prefixes to report
+            max_depth (int, optional): Maximum number of levels to descend looking for an AWSLogs/ prefix
+            max_workers (int, optional): Number of concurrent listing requests
+            refresh (bool, optional): Ignore any cached layout and crawl the bucket again
             
         Returns:
-            dict: Dictionary representing the bucket structure
+            dict: Dictionary representing the bucket structure, including an 'accounts' mapping of
+                account ID to its CloudTrail prefix and regions
         """
+        if not refresh and bucket_name in self._bucket_layouts:
+            logger.debug(f"Using cached structure for bucket {bucket_name}")
+            return self._bucket_layouts[bucket_name]
+            
         s3 = self.session.client('s3')
         
         try:
@@ -69,51 +444,28 @@ class AWSLogCollector:
             s3.head_bucket(Bucket=bucket_name)
             logger.info(f"Exploring structure of bucket: {bucket_name}")
             
-            # Get top-level prefixes (folders)
-            paginator = s3.get_paginator('list_objects_v2')
-            top_prefixes = []
+            top_prefixes = self._list_child_prefixes(s3, bucket_name, '')
+            accounts = {}
             
-            # Use delimiter to get folder-like structure
-            for page in paginator.paginate(Bucket=bucket_name, Delimiter='/'):
-                for prefix in page.get('CommonPrefixes', []):
-                    top_prefixes.append(prefix.get('Prefix'))
-                    if len(top_prefixes) >= max_prefixes:
-                        break
-                if len(top_prefixes) >= max_prefixes:
-                    break
+            # Crawl level by level, listing every prefix of a level in parallel
+            frontier = [(prefix, 1) for prefix in top_prefixes]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                while frontier:
+                    listings = executor.map(
+                        lambda item: self._list_child_prefixes(s3, bucket_name, item[0]),
+                        frontier
+                    )
+                    next_frontier = []
+                    for (prefix, depth), children in zip(frontier, listings):
+                        next_frontier.extend(crawl_step(prefix, depth, children, accounts, max_depth))
+                    frontier = next_frontier
             
-            # Look for CloudTrail-specific patterns
+            # Report the CloudTrail path of each account followed by its region paths
             cloudtrail_paths = []
-            
-            # Check for AWSLogs pattern which is common for CloudTrail
-            for prefix in top_prefixes:
-                if 'AWSLogs' in prefix:
-                    # Explore one level deeper to find account IDs
-                    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
-                        for account_prefix in page.get('CommonPrefixes', []):
-                            account_path = account_prefix.get('Prefix')
-                            
-                            # Check for CloudTrail under this account
-                            for ct_page in paginator.paginate(Bucket=bucket_name, Prefix=account_path, Delimiter='/'):
-                                for service_prefix in ct_page.get('CommonPrefixes', []):
-                                    service_path = service_prefix.get('Prefix')
-                                    if 'CloudTrail' in service_path:
-                                        cloudtrail_paths.append(service_path)
-                                        
-                                        # Check for regions
-                                        for region_page in paginator.paginate(Bucket=bucket_name, Prefix=service_path, Delimiter='/'):
-                                            for region_prefix in region_page.get('CommonPrefixes', []):
-                                                region_path = region_prefix.get('Prefix')
-                                                cloudtrail_paths.append(region_path)
-                                                
-                                                # Check for a sample year
-                                                for year_page in paginator.paginate(Bucket=bucket_name, Prefix=region_path, Delimiter='/'):
-                                                    for year_prefix in year_page.get('CommonPrefixes', []):
-                                                        year_path = year_prefix.get('Prefix')
-                                                        cloudtrail_paths.append(year_path)
-                                                        break  # Just get one year as example
-                                                break  # Just get one region as example
-                                        break  # Just get one CloudTrail path
+            for account_id in sorted(accounts):
+                account = accounts[account_id]
+                cloudtrail_paths.append(account['prefix'])
+                cloudtrail_paths.extend(f"{account['prefix']}{region}/" for region in account['regions'])
             
             # If we didn't find CloudTrail in AWSLogs, look for other common patterns
             if not cloudtrail_paths:
@@ -123,11 +475,13 @@ class AWSLogCollector:
             
             result = {
                 'bucket': bucket_name,
-                'top_level_prefixes': top_prefixes,
-                'cloudtrail_paths': cloudtrail_paths
+                'top_level_prefixes': top_prefixes[:max_prefixes],
+                'cloudtrail_paths': cloudtrail_paths,
+                'accounts': accounts
             }
+            self._bucket_layouts[bucket_name] = result
             
-            logger.info(f"Found {len(cloudtrail_paths)} potential CloudTrail paths in bucket {bucket_name}")
+            logger.info(f"Found {len(accounts)} accounts and {len(cloudtrail_paths)} potential CloudTrail paths in bucket {bucket_name}")
             return result
             
         except Exception as e:
@@ -137,10 +491,39 @@ class AWSLogCollector:
                 'error': str(e)
             }
             
-    def collect_from_s3(self, bucket_name, prefix="", start_date=None, end_date=None, output_dir=None, regions=None, batch_size=1000):
+    def _list_child_prefixes(self, s3, bucket_name, prefix):
+        """
+        List the immediate child prefixes ("folders") of a prefix.
+        
+        Args:
+            s3: S3 client
+            bucket_name (str): Name of the S3 bucket
+            prefix (str): Parent prefix, ending with '/' or empty for the bucket root
+            
+        Returns:
+            list: Child prefixes
+        """
+        paginator = s3.get_paginator('list_objects_v2')
+        children = []
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+            children.extend(common_prefix.get('Prefix') for common_prefix in page.get('CommonPrefixes', []))
+        return children
+            
+    def collect_from_s3(self, bucket_name, prefix="", start_date=None, end_date=None, output_dir=None, regions=None, batch_size=1000,
+                        memory_budget=None, accounts=None, all_accounts=False, max_workers=8,
+                        event_names=None, event_sources=None, use_s3_select=False, parse_workers=0,
+                        max_attempts=5, failed_keys_file=None, file_filter=None, on_file=None):
         """
         Collect CloudTrail logs from an S3 bucket.
         
+        Collection runs as a pipeline of stages: listing and downloading on a
+        pool of threads, decompressing and parsing (optionally on a pool of
+        processes), then batching in the calling thread. Each stage keeps a
+        bounded number of items in flight, so stages overlap while a slow
+        consumer holds back the downloads instead of letting memory grow. When
+        several accounts are collected, their region-days are interleaved so that
+        every account makes progress at the same rate.
+        
         Args:
             bucket_name (str): Name of the S3 bucket containing CloudTrail logs.
             prefix (str, optional): Prefix within the bucket to search for logs.
@@ -149,12 +532,237 @@ class AWSLogCollector:
             output_dir (str, optional): Directory to save raw log files. If None, logs are not saved locally.
             regions (list, optional): List of AWS regions to collect logs from. If None, collects from all regions.
             batch_size (int, optional): Number of events to process in memory before yielding a batch.
+            memory_budget (int, optional): Estimated size in bytes a batch may occupy in memory.
+                When set, batches are cut by size instead of by batch_size.
+            accounts (list, optional): Account IDs to collect from an organization or multi-account bucket.
+                Their CloudTrail prefixes are discovered automatically and prefix is ignored.
+            all_accounts (bool, optional): Collect from every account found in the bucket.
+            max_workers (int, optional): Number of concurrent S3 requests.
+            event_names (list, optional): Only collect events with one of these eventName values.
+            event_sources (list, optional): Only collect events with one of these eventSource values.
+            use_s3_select (bool, optional): Apply the event filters server-side with S3 Select so only
+                matching records are transferred. Objects S3 Select cannot handle are downloaded in
+                full and filtered locally. Ignored when output_dir is set, since raw files must be complete.
+            parse_workers (int, optional): Number of processes that decompress and parse log files. With 0,
+                parsing happens on the download threads. Processes use more cores but have to send the parsed
+                records back, so they pay off when parsing rather than the network is the bottleneck.
+            max_attempts (int, optional): Attempts per S3 request before it counts as failed. Throttling and
+                transient errors are retried with exponential backoff, and throttling lowers the number of
+                concurrent requests. Failed files and listings get one more pass at the end of the run.
+            failed_keys_file (str, optional): File to write the s3:// URLs of objects and prefixes that
+                still failed after the final pass, one per line.
+            file_filter (callable, optional): Called with each object key before it is downloaded;
+                objects for which it returns False are skipped.
+            on_file (callable, optional): Called with the key and the records of each object after
+                it is parsed (and filtered), e.g. to index it.
             
         Returns:
             generator: Yields batches of parsed CloudTrail events.
         """
         s3 = self.session.client('s3')
         
+        # Collection requests are retried by our own policy, which also adapts concurrency to throttling
+        limiter = AdaptiveConcurrencyLimiter(max_workers)
+        policy = RetryPolicy(max_attempts=max_attempts, limiter=limiter)
+        fetch_s3 = self.session.client('s3', config=Config(
+            retries={'max_attempts': 1, 'mode': 'standard'}, max_pool_connections=max(max_workers, 10)
+        ))
+        failed = {'units': [], 'keys': []}
+        failed_lock = threading.Lock()
+        skipped_keys = 0
+        
+        # Event filters, keyed by CloudTrail record field
+        filters = {}
+        if event_names:
+            filters['eventName'] = set(event_names)
+        if event_sources:
+            filters['eventSource'] = set(event_sources)
+            
+        use_select = bool(use_s3_select and filters)
+        if use_select and output_dir:
+            logger.info("Saving raw logs requires full objects, not using S3 Select")
+            use_select = False
+        # (bucket, source prefix) pairs where S3 Select was refused, e.g. by a bucket policy
+        # or by the permissions of one member account. Other prefixes keep using it.
+        select_disabled = set()
+        select_lock = threading.Lock()
+        
+        days = date_range(start_date, end_date)
+        if not days:
+            logger.warning(f"Start date {start_date} is after end date {end_date}, nothing to collect")
+            return
+        
+        # Create output directory if specified
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            
+        logger.info(f"Collecting CloudTrail logs from bucket '{bucket_name}' between {days[0]} and {days[-1]}")
+        
+        # Work out which CloudTrail prefixes (one per account) and regions to collect
+        if accounts or all_accounts:
+            sources = self._discover_account_sources(bucket_name, accounts, regions)
+        else:
+            prefix = self._resolve_cloudtrail_prefix(s3, bucket_name, prefix)
+            sources = [(None, prefix, regions or self._discover_regions(s3, bucket_name, prefix))]
+        
+        # Build the region-day units of each account and interleave them for fair scheduling
+        per_account_units = [
+            [(account_id, source_prefix, region, day) for region in source_regions for day in days]
+            for account_id, source_prefix, source_regions in sources
+        ]
+        units = [unit for group in zip_longest(*per_account_units) for unit in group if unit]
+        
+        progress = {
+            account_id: {'units': len(group), 'units_done': 0, 'files': 0, 'events': 0}
+            for (account_id, _, _), group in zip(sources, per_account_units)
+        }
+        
+        total_events = 0
+        batcher = RecordBatcher(batch_size=batch_size, memory_budget=memory_budget)
+        
+        def list_unit(unit):
+            account_id, source_prefix, region, day = unit
+            final_prefix = f"{source_prefix}{region}/{day.strftime('%Y/%m/%d')}/"
+            logger.info(f"Checking prefix '{final_prefix}' in bucket '{bucket_name}'")
+            
+            keys = []
+            params = {'Bucket': bucket_name, 'Prefix': final_prefix}
+            try:
+                while True:
+                    page = policy.call(fetch_s3.list_objects_v2, **params)
+                    for obj in page.get("Contents", []):
+                        # Only process .gz files which contain CloudTrail logs
+                        if obj["Key"].endswith(".gz"):
+                            keys.append(obj["Key"])
+                    if not page.get("IsTruncated"):
+                        break
+                    params['ContinuationToken'] = page["NextContinuationToken"]
+            except Exception as e:
+                logger.error(f"Error processing date {day} in region {region}: {e}")
+                # Drop the partial listing; the whole region-day is listed again in the retry pass
+                with failed_lock:
+                    failed['units'].append(unit)
+                return unit, None
+            return unit, keys
+            
+        def fetch_key(item):
+            unit, key = item
+            account_id, _, region, day = unit
+            save_dir = None
+            if output_dir:
+                save_dir = os.path.join(output_dir, *([account_id] if account_id else []), region, day.strftime('%Y-%m-%d'))
+            
+            fetched = None
+            select_scope = (bucket_name, unit[1])
+            if use_select and select_scope not in select_disabled:
+                try:
+                    selected = policy.call(self._select_s3_log, fetch_s3, bucket_name, key, region, filters)
+                    fetched = (unit, key, None, selected, None, None)
+                except ClientError as e:
+                    code = e.response.get('Error', {}).get('Code')
+                    if code in S3_SELECT_UNSUPPORTED_ERRORS:
+                        with select_lock:
+                            newly_disabled = select_scope not in select_disabled
+                            select_disabled.add(select_scope)
+                        if newly_disabled:
+                            logger.warning(f"S3 Select is not available for s3://{bucket_name}/{unit[1]} ({code}), "
+                                           f"downloading full objects instead")
+                    else:
+                        logger.debug(f"S3 Select failed for {key} ({code}), downloading full object")
+                except Exception as e:
+                    logger.debug(f"S3 Select failed for {key} ({e}), downloading full object")
+            
+            if fetched is None:
+                raw_body = self._download_s3_object(fetch_s3, bucket_name, key, policy)
+                if raw_body is None:
+                    with failed_lock:
+                        failed['keys'].append((unit, key))
+                fetched = (unit, key, raw_body, None, save_dir, filters)
+            
+            # Without parse processes, decode on this download thread
+            return fetched if parse_workers else decode_log_object(fetched)
+        
+        def fetch_items(units):
+            nonlocal skipped_keys
+            for unit, keys in bounded_map(executor, list_unit, units, max_workers):
+                if keys is None:
+                    continue
+                account_id = unit[0]
+                progress[account_id]['units_done'] += 1
+                for key in keys:
+                    if file_filter and not file_filter(key):
+                        skipped_keys += 1
+                        continue
+                    yield unit, key
+                if account_id and len(sources) > 1:
+                    account = progress[account_id]
+                    logger.info(f"Account {account_id}: listed {account['units_done']}/{account['units']} region-days, "
+                                f"{account['files']} files and {account['events']} events collected")
+        
+        with ExitStack() as stack:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+            parse_executor = None
+            if parse_workers:
+                parse_executor = stack.enter_context(ProcessPoolExecutor(max_workers=parse_workers))
+            
+            items = fetch_items(units)
+            for retry_pass in (False, True):
+                if retry_pass:
+                    if not failed['units'] and not failed['keys']:
+                        break
+                    # Give everything that failed one more pass through the same stages
+                    retry_units, retry_keys = failed['units'], failed['keys']
+                    failed['units'], failed['keys'] = [], []
+                    logger.warning(f"Retrying {len(retry_keys)} files and {len(retry_units)} region-days that failed")
+                    items = chain(retry_keys, fetch_items(retry_units))
+                
+                results = bounded_map(executor, fetch_key, items, max_workers * 2)
+                if parse_executor:
+                    results = bounded_map(parse_executor, decode_log_object, results, parse_workers * 2)
+                    
+                for unit, key, result in results:
+                    if result is None:
+                        continue
+                    records, source_bytes = result
+                    if on_file:
+                        on_file(key, records)
+                    
+                    account = progress[unit[0]]
+                    account['files'] += 1
+                    account['events'] += len(records)
+                    total_events += len(records)
+                    
+                    # Add records to the batcher, yielding any batches that fill up
+                    yield from batcher.add(records, source_bytes)
+                    logger.debug(f"Added {len(records)} events from {key}")
+        
+        # Yield any remaining events in the final batch
+        yield from batcher.flush()
+        
+        if skipped_keys:
+            logger.info(f"Skipped {skipped_keys} objects excluded by the file filter")
+        if limiter.throttles:
+            logger.warning(f"S3 throttled {limiter.throttles} requests; concurrency ended at {limiter.limit}/{max_workers}")
+        report_failed_keys(bucket_name, failed, failed_keys_file)
+        
+        regions_collected = {region for _, _, source_regions in sources for region in source_regions}
+        if len(sources) > 1:
+            for account_id, account in sorted(progress.items()):
+                logger.info(f"Account {account_id}: {account['files']} files, {account['events']} events")
+        logger.info(f"Collected {total_events} CloudTrail events from {len(regions_collected)} regions in {len(sources)} account(s)")
+        
+    def _resolve_cloudtrail_prefix(self, s3, bucket_name, prefix):
+        """
+        Return the CloudTrail prefix to collect, discovering it if none was given.
+        
+        Args:
+            s3: S3 client
+            bucket_name (str): Name of the S3 bucket
+            prefix (str): Prefix given by the user, possibly empty
+            
+        Returns:
+            str: Prefix ending with '/', or an empty string if none could be found
+        """
         # If no prefix is provided, try to discover the bucket structure
         if not prefix:
             logger.info(f"No prefix provided, attempting to discover CloudTrail logs in bucket {bucket_name}")
@@ -162,12 +770,15 @@ class AWSLogCollector:
             
             # If we found CloudTrail paths, use the first one
             if structure.get('cloudtrail_paths'):
-                # Find the base CloudTrail path (without region)
-                for path in structure['cloudtrail_paths']:
-                    if 'CloudTrail' in path and not any(region in path for region in ['us-east-1', 'us-west-2', 'eu-west-1']):
-                        prefix = path
-                        logger.info(f"Automatically selected base prefix: {prefix}")
-                        break
+                # Use the base CloudTrail path (without region) of the first account
+                accounts = structure.get('accounts', {})
+                if accounts:
+                    account_id = sorted(accounts)[0]
+                    prefix = accounts[account_id]['prefix']
+                    logger.info(f"Automatically selected base prefix: {prefix}")
+                    if len(accounts) > 1:
+                        logger.warning(f"Bucket contains CloudTrail logs for {len(accounts)} accounts, only collecting account {account_id}. "
+                                       f"Use --all-accounts to collect all of them")
                 
                 # If we couldn't find a base path, use the first one
                 if not prefix:
@@ -176,215 +787,619 @@ class AWSLogCollector:
             else:
                 logger.warning(f"Could not automatically detect CloudTrail logs in bucket {bucket_name}. Please specify a prefix.")
         
-        # Set default dates if not provided
-        if not start_date:
-            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-        if not end_date:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            
-        start_date_obj = datetime.strptime(start_date, "%Y-%m-%d").date()
-        end_date_obj = datetime.strptime(end_date, "%Y-%m-%d").date()
-        
         if prefix and not prefix.endswith("/"):
             prefix += "/"
+        return prefix
+        
+    def _discover_regions(self, s3, bucket_name, prefix):
+        """
+        Find the regions with CloudTrail logs under a CloudTrail prefix.
+        
+        Args:
+            s3: S3 client
+            bucket_name (str): Name of the S3 bucket
+            prefix (str): CloudTrail prefix, e.g. 'AWSLogs/123456789012/CloudTrail/'
             
-        # Create output directory if specified
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+        Returns:
+            list: Region names, or the collector's region if none were found
+        """
+        try:
+            # List all directories under the prefix to find regions
+            available_regions = []
+            for region_path in self._list_child_prefixes(s3, bucket_name, prefix):
+                # Extract region name from path
+                region_name = region_path.rstrip('/').split('/')[-1]
+                if is_region_name(region_name):
+                    available_regions.append(region_name)
+            
+            if available_regions:
+                logger.info(f"Discovered {len(available_regions)} regions with CloudTrail logs")
+                return available_regions
             
-        logger.info(f"Collecting CloudTrail logs from bucket '{bucket_name}' between {start_date} and {end_date}")
+            # Default to current region if no regions found
+            logger.info(f"No regions discovered, defaulting to {self.region}")
+        except Exception as e:
+            logger.error(f"Error discovering regions: {e}")
+        return [self.region]
         
-        # Determine regions to collect from
-        if not regions:
-            # Try to discover available regions
-            try:
-                available_regions = []
-                region_prefix = prefix
-                
-                # List all directories under the prefix to find regions
-                paginator = s3.get_paginator('list_objects_v2')
-                for page in paginator.paginate(Bucket=bucket_name, Prefix=region_prefix, Delimiter='/'):
-                    for region_dir in page.get('CommonPrefixes', []):
-                        region_path = region_dir.get('Prefix')
-                        # Extract region name from path
-                        region_name = region_path.rstrip('/').split('/')[-1]
-                        if region_name.startswith(('us-', 'eu-', 'ap-', 'sa-', 'ca-')):
-                            available_regions.append(region_name)
+    def _discover_account_sources(self, bucket_name, accounts=None, regions=None):
+        """
+        Find the CloudTrail prefix and regions of each account in a bucket.
+        
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            accounts (list, optional): Account IDs to include. If None, includes every account found.
+            regions (list, optional): Regions to restrict collection to.
+            
+        Returns:
+            list: (account_id, prefix, regions) tuples
+        """
+        layout = self.discover_bucket_structure(bucket_name).get('accounts', {})
+        
+        if accounts:
+            missing = sorted(set(accounts) - set(layout))
+            if missing:
+                logger.warning(f"No CloudTrail logs found in bucket {bucket_name} for accounts: {', '.join(missing)}")
+            selected = [account_id for account_id in sorted(layout) if account_id in accounts]
+        else:
+            selected = sorted(layout)
+            
+        sources = []
+        for account_id in selected:
+            account_regions = layout[account_id]['regions']
+            if regions:
+                account_regions = [region for region in account_regions if region in regions]
+            if account_regions:
+                sources.append((account_id, layout[account_id]['prefix'], account_regions))
                 
-                if available_regions:
-                    logger.info(f"Discovered {len(available_regions)} regions with CloudTrail logs")
-                    regions = available_regions
-                else:
-                    # Default to current region if no regions found
-                    regions = [self.region]
-                    logger.info(f"No regions discovered, defaulting to {self.region}")
-            except Exception as e:
-                logger.error(f"Error discovering regions: {e}")
-                regions = [self.region]
+        logger.info(f"Collecting from {len(sources)} accounts in bucket {bucket_name}")
+        return sources
         
-        total_events = 0
-        current_batch = []
+    def _select_s3_log(self, s3, bucket_name, key, region, filters):
+        """
+        Retrieve only the matching records of a gzipped CloudTrail log object using S3 Select.
         
-        # Process each region
-        for region in regions:
-            logger.info(f"Collecting logs for region: {region}")
-            region_prefix = f"{prefix}{region}/"
+        Args:
+            s3: S3 client
+            bucket_name (str): Name of the S3 bucket
+            key (str): Key of the gzipped log object
+            region (str): Region the object belongs to, added to records without one
+            filters (dict): Mapping of record field to a set of accepted values
             
-            current_date = start_date_obj
-            while current_date <= end_date_obj:
-                date_folder = f"{current_date.year}/{current_date.strftime('%m')}/{current_date.strftime('%d')}/"
-                final_prefix = region_prefix + date_folder
+        Returns:
+            tuple: (matching records, size in bytes of the returned data)
+            
+        Raises:
+            ClientError: If S3 Select rejects the request
+        """
+        conditions = []
+        for field, values in sorted(filters.items()):
+            quoted = ', '.join("'" + value.replace("'", "''") + "'" for value in sorted(values))
+            conditions.append(f"s.{field} IN ({quoted})")
+        expression = f"SELECT * FROM S3Object[*].Records[*] s WHERE {' AND '.join(conditions)}"
+        
+        logger.debug(f"Selecting from file: {key}")
+        resp = s3.select_object_content(
+            Bucket=bucket_name,
+            Key=key,
+            ExpressionType='SQL',
+            Expression=expression,
+            InputSerialization={'JSON': {'Type': 'DOCUMENT'}, 'CompressionType': 'GZIP'},
+            OutputSerialization={'JSON': {'RecordDelimiter': '\n'}}
+        )
+        
+        chunks = []
+        for event in resp['Payload']:
+            if 'Records' in event:
+                chunks.append(event['Records']['Payload'])
+        data = b''.join(chunks).decode('utf-8')
+        
+        records = []
+        for line in data.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                if 'awsRegion' not in record:
+                    record['awsRegion'] = region
+                records.append(record)
                 
-                logger.info(f"Checking prefix '{final_prefix}' in bucket '{bucket_name}'")
+        return records, len(data)
+        
+    def _download_s3_object(self, s3, bucket_name, key, policy=None):
+        """
+        Download the raw bytes of one S3 object.
+        
+        Args:
+            s3: S3 client
+            bucket_name (str): Name of the S3 bucket
+            key (str): Key of the object
+            policy (RetryPolicy, optional): Policy to retry the download with
+            
+        Returns:
+            bytes or None: Object content, or None if it could not be downloaded
+        """
+        def download():
+            resp = s3.get_object(Bucket=bucket_name, Key=key)
+            return resp["Body"].read()
+            
+        try:
+            logger.debug(f"Processing file: {key}")
+            return policy.call(download) if policy else download()
+        except Exception as e:
+            logger.error(f"Error processing file {key}: {e}")
+            return None
+            
+    def follow_s3(self, bucket_name, prefix="", regions=None, accounts=None, all_accounts=False, start_date=None,
+                  state_file=None, output_dir=None, batch_size=1000, memory_budget=None, max_workers=8,
+                  event_names=None, event_sources=None, max_attempts=5, poll_interval=10, max_poll_interval=60,
+                  lookback=FOLLOW_LOOKBACK_SECONDS, max_polls=None, max_failures=FOLLOW_MAX_FAILURES):
+        """
+        Follow a CloudTrail bucket, collecting log files as they are delivered.
+        
+        Every poll lists the region-day prefixes from the position of each
+        region (the newest file processed, minus the lookback window) onwards,
+        starting after the first file name in the window, so a poll costs one
+        request per region however much history the day holds. Files not seen
+        yet are downloaded and parsed like in collect_from_s3, and batches are
+        cut at the end of every file. A file is only recorded in the state
+        once the consumer asks for the batch after its last one, which means
+        its events have been handled, so a restarted run picks up where the
+        output stopped. The state is saved after every poll and when the
+        generator is closed. Polls come every poll_interval seconds while
+        files keep arriving and back off to max_poll_interval while none do.
+        
+        Args:
+            bucket_name (str): Name of the S3 bucket containing CloudTrail logs.
+            prefix (str, optional): Prefix within the bucket to search for logs.
+            regions (list, optional): Regions to follow. If None, follows every region found.
+            accounts (list, optional): Account IDs to follow in an organization or multi-account bucket.
+            all_accounts (bool, optional): Follow every account found in the bucket.
+            start_date (str, optional): Day to start from, in YYYY-MM-DD format, when the state has no
+                position yet. Defaults to the lookback window before now.
+            state_file (str, optional): JSON file recording the files processed, to resume from.
+            output_dir (str, optional): Directory to save raw log files. If None, logs are not saved locally.
+            batch_size (int, optional): Number of events to process in memory before yielding a batch.
+            memory_budget (int, optional): Estimated size in bytes a batch may occupy in memory.
+            max_workers (int, optional): Number of concurrent S3 requests.
+            event_names (list, optional): Only collect events with one of these eventName values.
+            event_sources (list, optional): Only collect events with one of these eventSource values.
+            max_attempts (int, optional): Attempts per S3 request. Files that still fail are tried
+                again on the next poll, up to max_failures polls.
+            poll_interval (float, optional): Seconds between polls while files keep arriving.
+            max_poll_interval (float, optional): Longest wait between polls while no files arrive.
+            lookback (int, optional): Seconds before the position that are listed again, to catch
+                files delivered out of order.
+            max_polls (int, optional): Stop after this many polls. Defaults to following until interrupted.
+            max_failures (int, optional): Polls in which a file may fail to download or parse before
+                it is skipped for good.
+            
+        Returns:
+            generator: Yields batches of parsed CloudTrail events.
+        """
+        s3 = self.session.client('s3')
+        policy = RetryPolicy(max_attempts=max_attempts, limiter=AdaptiveConcurrencyLimiter(max_workers))
+        fetch_s3 = self.session.client('s3', config=Config(
+            retries={'max_attempts': 1, 'mode': 'standard'}, max_pool_connections=max(max_workers, 10)
+        ))
+        state = FollowState(state_file)
+        window = timedelta(seconds=lookback)
+        
+        filters = {}
+        if event_names:
+            filters['eventName'] = set(event_names)
+        if event_sources:
+            filters['eventSource'] = set(event_sources)
+            
+        if accounts or all_accounts:
+            sources = self._discover_account_sources(bucket_name, accounts, regions)
+        else:
+            prefix = self._resolve_cloudtrail_prefix(s3, bucket_name, prefix)
+            sources = [(None, prefix, regions or self._discover_regions(s3, bucket_name, prefix))]
+            
+        # One stream per region of each account; file names start with the account ID of the prefix
+        streams = []
+        for account_id, source_prefix, source_regions in sources:
+            match = re.search(r'(\d{12})/CloudTrail/$', source_prefix)
+            name_account = account_id or (match.group(1) if match else None)
+            for region in source_regions:
+                streams.append((f"s3://{bucket_name}/{source_prefix}{region}/", account_id, name_account,
+                                source_prefix, region))
                 
-                try:
-                    paginator = s3.get_paginator("list_objects_v2")
-                    for page in paginator.paginate(Bucket=bucket_name, Prefix=final_prefix):
+        # Where streams without a position start: the start date, then the time of their last empty listing
+        first_start = datetime.strptime(start_date, '%Y-%m-%d') + window if start_date else None
+        starts = {}
+        logger.info(f"Following {len(streams)} region(s) in bucket '{bucket_name}'")
+        
+        def list_stream(item):
+            (stream, account_id, name_account, source_prefix, region), cutoff, now = item
+            new_files = []
+            day = cutoff.date()
+            try:
+                while day <= now.date():
+                    day_prefix = f"{source_prefix}{region}/{day.strftime('%Y/%m/%d')}/"
+                    params = {'Bucket': bucket_name, 'Prefix': day_prefix}
+                    if name_account and day == cutoff.date():
+                        # Skip straight to the window; file names sort by delivery time
+                        params['StartAfter'] = f"{day_prefix}{name_account}_CloudTrail_{region}_{cutoff.strftime('%Y%m%dT%H%MZ')}"
+                    while True:
+                        page = policy.call(fetch_s3.list_objects_v2, **params)
                         for obj in page.get("Contents", []):
                             key = obj["Key"]
-                            
-                            # Only process .gz files which contain CloudTrail logs
-                            if not key.endswith(".gz"):
+                            if not key.endswith(".gz") or state.seen(stream, key):
                                 continue
-                                
-                            try:
-                                logger.debug(f"Processing file: {key}")
-                                resp = s3.get_object(Bucket=bucket_name, Key=key)
-                                raw_body = resp["Body"].read()
-                                
-                                # Decompress gzipped content
-                                file_data = gzip.decompress(raw_body).decode("utf-8")
-                                    
-                                # Save raw file if output directory is specified
-                                if output_dir:
-                                    # Create region subdirectory
-                                    region_dir = os.path.join(output_dir, region)
-                                    if not os.path.exists(region_dir):
-                                        os.makedirs(region_dir)
-                                    
-                                    # Create date subdirectory
-                                    date_dir = os.path.join(region_dir, current_date.strftime('%Y-%m-%d'))
-                                    if not os.path.exists(date_dir):
-                                        os.makedirs(date_dir)
-                                    
-                                    # Save the decompressed JSON file
-                                    filename = os.path.basename(key)[:-3] + '.json'  # Remove .gz extension
-                                    with open(os.path.join(date_dir, filename), 'w') as f:
-                                        f.write(file_data)
-                                
-                                # Parse the JSON data
-                                try:
-                                    json_data = json.loads(file_data)
-                                    records = json_data.get("Records", [])
-                                    
-                                    # Add region information to each record
-                                    for record in records:
-                                        if 'awsRegion' not in record:
-                                            record['awsRegion'] = region
-                                    
-                                    # Add records to current batch
-                                    current_batch.extend(records)
-                                    total_events += len(records)
-                                    
-                                    # If batch size reached, yield the batch
-                                    if len(current_batch) >= batch_size:
-                                        logger.debug(f"Yielding batch of {len(current_batch)} events")
-                                        yield current_batch
-                                        current_batch = []
-                                    
-                                    logger.debug(f"Added {len(records)} events from {key}")
-                                except json.JSONDecodeError as e:
-                                    logger.error(f"Error parsing JSON from {key}: {e}")
-                                
-                            except Exception as e:
-                                logger.error(f"Error processing file {key}: {e}")
-                                continue
-                                
-                except Exception as e:
-                    logger.error(f"Error processing date {current_date} in region {region}: {e}")
+                            parsed = parse_log_filename(key)
+                            if parsed:
+                                file_time = parsed[2]
+                            else:
+                                file_time = obj["LastModified"].astimezone(timezone.utc).replace(tzinfo=None)
+                            if file_time >= cutoff:
+                                new_files.append(((account_id, source_prefix, region, day), key, file_time))
+                        if not page.get("IsTruncated"):
+                            break
+                        params['ContinuationToken'] = page["NextContinuationToken"]
+                    day += timedelta(days=1)
+            except Exception as e:
+                logger.error(f"Error listing {stream}: {e}")
+                return stream, None, None
+            return stream, cutoff, new_files
+            
+        def fetch_file(item):
+            stream, (unit, key, file_time) = item
+            account_id, _, region, day = unit
+            save_dir = None
+            if output_dir:
+                save_dir = os.path.join(output_dir, *([account_id] if account_id else []), region, day.strftime('%Y-%m-%d'))
+            raw_body = self._download_s3_object(fetch_s3, bucket_name, key, policy)
+            if raw_body is None:
+                return stream, key, file_time, None
+            _, _, result = decode_log_object((unit, key, raw_body, None, save_dir, filters))
+            return stream, key, file_time, result
+            
+        def poll():
+            # Windows are worked out here, so listing threads only read the state to skip seen files
+            now = utc_now()
+            windows = []
+            for item in streams:
+                start = state.position(item[0]) or starts.get(item[0]) or first_start or now
+                cutoff = min(start, now) - window
+                # Keep listing files that failed until they are collected or given up on
+                oldest_failure = state.oldest_failure(item[0])
+                if oldest_failure and oldest_failure < cutoff:
+                    cutoff = oldest_failure
+                windows.append((item, cutoff, now))
+            listed = []
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for stream, cutoff, new_files in bounded_map(executor, list_stream, windows, max_workers):
+                    if cutoff is None:
+                        continue
+                    state.prune(stream, cutoff)
+                    if not new_files and state.position(stream) is None:
+                        starts[stream] = utc_now()
+                    listed.extend((stream, new_file) for new_file in sorted(new_files, key=lambda f: f[2]))
                     
-                current_date += timedelta(days=1)
-        
-        # Yield any remaining events in the final batch
-        if current_batch:
-            logger.debug(f"Yielding final batch of {len(current_batch)} events")
-            yield current_batch
-        
-        logger.info(f"Collected {total_events} CloudTrail events from {len(regions)} regions")
+                if not listed:
+                    return 0
+                    
+                batcher = RecordBatcher(batch_size=batch_size, memory_budget=memory_budget)
+                files = 0
+                events = 0
+                oldest = None
+                for stream, key, file_time, result in bounded_map(executor, fetch_file, listed, max_workers * 2):
+                    if result is None:
+                        attempts = state.fail(stream, key, file_time)
+                        if attempts < max_failures:
+                            logger.warning(f"Could not collect {key}, it will be retried on the next poll")
+                        else:
+                            logger.error(f"Could not collect {key} in {attempts} polls, skipping it")
+                            state.add(stream, key, file_time)
+                        continue
+                    records, source_bytes = result
+                    yield from batcher.add(records, source_bytes)
+                    yield from batcher.flush()
+                    
+                    # The consumer asked for more, so the file's events have been handled
+                    state.add(stream, key, file_time)
+                    files += 1
+                    events += len(records)
+                    oldest = file_time if oldest is None else min(oldest, file_time)
+                    
+            if files:
+                lag = (utc_now() - oldest).total_seconds()
+                logger.info(f"Collected {events} events from {files} new files (delivered up to {lag:.0f}s ago)")
+            return files
+            
+        yield from self._follow(poll, state, poll_interval, max_poll_interval, max_polls)
         
-    def collect_management_events(self, start_time=None, end_time=None, lookup_attributes=None):
+    def follow_management_events(self, regions=None, state_file=None, batch_size=1000, poll_interval=10,
+                                 max_poll_interval=60, lookback=FOLLOW_LOOKBACK_SECONDS, max_attempts=5,
+                                 max_polls=None):
         """
-        Collect CloudTrail management events using the LookupEvents API.
+        Follow CloudTrail management events with the LookupEvents API.
+        
+        Every poll looks up the events of each region from its position (the
+        newest event processed, minus the lookback window, as events can show
+        up in LookupEvents minutes after they happened) to now, and yields the
+        events not seen yet in time order. State and polling work like in
+        follow_s3.
         
         Args:
-            start_time (datetime, optional): Start time for events. Defaults to 7 days ago.
-            end_time (datetime, optional): End time for events. Defaults to now.
-            lookup_attributes (list, optional): List of attribute dictionaries to filter events.
-                Example: [{'AttributeKey': 'EventName', 'AttributeValue': 'ConsoleLogin'}]
-                
+            regions (list, optional): Regions to follow. Defaults to the collector's region.
+            state_file (str, optional): JSON file recording the events processed, to resume from.
+            batch_size (int, optional): Maximum number of events per batch.
+            poll_interval (float, optional): Seconds between polls while events keep arriving.
+            max_poll_interval (float, optional): Longest wait between polls while no events arrive.
+            lookback (int, optional): Seconds before the position that are looked up again.
+            max_attempts (int, optional): Attempts per LookupEvents request; LookupEvents is
+                rate limited to a few requests per second per region.
+            max_polls (int, optional): Stop after this many polls. Defaults to following until interrupted.
+            
         Returns:
-            list: List of CloudTrail events.
+            generator: Yields batches of LookupEvents events.
         """
-        cloudtrail = self.session.client('cloudtrail')
+        policy = RetryPolicy(max_attempts=max_attempts)
+        state = FollowState(state_file)
+        window = timedelta(seconds=lookback)
+        clients = {region: self.session.client('cloudtrail', region_name=region) for region in regions or [self.region]}
+        logger.info(f"Following management events in {', '.join(clients)}")
         
-        # Set default times if not provided
-        if not start_time:
-            start_time = datetime.now() - timedelta(days=7)
-        if not end_time:
-            end_time = datetime.now()
+        def poll():
+            found = []
+            for region, cloudtrail in clients.items():
+                stream = f"lookup:{region}"
+                now = utc_now()
+                cutoff = min(state.position(stream) or now, now) - window
+                params = {'StartTime': cutoff.replace(tzinfo=timezone.utc), 'EndTime': now.replace(tzinfo=timezone.utc)}
+                try:
+                    while True:
+                        page = policy.call(cloudtrail.lookup_events, **params)
+                        for event in page.get('Events', []):
+                            if not state.seen(stream, event['EventId']):
+                                event_time = event['EventTime'].astimezone(timezone.utc).replace(tzinfo=None)
+                                found.append((event_time, stream, event))
+                        if not page.get('NextToken'):
+                            break
+                        params['NextToken'] = page['NextToken']
+                except Exception as e:
+                    logger.error(f"Error looking up management events in {region}: {e}")
+                    continue
+                state.prune(stream, cutoff)
+                
+            # LookupEvents returns the newest events first
+            found.sort(key=lambda entry: entry[0])
+            for start in range(0, len(found), batch_size):
+                batch = found[start:start + batch_size]
+                yield [event for _, _, event in batch]
+                for event_time, stream, event in batch:
+                    state.add(stream, event['EventId'], event_time)
+            if found:
+                lag = (utc_now() - found[-1][0]).total_seconds()
+                logger.info(f"Collected {len(found)} new management events (newest {lag:.0f}s old)")
+            return len(found)
             
-        logger.info(f"Collecting CloudTrail management events from {start_time} to {end_time}")
+        yield from self._follow(poll, state, poll_interval, max_poll_interval, max_polls)
         
-        # Prepare parameters for lookup_events
-        params = {
-            'StartTime': start_time,
-            'EndTime': end_time
-        }
+    def consume_sqs(self, queue_url, batch_size=1000, memory_budget=None, max_workers=8, output_dir=None,
+                    event_names=None, event_sources=None, max_attempts=5, wait_time=20, visibility_timeout=None,
+                    endpoint_url=None, stop_when_empty=False):
+        """
+        Collect CloudTrail logs announced by S3 event notifications on an SQS queue.
+        
+        Messages are received with long polling, and the log files they
+        announce - S3 notifications sent directly or through SNS, or
+        EventBridge events - are downloaded and parsed like in collect_from_s3,
+        with no S3 listing at all. Batches are cut at the end of every file. A
+        message is only deleted once all its files were processed and the
+        consumer asked for the batch after their last one; messages with a
+        file that could not be collected reappear on the queue when their
+        visibility timeout expires, and should go to a dead-letter queue
+        after a few attempts. Several consumers can share a queue.
         
-        if lookup_attributes:
-            params['LookupAttributes'] = lookup_attributes
+        Args:
+            queue_url (str): URL of the SQS queue.
+            batch_size (int, optional): Number of events to process in memory before yielding a batch.
+            memory_budget (int, optional): Estimated size in bytes a batch may occupy in memory.
+            max_workers (int, optional): Number of concurrent S3 downloads.
+            output_dir (str, optional): Directory to save raw log files. If None, logs are not saved locally.
+            event_names (list, optional): Only collect events with one of these eventName values.
+            event_sources (list, optional): Only collect events from these event sources.
+            max_attempts (int, optional): Attempts per S3 request.
+            wait_time (int, optional): Seconds a receive waits for messages (long polling, at most 20).
+            visibility_timeout (int, optional): Seconds received messages stay hidden from other
+                consumers. Defaults to the queue's setting.
+            endpoint_url (str, optional): Endpoint of an SQS-compatible service, e.g. a local ElasticMQ.
+            stop_when_empty (bool, optional): Stop once a receive finds the queue empty, instead of
+                waiting for messages until interrupted. A receive that keeps failing then ends the
+                run with its error; otherwise it is logged and retried with a growing delay.
             
-        paginator = cloudtrail.get_paginator('lookup_events')
-        all_events = []
+        Returns:
+            generator: Yields batches of parsed CloudTrail events.
+        """
+        # Queue URLs name their region, e.g. https://sqs.eu-west-1.amazonaws.com/123456789012/queue
+        match = re.search(r'sqs[.-]([a-z]{2}(?:-gov|-iso[a-z]?)?-[a-z]+-\d+)\.', queue_url)
+        sqs = self.session.client('sqs', region_name=match.group(1) if match else self.region,
+                                  endpoint_url=endpoint_url)
+        policy = RetryPolicy(max_attempts=max_attempts, limiter=AdaptiveConcurrencyLimiter(max_workers))
+        fetch_s3 = self.session.client('s3', config=Config(
+            retries={'max_attempts': 1, 'mode': 'standard'}, max_pool_connections=max(max_workers, 10)
+        ))
         
-        try:
-            for page in paginator.paginate(**params):
-                events = page.get('Events', [])
-                all_events.extend(events)
-                logger.debug(f"Retrieved {len(events)} events")
-                
-        except ClientError as e:
-            logger.error(f"Error retrieving management events: {e}")
+        filters = {}
+        if event_names:
+            filters['eventName'] = set(event_names)
+        if event_sources:
+            filters['eventSource'] = set(event_sources)
             
-        logger.info(f"Collected {len(all_events)} management events")
-        return all_events
+        totals = {'messages': 0, 'files': 0, 'events': 0, 'failed': 0}
+        receive_errors = {'count': 0}
         
-    def discover_trails(self):
+        def receive():
+            # Gather enough files to keep the workers busy, waiting only while nothing was received yet
+            messages = []
+            files = 0
+            while files < max_workers * 2:
+                params = {'QueueUrl': queue_url, 'MaxNumberOfMessages': 10,
+                          'WaitTimeSeconds': 0 if messages else wait_time}
+                if visibility_timeout is not None:
+                    params['VisibilityTimeout'] = visibility_timeout
+                try:
+                    received = policy.call(sqs.receive_message, **params).get('Messages', [])
+                except Exception as e:
+                    if stop_when_empty:
+                        raise
+                    # Keep consuming: back off and try again, keeping anything already received
+                    receive_errors['count'] += 1
+                    delay = min(SQS_MAX_RECEIVE_BACKOFF, 2 ** receive_errors['count'])
+                    logger.error(f"Error receiving messages from {queue_url}, retrying in {delay}s: {e}")
+                    if not messages:
+                        time.sleep(delay)
+                    break
+                receive_errors['count'] = 0
+                if not received:
+                    break
+                for message in received:
+                    try:
+                        objects = parse_s3_notification(message['Body'])
+                    except ValueError as e:
+                        logger.warning(f"Ignoring message {message.get('MessageId')} that is not a notification: {e}")
+                        objects = []
+                    # Only log files are collected; digests and other objects are acknowledged right away
+                    objects = [(bucket, key) for bucket, key in objects
+                               if key.endswith('.gz') and not is_digest_key(key)]
+                    messages.append((message, objects))
+                    files += len(objects)
+            return messages
+            
+        def fetch_file(item):
+            message_id, bucket, key = item
+            parsed = parse_log_filename(key)
+            account_id, region, delivered = parsed if parsed else (None, None, None)
+            save_dir = None
+            if output_dir:
+                save_dir = os.path.join(output_dir, *(part for part in (account_id, region) if part),
+                                        *([delivered.strftime('%Y-%m-%d')] if delivered else []))
+            raw_body = self._download_s3_object(fetch_s3, bucket, key, policy)
+            if raw_body is None:
+                return message_id, key, None
+            _, _, result = decode_log_object(((account_id, None, region, None), key, raw_body, None, save_dir, filters))
+            return message_id, key, result
+            
+        def acknowledge(messages):
+            for start in range(0, len(messages), 10):
+                entries = [{'Id': str(i), 'ReceiptHandle': message['ReceiptHandle']}
+                           for i, message in enumerate(messages[start:start + 10])]
+                try:
+                    response = policy.call(sqs.delete_message_batch, QueueUrl=queue_url, Entries=entries)
+                except Exception as e:
+                    logger.error(f"Could not delete {len(entries)} messages, they will be received again: {e}")
+                    continue
+                for failure in response.get('Failed', []):
+                    logger.warning(f"Could not delete message: {failure.get('Message') or failure.get('Code')}")
+                    
+        logger.info(f"Consuming S3 notifications from {queue_url}")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                messages = receive()
+                if not messages:
+                    if stop_when_empty:
+                        break
+                    continue
+                    
+                remaining = {message['MessageId']: len(objects) for message, objects in messages}
+                failed = set()
+                done = [message for message, objects in messages if not objects]
+                items = [(message['MessageId'], bucket, key) for message, objects in messages for bucket, key in objects]
+                by_id = {message['MessageId']: message for message, _ in messages}
+                
+                batcher = RecordBatcher(batch_size=batch_size, memory_budget=memory_budget)
+                try:
+                    for message_id, key, result in bounded_map(executor, fetch_file, items, max_workers * 2):
+                        if result is None:
+                            failed.add(message_id)
+                            totals['failed'] += 1
+                        else:
+                            records, source_bytes = result
+                            yield from batcher.add(records, source_bytes)
+                            yield from batcher.flush()
+                            totals['files'] += 1
+                            totals['events'] += len(records)
+                            
+                        # The consumer asked for more, so the file's events have been handled
+                        remaining[message_id] -= 1
+                        if not remaining[message_id] and message_id not in failed:
+                            done.append(by_id[message_id])
+                finally:
+                    # Also acknowledge what an interrupted round got through
+                    acknowledge(done)
+                    totals['messages'] += len(done)
+                    
+                if failed:
+                    logger.warning(f"{len(failed)} messages had files that could not be collected; "
+                                   f"they will be received again after their visibility timeout")
+                logger.info(f"Processed {totals['messages']} messages, {totals['files']} files and "
+                            f"{totals['events']} events so far")
+                            
+        if totals['failed']:
+            logger.warning(f"{totals['failed']} files could not be collected")
+        logger.info(f"Queue is empty, collected {totals['events']} CloudTrail events from {totals['files']} files")
+        
+    def _follow(self, poll, state, poll_interval, max_poll_interval, max_polls=None):
         """
-        Discover CloudTrail trails in the account.
+        Run polls on an adaptive schedule, saving the state after each one and when stopped.
         
+        Args:
+            poll (callable): Generator function yielding the batches of one poll and returning
+                the number of new items it found.
+            state (FollowState): State to save after every poll.
+            poll_interval (float): Seconds between polls while items keep arriving.
+            max_poll_interval (float): Longest wait between polls while no items arrive.
+            max_polls (int, optional): Stop after this many polls.
+            
         Returns:
-            list: List of CloudTrail trail configurations.
+            generator: Yields the batches of every poll.
         """
-        cloudtrail = self.session.client('cloudtrail')
-        
+        schedule = PollInterval(poll_interval, max_poll_interval)
+        polls = 0
         try:
-            response = cloudtrail.describe_trails()
-            trails = response.get('trailList', [])
-            logger.info(f"Discovered {len(trails)} CloudTrail trails")
-            return trails
-        except ClientError as e:
-            logger.error(f"Error discovering CloudTrail trails: {e}")
-            return []
-
-    def process_local_logs(self, directory, recursive=False, batch_size=1000):
+            while True:
+                schedule.start()
+                found = yield from poll()
+                state.save()
+                polls += 1
+                if max_polls and polls >= max_polls:
+                    return
+                schedule.wait(found)
+        finally:
+            # Also keep what an interrupted poll got through
+            state.save()
+            
+    def process_local_logs(self, directory, recursive=False, batch_size=1000, memory_budget=None,
+                           file_filter=None, on_file=None, start_date=None, end_date=None, regions=None,
+                           discovery_workers=1):
         """
         Process CloudTrail logs from a local directory.
         
+        Tar and zip archives in the directory are read member by member
+        without extracting them, including .json.gz members.
+        
+        With a date range or regions, files are selected by the delivery time
+        and region in their CloudTrail file names, and directories of the
+        AWSLogs/<account>/CloudTrail/<region>/YYYY/MM/DD layout outside the
+        selection are not entered at all. Files whose names don't follow the
+        CloudTrail format are always read.
+        
         Args:
-            directory (str): Path to directory containing CloudTrail logs.
+            directory (str): Path to directory containing CloudTrail logs, or to a single archive of them.
             recursive (bool, optional): Whether to search subdirectories recursively. Defaults to False.
             batch_size (int, optional): Number of events to process in memory before yielding a batch.
+            memory_budget (int, optional): Estimated size in bytes a batch may occupy in memory.
+                When set, batches are cut by size instead of by batch_size.
+            file_filter (callable, optional): Called with the path relative to directory and the
+                size of each file before it is read; files for which it returns False are skipped.
+            on_file (callable, optional): Called with the relative path, the records and the size
+                of each file after it is parsed, e.g. to index it.
+            start_date (str, optional): First delivery day to read, in YYYY-MM-DD format.
+            end_date (str, optional): Last delivery day to read, in YYYY-MM-DD format.
+            regions (list, optional): Regions to read.
+            discovery_workers (int, optional): Number of threads listing directories.
             
         Returns:
             generator: Yields batches of parsed CloudTrail events.
@@ -398,28 +1413,55 @@ class AWSLogCollector:
             logger.error(f"Directory does not exist: {directory}")
             return
         
-        if not os.path.isdir(directory):
+        # A single archive can be given in place of a directory
+        single_archive = os.path.isfile(directory) and is_archive(directory)
+        if not os.path.isdir(directory) and not single_archive:
             logger.error(f"Path is not a directory: {directory}")
             return
         
         total_events = 0
-        current_batch = []
+        batcher = RecordBatcher(batch_size=batch_size, memory_budget=memory_budget)
         processed_files = 0
+        skipped_files = 0
+        pruned_files = 0
+        pruned_dirs = 0
         
-        # Function to process a single file
-        def process_file(file_path):
-            nonlocal total_events, current_batch, processed_files
+        # Dates and regions are matched against file and directory names, before anything is opened
+        first_day = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        regions = set(regions) if regions else None
+        pruning = bool(first_day or last_day or regions)
+        
+        def wanted_file(name):
+            nonlocal pruned_files
+            parsed = parse_log_filename(name) if pruning else None
+            if parsed is None:
+                return True
+            _, region, delivered = parsed
+            if ((regions and region not in regions) or (first_day and delivered.date() < first_day) or
+                    (last_day and delivered.date() > last_day)):
+                pruned_files += 1
+                return False
+            return True
+            
+        def wanted_dir(parts):
+            nonlocal pruned_dirs
+            if log_dir_in_range(parts, first_day, last_day, regions):
+                return True
+            pruned_dirs += 1
+            return False
+        
+        # Function to process the content of a single log file
+        def process_data(key, name, size, read):
+            nonlocal total_events, processed_files, skipped_files
             
             try:
-                logger.debug(f"Processing file: {file_path}")
-                
-                # Check if file is gzipped
-                if file_path.endswith('.gz'):
-                    with gzip.open(file_path, 'rb') as f:
-                        file_data = f.read().decode('utf-8')
-                else:
-                    with open(file_path, 'r') as f:
-                        file_data = f.read()
+                if file_filter and not file_filter(key, size):
+                    skipped_files += 1
+                    return
+                    
+                logger.debug(f"Processing file: {name}")
+                file_data = read()
                 
                 # Parse the JSON data
                 try:
@@ -434,61 +1476,266 @@ class AWSLogCollector:
                         records = [json_data]
                     else:
                         # Unknown format
-                        logger.warning(f"Unknown log format in file: {file_path}")
+                        logger.warning(f"Unknown log format in file: {name}")
                         return
                     
                     # Try to extract region from filename if not in records
-                    region = None
-                    filename = os.path.basename(file_path)
-                    for part in filename.split('_'):
-                        if part.startswith(('us-', 'eu-', 'ap-', 'sa-', 'ca-')):
-                            region = part
-                            break
+                    parsed_name = parse_log_filename(name)
+                    region = parsed_name[1] if parsed_name else None
                     
                     # Add region information to each record if missing
                     for record in records:
                         if 'awsRegion' not in record and region:
                             record['awsRegion'] = region
                     
-                    # Add records to current batch
-                    current_batch.extend(records)
+                    if on_file:
+                        on_file(key, records, size)
+                        
+                    # Add records to the batcher, yielding any batches that fill up
                     total_events += len(records)
                     processed_files += 1
+                    yield from batcher.add(records, len(file_data))
                     
-                    # If batch size reached, yield the batch
-                    if len(current_batch) >= batch_size:
-                        logger.debug(f"Yielding batch of {len(current_batch)} events")
-                        yield current_batch
-                        current_batch = []
-                    
-                    logger.debug(f"Added {len(records)} events from {file_path}")
+                    logger.debug(f"Added {len(records)} events from {name}")
                 except json.JSONDecodeError as e:
-                    logger.error(f"Error parsing JSON from {file_path}: {e}")
+                    logger.error(f"Error parsing JSON from {name}: {e}")
                 
             except Exception as e:
-                logger.error(f"Error processing file {file_path}: {e}")
+                logger.error(f"Error processing file {name}: {e}")
+        
+        def read_file(file_path):
+            # Check if file is gzipped
+            if file_path.endswith('.gz'):
+                with gzip.open(file_path, 'rb') as f:
+                    return f.read().decode('utf-8')
+            with open(file_path, 'r') as f:
+                return f.read()
+        
+        # Function to process a single file, or every log file in an archive
+        def process_file(file_path):
+            key = os.path.relpath(file_path, directory) if not single_archive else os.path.basename(file_path)
+            if not is_archive(file_path):
+                size = os.path.getsize(file_path) if file_filter or on_file else None
+                yield from process_data(key, file_path, size, lambda: read_file(file_path))
+                return
+                
+            # Members are read straight from the archive; their keys extend the archive's path
+            logger.info(f"Reading log files from archive: {file_path}")
+            try:
+                for member, size, read in iter_archive_members(file_path):
+                    if not wanted_file(member):
+                        continue
+                    yield from process_data(f"{key}/{member}", f"{file_path}/{member}", size,
+                                            lambda read=read: read().decode('utf-8'))
+            except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as e:
+                logger.error(f"Error reading archive {file_path}: {e}")
+        
+        def is_log_file(file_path):
+            # Only process .json or .gz files, and archives of them
+            if is_archive(file_path):
+                return True
+            return file_path.endswith(('.json', '.gz')) and wanted_file(file_path)
         
         # Walk through directory structure
-        if recursive:
-            for root, _, files in os.walk(directory):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # Only process .json or .gz files
-                    if file_path.endswith(('.json', '.gz')):
-                        yield from process_file(file_path)
+        if single_archive:
+            yield from process_file(directory)
         else:
-            # Only process files in the top-level directory
-            for file in os.listdir(directory):
-                file_path = os.path.join(directory, file)
-                if os.path.isfile(file_path) and file_path.endswith(('.json', '.gz')):
+            for file_path in scan_log_files(directory, recursive, wanted_dir if pruning else None,
+                                            discovery_workers):
+                if is_log_file(file_path):
                     yield from process_file(file_path)
         
         # Yield any remaining events in the final batch
-        if current_batch:
-            logger.debug(f"Yielding final batch of {len(current_batch)} events")
-            yield current_batch
+        yield from batcher.flush()
         
+        if pruned_files or pruned_dirs:
+            logger.info(f"Skipped {pruned_files} files and {pruned_dirs} directories outside the "
+                        f"selected dates and regions")
+        if skipped_files:
+            logger.info(f"Skipped {skipped_files} files excluded by the file filter")
         logger.info(f"Processed {processed_files} files containing {total_events} CloudTrail events")
+        
+    def validate_s3_logs(self, bucket_name, prefix="", start_date=None, end_date=None, regions=None,
+                         accounts=None, all_accounts=False, max_workers=8, hash_workers=None,
+                         logs_dir=None, max_attempts=5):
+        """
+        Validate CloudTrail log files in S3 against their digest files.
+        
+        The digest files of every selected region-day are listed and read, their
+        chain is verified, and every log file they name is hashed. Downloads run
+        on max_workers threads and hashing on hash_workers processes, so
+        validation runs at network speed. Log files already saved by a
+        collection with --output-dir are hashed from logs_dir instead of being
+        downloaded again.
+        
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            prefix (str, optional): CloudTrail prefix, e.g. 'AWSLogs/123456789012/CloudTrail/'
+            start_date (str, optional): Start date in YYYY-MM-DD format
+            end_date (str, optional): End date in YYYY-MM-DD format
+            regions (list, optional): Regions to validate
+            accounts (list, optional): Account IDs to validate in a multi-account bucket
+            all_accounts (bool, optional): Validate every account found in the bucket
+            max_workers (int, optional): Number of concurrent S3 requests
+            hash_workers (int, optional): Number of hashing processes. Defaults to the number of CPUs.
+            logs_dir (str, optional): Directory of raw logs saved by collect_from_s3 with output_dir
+            max_attempts (int, optional): Attempts per S3 request
+            
+        Returns:
+            IntegrityReport: Outcome of the validation
+        """
+        s3 = self.session.client('s3')
+        fetch_s3 = self.session.client('s3', config=Config(
+            retries={'max_attempts': 1}, max_pool_connections=max(max_workers, 10)
+        ))
+        policy = RetryPolicy(max_attempts=max_attempts, limiter=AdaptiveConcurrencyLimiter(max_workers))
+        validator = DigestValidator()
+        
+        days = date_range(start_date, end_date)
+        if not days:
+            logger.warning(f"Start date {start_date} is after end date {end_date}, nothing to validate")
+            return validator.report
+        
+        if accounts or all_accounts:
+            sources = self._discover_account_sources(bucket_name, accounts, regions)
+        else:
+            prefix = self._resolve_cloudtrail_prefix(s3, bucket_name, prefix)
+            sources = [(None, prefix, regions or self._discover_regions(s3, bucket_name, prefix))]
+        
+        # Digests of AWSLogs/<account>/CloudTrail/ are delivered under AWSLogs/<account>/CloudTrail-Digest/
+        units = []
+        for account_id, source_prefix, source_regions in sources:
+            if not source_prefix.endswith('CloudTrail/'):
+                logger.error(f"Cannot locate the digest files of prefix '{source_prefix}'")
+                continue
+            digest_prefix = source_prefix[:-len('CloudTrail/')] + 'CloudTrail-Digest/'
+            units.extend((account_id, f"{digest_prefix}{region}/{day.strftime('%Y/%m/%d')}/", region, day)
+                         for region in source_regions for day in days)
+        
+        # Guards the report lists filled in from the download threads
+        report_lock = threading.Lock()
+        
+        def list_digests(unit):
+            keys = []
+            params = {'Bucket': bucket_name, 'Prefix': unit[1]}
+            try:
+                while True:
+                    page = policy.call(fetch_s3.list_objects_v2, **params)
+                    keys.extend(obj['Key'] for obj in page.get('Contents', []) if is_digest_key(obj['Key']))
+                    if not page.get('IsTruncated'):
+                        break
+                    params['ContinuationToken'] = page['NextContinuationToken']
+            except Exception as e:
+                # The region-day was not checked, which must not pass for intact
+                logger.error(f"Error listing digests under {unit[1]}: {e}")
+                with report_lock:
+                    validator.report.unlisted_prefixes.append(unit[1])
+            return keys
+        
+        def fetch_digest(key):
+            return key, self._download_s3_object(fetch_s3, bucket_name, key, policy)
+        
+        def local_copy(key):
+            # collect_from_s3 saves logs decompressed as <logs_dir>/[<account>/]<region>/<YYYY-MM-DD>/<name>.json
+            parts = key.split('/')
+            if not logs_dir or len(parts) < 6 or not key.endswith('.json.gz'):
+                return None
+            region, day = parts[-5], '-'.join(parts[-4:-1])
+            account_id = parts[parts.index('CloudTrail') - 1] if 'CloudTrail' in parts else None
+            filename = saved_log_filename(key)
+            for path in (os.path.join(logs_dir, account_id or '', region, day, filename),
+                         os.path.join(logs_dir, region, day, filename)):
+                if os.path.isfile(path):
+                    return path
+            return None
+        
+        def fetch_log(item):
+            log_bucket, key, _ = item
+            path = local_copy(key)
+            if path:
+                return (log_bucket, key), path, None
+            try:
+                resp = policy.call(fetch_s3.get_object, Bucket=log_bucket or bucket_name, Key=key)
+                return (log_bucket, key), None, resp['Body'].read()
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                    return (log_bucket, key), None, None
+                logger.error(f"Error downloading log file {key}: {e}")
+            except Exception as e:
+                logger.error(f"Error downloading log file {key}: {e}")
+            # A failed download says nothing about the file, so it is not reported as missing
+            with report_lock:
+                validator.report.unreadable.append(key)
+            return None
+        
+        logger.info(f"Validating CloudTrail logs in bucket '{bucket_name}' between {days[0]} and {days[-1]}")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+                ProcessPoolExecutor(max_workers=hash_workers) as hash_executor:
+            digest_keys = (key for keys in bounded_map(executor, list_digests, units, max_workers) for key in keys)
+            for key, data in bounded_map(executor, fetch_digest, digest_keys, max_workers * 2):
+                if data is None:
+                    validator.report.unreadable_digests.append(key)
+                else:
+                    validator.add_digest(key, data)
+            validator.check_chain()
+            
+            expected = validator.expected_hashes()
+            logger.info(f"Hashing {len(expected)} log files named in {validator.report.digests} digests")
+            downloads = (item for item in bounded_map(executor, fetch_log, expected, max_workers * 2) if item)
+            hashes = bounded_map(hash_executor, hash_log_object, downloads, (hash_workers or os.cpu_count() or 1) * 2)
+            validator.check_log_hashes(expected, hashes)
+        
+        return validator.report
+        
+    def validate_local_logs(self, directory, hash_workers=None):
+        """
+        Validate a local copy of a CloudTrail bucket against its digest files.
+        
+        The directory must keep the layout of the bucket, e.g. a copy made with
+        'aws s3 sync', so that the log files named in each digest can be found
+        at the same relative path as the digest. Files are hashed on
+        hash_workers processes.
+        
+        Args:
+            directory (str): Directory containing CloudTrail logs and CloudTrail-Digest files
+            hash_workers (int, optional): Number of hashing processes. Defaults to the number of CPUs.
+            
+        Returns:
+            IntegrityReport: Outcome of the validation
+        """
+        validator = DigestValidator()
+        
+        # Bucket key of the directory root, learned from where digests say they were stored
+        roots = set()
+        for root, _, files in os.walk(directory):
+            for file in files:
+                file_path = os.path.join(root, file)
+                key = os.path.relpath(file_path, directory).replace(os.sep, '/')
+                if not is_digest_key(key):
+                    continue
+                with open(file_path, 'rb') as f:
+                    object_key = validator.add_digest(key, f.read())
+                if object_key and object_key.endswith(key):
+                    roots.add(object_key[:-len(key)])
+        validator.check_chain()
+        
+        if len(roots) > 1:
+            logger.warning(f"Digests disagree about the bucket prefix of {directory}: {', '.join(sorted(roots))}")
+        root = min(roots, key=len) if roots else ''
+        
+        def local_item(item):
+            log_bucket, key, _ = item
+            path = os.path.join(directory, *key[len(root):].split('/')) if key.startswith(root) else None
+            return (log_bucket, key), path if path and os.path.isfile(path) else None, None
+        
+        expected = validator.expected_hashes()
+        logger.info(f"Hashing {len(expected)} log files named in {validator.report.digests} digests")
+        with ProcessPoolExecutor(max_workers=hash_workers) as hash_executor:
+            hashes = bounded_map(hash_executor, hash_log_object, (local_item(item) for item in expected),
+                                 (hash_workers or os.cpu_count() or 1) * 2)
+            validator.check_log_hashes(expected, hashes)
+        
+        return validator.report
 
     def discover_resources(self, resource_types=None, regions=None, output_format='json', output_file=None):
         """
@@ -752,28 +1999,27 @@ class AWSLogCollector:
             response = iam.generate_credential_report()
             logger.info(f"Credential report generation status: {response.get('State')}")
             
-            # Wait for report to be generated with timeout
-            max_attempts = 10
-            attempt = 0
+            # Poll for the report with exponential backoff until it is ready or the timeout passes
+            delay = 0.5
+            waited = 0.0
             
-            while attempt < max_attempts:
+            while True:
                 try:
                     response = iam.get_credential_report()
                     if response.get('Content'):
                         break
                 except Exception as e:
-                    if 'ReportNotPresent' in str(e) or 'ReportInProgress' in str(e):
-                        logger.info(f"Report not ready yet, attempt {attempt + 1}/{max_attempts}")
-                        attempt += 1
-                        import time
-                        time.sleep(2)
-                        continue
-                    else:
+                    if not ('ReportNotPresent' in str(e) or 'ReportInProgress' in str(e) or is_retryable_error(e)):
                         raise
-                
-            if attempt >= max_attempts:
-                logger.error("Timed out waiting for credential report")
-                return None
+                        
+                if waited >= CREDENTIAL_REPORT_TIMEOUT:
+                    logger.error("Timed out waiting for credential report")
+                    return None
+                    
+                logger.info(f"Report not ready yet, checking again in {delay:.1f}s")
+                time.sleep(delay)
+                waited += delay
+                delay = min(delay * 2, 8.0)
             
             # Get and process the credential report
             report_csv = response['Content'].decode('utf-8')
@@ -0,0 +1,279 @@
+"""
+Columnar in-memory timeline for large sets of normalized CloudTrail events.
+"""
+
+import logging
+from datetime import datetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Low-cardinality fields stored as integer codes into a per-field category list
+CATEGORICAL_FIELDS = (
+    'event_name', 'event_source', 'event_type', 'username',
+    'aws_region', 'source_ip', 'user_agent'
+)
+
+class ColumnarTimeline:
+    """
+    Timeline that stores events as NumPy arrays instead of a list of dicts.
+
+    event_time is held as datetime64[s] and the fields in CATEGORICAL_FIELDS as
+    integer codes, so sorting, filtering and group-by counts run as vectorized
+    array operations. Nested fields (resources, raw_data) are not kept.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty columnar timeline.
+
+        Raises:
+            ImportError: If NumPy is not installed
+        """
+        if np is None:
+            raise ImportError("The columnar timeline requires NumPy: pip install scope-forensics[columnar]")
+
+        self.event_time = np.array([], dtype='datetime64[s]')
+        self.event_id = np.array([], dtype=object)
+        self.codes = {field: np.array([], dtype=np.int32) for field in CATEGORICAL_FIELDS}
+        self.categories = {field: [] for field in CATEGORICAL_FIELDS}
+        self._category_codes = {field: {} for field in CATEGORICAL_FIELDS}
+        self._pending = []
+
+    @classmethod
+    def from_columns(cls, columns):
+        """
+        Create a timeline from the output of CloudTrailParser.batch_normalize_columns.
+
+        Args:
+            columns (dict): Mapping of field name to list of values.
+
+        Returns:
+            ColumnarTimeline: New timeline containing the events.
+        """
+        timeline = cls()
+        timeline.add_columns(columns)
+        return timeline
+
+    @classmethod
+    def from_events(cls, events):
+        """
+        Create a timeline from a list of normalized event dicts.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            ColumnarTimeline: New timeline containing the events.
+        """
+        timeline = cls()
+        timeline.add_events(events)
+        return timeline
+
+    def add_columns(self, columns):
+        """
+        Append a batch of normalized events given as columns.
+
+        Args:
+            columns (dict): Mapping of field name to list of values, as returned by
+                CloudTrailParser.batch_normalize_columns.
+        """
+        times = columns.get('event_time', [])
+        if not len(times):
+            return
+
+        chunk = {
+            'event_time': np.array(times, dtype='datetime64[s]'),
+            'event_id': np.array(columns.get('event_id', [None] * len(times)), dtype=object)
+        }
+        for field in CATEGORICAL_FIELDS:
+            chunk[field] = self._encode(field, columns.get(field, [None] * len(times)))
+
+        self._pending.append(chunk)
+
+    def add_events(self, events):
+        """
+        Append a batch of normalized event dicts.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+        """
+        fields = ('event_time', 'event_id') + CATEGORICAL_FIELDS
+        self.add_columns({field: [event.get(field) for event in events] for field in fields})
+
+    def __len__(self):
+        self._consolidate()
+        return len(self.event_time)
+
+    def sort(self):
+        """
+        Sort events by timestamp, keeping events without a timestamp last.
+
+        Returns:
+            ColumnarTimeline: This timeline, for chaining.
+        """
+        self._consolidate()
+        order = np.argsort(self.event_time, kind='stable')
+        self._take(order)
+        return self
+
+    def time_mask(self, start=None, end=None):
+        """
+        Build a boolean mask selecting events in [start, end).
+
+        Args:
+            start (datetime or str, optional): Inclusive lower bound.
+            end (datetime or str, optional): Exclusive upper bound.
+
+        Returns:
+            numpy.ndarray: Boolean mask over the events.
+        """
+        self._consolidate()
+        mask = ~np.isnat(self.event_time)
+        if start is not None:
+            mask &= self.event_time >= np.datetime64(start, 's')
+        if end is not None:
+            mask &= self.event_time < np.datetime64(end, 's')
+        return mask
+
+    def field_mask(self, field, values):
+        """
+        Build a boolean mask selecting events whose field matches one of the values.
+
+        Args:
+            field (str): One of CATEGORICAL_FIELDS or 'event_id'.
+            values (str or list): Value or list of values to match.
+
+        Returns:
+            numpy.ndarray: Boolean mask over the events.
+        """
+        self._consolidate()
+        if isinstance(values, str) or values is None:
+            values = [values]
+
+        if field == 'event_id':
+            return np.isin(self.event_id, list(values))
+
+        lookup = self._category_codes[field]
+        codes = [lookup[value] for value in values if value in lookup]
+        return np.isin(self.codes[field], codes)
+
+    def filter(self, mask):
+        """
+        Select the events where mask is True.
+
+        Args:
+            mask (numpy.ndarray): Boolean mask, e.g. combined from time_mask and field_mask.
+
+        Returns:
+            ColumnarTimeline: New timeline with copies of this timeline's categories, so
+                events added to it don't change this timeline's code tables.
+        """
+        self._consolidate()
+        filtered = ColumnarTimeline()
+        filtered.categories = {field: list(categories) for field, categories in self.categories.items()}
+        filtered._category_codes = {field: dict(lookup) for field, lookup in self._category_codes.items()}
+        filtered.event_time = self.event_time[mask]
+        filtered.event_id = self.event_id[mask]
+        filtered.codes = {field: codes[mask] for field, codes in self.codes.items()}
+        return filtered
+
+    def group_counts(self, field, mask=None):
+        """
+        Count events per value of a categorical field.
+
+        Args:
+            field (str): One of CATEGORICAL_FIELDS.
+            mask (numpy.ndarray, optional): Only count events where the mask is True.
+
+        Returns:
+            list: (value, count) tuples, most frequent first.
+        """
+        self._consolidate()
+        codes = self.codes[field] if mask is None else self.codes[field][mask]
+        counts = np.bincount(codes, minlength=len(self.categories[field]))
+        # Ties keep the order values were first seen in
+        order = np.argsort(-counts, kind='stable')
+        categories = self.categories[field]
+        return [(categories[code], int(counts[code])) for code in order if counts[code]]
+
+    def to_events(self):
+        """
+        Convert the timeline back to normalized event dicts.
+
+        Returns:
+            generator: Yields normalized events without resources or raw_data.
+        """
+        self._consolidate()
+        decoded = {field: [self.categories[field][code] for code in self.codes[field].tolist()]
+                   for field in CATEGORICAL_FIELDS}
+        times = self.event_time.astype(datetime).tolist()
+
+        for i, event_id in enumerate(self.event_id.tolist()):
+            event = {'event_id': event_id, 'event_time': times[i]}
+            for field in CATEGORICAL_FIELDS:
+                event[field] = decoded[field][i]
+            yield event
+
+    def to_arrow(self):
+        """
+        Convert the timeline to an Apache Arrow table with dictionary-encoded columns.
+
+        Returns:
+            pyarrow.Table: Table with one column per stored field.
+
+        Raises:
+            ImportError: If pyarrow is not installed
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError(
+                "Converting to Arrow requires pyarrow. "
+                "Install it with: pip install scope-forensics[arrow]"
+            )
+
+        self._consolidate()
+        arrays = {
+            'event_time': pa.array(self.event_time),
+            'event_id': pa.array(self.event_id.tolist(), type=pa.string())
+        }
+        for field in CATEGORICAL_FIELDS:
+            arrays[field] = pa.DictionaryArray.from_arrays(
+                pa.array(self.codes[field]), pa.array(self.categories[field], type=pa.string())
+            )
+        return pa.table(arrays)
+
+    def _encode(self, field, values):
+        lookup = self._category_codes[field]
+        categories = self.categories[field]
+        codes = []
+        for value in values:
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(categories)
+                categories.append(value)
+            codes.append(code)
+        return np.array(codes, dtype=np.int32)
+
+    def _consolidate(self):
+        if not self._pending:
+            return
+
+        chunks = self._pending
+        self._pending = []
+        self.event_time = np.concatenate([self.event_time] + [chunk['event_time'] for chunk in chunks])
+        self.event_id = np.concatenate([self.event_id] + [chunk['event_id'] for chunk in chunks])
+        for field in CATEGORICAL_FIELDS:
+            self.codes[field] = np.concatenate([self.codes[field]] + [chunk[field] for chunk in chunks])
+        logger.debug(f"Consolidated {len(chunks)} batches into {len(self.event_time)} events")
+
+    def _take(self, order):
+        self.event_time = self.event_time[order]
+        self.event_id = self.event_id[order]
+        for field in CATEGORICAL_FIELDS:
+            self.codes[field] = self.codes[field][order]
@@ -0,0 +1,91 @@
+"""
+Streaming deduplication of CloudTrail events across overlapping log sources.
+"""
+
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+class EventDeduplicator:
+    """
+    Drops events whose eventID has already been seen, using bounded memory.
+
+    Seen IDs are kept in one hash set per time window of event_time. A
+    duplicate always carries the same event_time as the original, so each
+    event is only checked against its own window. When the total number of
+    remembered IDs exceeds max_keys, the least recently used windows are
+    forgotten first; sources are usually read roughly in time order, so old
+    windows are rarely needed again.
+    """
+
+    def __init__(self, window_minutes=60, max_keys=1000000):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            window_minutes (int, optional): Width of each time window in minutes.
+            max_keys (int, optional): Maximum number of event IDs to remember.
+        """
+        self.window_seconds = window_minutes * 60
+        self.max_keys = max_keys
+        self.windows = OrderedDict()
+        self.key_count = 0
+        self.duplicates = 0
+        self.evicted_windows = 0
+
+    def process(self, events):
+        """
+        Remove events that were already seen.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            list: Events whose eventID was not seen before. Events without an
+                eventID are always kept.
+        """
+        unique_events = []
+        windows = self.windows
+
+        for event in events:
+            event_id = event.get('event_id')
+            if not event_id:
+                unique_events.append(event)
+                continue
+
+            event_time = event.get('event_time')
+            window = int(event_time.timestamp()) // self.window_seconds if event_time else None
+
+            seen = windows.get(window)
+            if seen is None:
+                seen = windows[window] = set()
+            else:
+                windows.move_to_end(window)
+
+            if event_id in seen:
+                self.duplicates += 1
+                continue
+
+            seen.add(event_id)
+            self.key_count += 1
+            unique_events.append(event)
+
+        if self.key_count > self.max_keys:
+            self._evict()
+
+        return unique_events
+
+    def close(self):
+        """Log deduplication statistics."""
+        logger.info(f"Removed {self.duplicates} duplicate events")
+        if self.evicted_windows:
+            logger.warning(f"Deduplication state exceeded {self.max_keys} event IDs; "
+                           f"forgot {self.evicted_windows} time windows, late duplicates may remain")
+
+    def _evict(self):
+        while self.key_count > self.max_keys and len(self.windows) > 1:
+            window, seen = self.windows.popitem(last=False)
+            self.key_count -= len(seen)
+            self.evicted_windows += 1
+            logger.debug(f"Evicted deduplication window {window} with {len(seen)} event IDs")
@@ -0,0 +1,231 @@
+"""
+Offline enrichment of source IP addresses from local GeoIP, ASN and cloud IP range databases.
+"""
+
+import ipaddress
+import json
+import logging
+from bisect import bisect_right
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Fields added to events by IPEnricher, by the kind of database that provides them
+GEOIP_FIELDS = ('source_country',)
+ASN_FIELDS = ('source_asn', 'source_as_org')
+AWS_RANGE_FIELDS = ('source_aws_service', 'source_aws_region')
+
+class IPRangeTable:
+    """
+    Longest-prefix lookup of IP addresses in a set of CIDR ranges.
+
+    The ranges are flattened into sorted, non-overlapping intervals, each
+    labeled with the most specific range covering it, so a lookup is one
+    binary search. CIDR ranges are either nested or disjoint, which makes
+    the flattening exact.
+    """
+
+    def __init__(self, ranges):
+        """
+        Build the table.
+
+        Args:
+            ranges (iterable): (CIDR string, tags dict) pairs. Tags of identical
+                ranges are merged, joining differing values with commas.
+        """
+        merged = {}
+        for cidr, tags in ranges:
+            network = ipaddress.ip_network(cidr, strict=False)
+            key = (network.version, int(network.network_address), int(network.broadcast_address))
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = dict(tags)
+            else:
+                for field, value in tags.items():
+                    if value and value not in (existing.get(field) or '').split(','):
+                        existing[field] = ','.join(filter(None, (existing.get(field), value)))
+
+        self._tables = {}
+        for version in (4, 6):
+            intervals = self._flatten([(start, end, tags) for (v, start, end), tags in merged.items() if v == version])
+            self._tables[version] = (
+                [start for start, _, _ in intervals],
+                [end for _, end, _ in intervals],
+                [tags for _, _, tags in intervals]
+            )
+        self.size = len(merged)
+
+    @staticmethod
+    def _flatten(ranges):
+        # Parents sort before the ranges nested in them; a stack holds the ranges still open
+        ranges.sort(key=lambda entry: (entry[0], -entry[1]))
+        intervals = []
+        stack = []
+        position = None
+        for start, end, tags in ranges:
+            while stack and stack[-1][1] < start:
+                _, open_end, open_tags = stack.pop()
+                if position <= open_end:
+                    intervals.append((position, open_end, open_tags))
+                    position = open_end + 1
+            if stack and position < start:
+                intervals.append((position, start - 1, stack[-1][2]))
+            stack.append((start, end, tags))
+            position = start
+        while stack:
+            _, open_end, open_tags = stack.pop()
+            if position <= open_end:
+                intervals.append((position, open_end, open_tags))
+                position = open_end + 1
+        return intervals
+
+    def lookup(self, address):
+        """
+        Find the most specific range containing an address.
+
+        Args:
+            address (ipaddress.IPv4Address or ipaddress.IPv6Address): Address to look up.
+
+        Returns:
+            dict or None: Tags of the range, or None if no range contains the address.
+        """
+        starts, ends, tags = self._tables[address.version]
+        value = int(address)
+        i = bisect_right(starts, value) - 1
+        if i >= 0 and value <= ends[i]:
+            return tags[i]
+        return None
+
+def load_aws_ip_ranges(path):
+    """
+    Load the AWS IP address ranges published as ip-ranges.json.
+
+    Args:
+        path (str): Path to a local copy of https://ip-ranges.amazonaws.com/ip-ranges.json.
+
+    Returns:
+        IPRangeTable: Table tagging addresses with the AWS service and region of their range.
+    """
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    def ranges():
+        for prefix in data.get('prefixes', []):
+            yield prefix['ip_prefix'], prefix
+        for prefix in data.get('ipv6_prefixes', []):
+            yield prefix['ipv6_prefix'], prefix
+
+    table = IPRangeTable(
+        (cidr, {'source_aws_service': prefix.get('service'), 'source_aws_region': prefix.get('region')})
+        for cidr, prefix in ranges()
+    )
+    logger.info(f"Loaded {table.size} AWS IP ranges from {path}")
+    return table
+
+class IPEnricher:
+    """
+    Adds country, ASN and cloud provider tags to the source IP of events.
+
+    Country and ASN come from MaxMind-format (.mmdb) databases such as
+    GeoLite2-Country, GeoLite2-City and GeoLite2-ASN, read with the maxminddb
+    package, and AWS service and region from a local copy of ip-ranges.json.
+    Nothing is looked up over the network. Source IPs repeat heavily, so each
+    batch looks up its distinct addresses once and results are memoized in an
+    LRU cache. Used as a processing stage, it sets the fields of every
+    configured database on each event (None when an address is not found).
+    """
+
+    def __init__(self, mmdb_files=None, aws_ip_ranges=None, cache_size=65536):
+        """
+        Open the databases.
+
+        Args:
+            mmdb_files (list, optional): Paths to MaxMind-format country, city or ASN databases.
+            aws_ip_ranges (str, optional): Path to a local copy of AWS ip-ranges.json.
+            cache_size (int, optional): Number of addresses whose results are memoized.
+
+        Raises:
+            ImportError: If mmdb files are given and maxminddb is not installed
+        """
+        self.readers = []
+        self.fields = []
+        if mmdb_files:
+            try:
+                import maxminddb
+            except ImportError:
+                raise ImportError(
+                    "GeoIP enrichment requires the maxminddb package. "
+                    "Install it with: pip install scope-forensics[geoip]"
+                )
+            for path in mmdb_files:
+                reader = maxminddb.open_database(path)
+                self.readers.append(reader)
+                database_type = reader.metadata().database_type
+                fields = ASN_FIELDS if 'ASN' in database_type.upper() else GEOIP_FIELDS
+                self.fields.extend(field for field in fields if field not in self.fields)
+                logger.info(f"Opened {database_type} database {path}")
+
+        self.aws_ranges = load_aws_ip_ranges(aws_ip_ranges) if aws_ip_ranges else None
+        if self.aws_ranges:
+            self.fields.extend(AWS_RANGE_FIELDS)
+
+        self._empty = dict.fromkeys(self.fields)
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+        self.enriched = 0
+
+    def _lookup(self, ip):
+        """
+        Look up the tags of an IP address.
+
+        Args:
+            ip (str): IP address.
+
+        Returns:
+            dict: Value of each enrichment field; unknown values are None.
+        """
+        result = dict(self._empty)
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return result
+
+        for reader in self.readers:
+            record = reader.get(ip) or {}
+            country = record.get('country') or record.get('registered_country')
+            if country:
+                result['source_country'] = country.get('iso_code')
+            if 'autonomous_system_number' in record:
+                result['source_asn'] = record['autonomous_system_number']
+                result['source_as_org'] = record.get('autonomous_system_organization')
+
+        if self.aws_ranges:
+            tags = self.aws_ranges.lookup(address)
+            if tags:
+                result.update(tags)
+        return result
+
+    def process(self, events):
+        """
+        Enrich the source IP of a batch of events.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            list: The same events, with the enrichment fields set.
+        """
+        results = {ip: self.lookup(ip) for ip in {event.get('source_ip') for event in events} if ip}
+        empty = self._empty
+        for event in events:
+            tags = results.get(event.get('source_ip'))
+            event.update(tags if tags is not None else empty)
+            if tags is not None:
+                self.enriched += 1
+        return events
+
+    def close(self):
+        """Close the databases and log cache statistics."""
+        for reader in self.readers:
+            reader.close()
+        info = self.lookup.cache_info()
+        logger.info(f"Enriched {self.enriched} events ({info.currsize} distinct IPs, {info.hits} cache hits)")
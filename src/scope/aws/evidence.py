@@ -0,0 +1,232 @@
+"""
+Per-file evidence index for skipping CloudTrail log files that cannot match a search.
+"""
+
+import gzip
+import json
+import logging
+import os
+
+from scope.common.sketches import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+# False positive rate of the per-file Bloom filters
+EVIDENCE_ERROR_RATE = 0.01
+
+def record_principals(record):
+    """
+    Get the identifiers of the principal that made a CloudTrail call.
+
+    Args:
+        record (dict): Raw CloudTrail record.
+
+    Returns:
+        list: ARNs, principal IDs and user names of the caller and, for assumed
+            roles, of the role the session was issued for.
+    """
+    identity = record.get('userIdentity') or {}
+    issuer = (identity.get('sessionContext') or {}).get('sessionIssuer') or {}
+    values = (
+        identity.get('arn'), identity.get('principalId'), identity.get('userName'),
+        issuer.get('arn'), issuer.get('principalId'), issuer.get('userName')
+    )
+    return [value for value in values if value]
+
+def record_access_key(record):
+    """Get the access key ID a CloudTrail call was signed with, if any."""
+    return (record.get('userIdentity') or {}).get('accessKeyId')
+
+class EvidenceIndex:
+    """
+    Summary of every indexed log file, used to skip files during searches.
+
+    For each file or S3 object the index stores its event count, the range of
+    eventTime, the event sources and event names it contains, and Bloom
+    filters over principals, access key IDs and source IPs. A search for a set
+    of indicators only needs to open the files whose filters may contain one
+    of them. Files that are not in the index, or whose size changed since they
+    were indexed, are always opened.
+
+    The index is saved as JSON, compressed with gzip when the file name ends
+    in .gz.
+    """
+
+    def __init__(self, path=None):
+        """
+        Initialize the index, loading it from a file if it exists.
+
+        Args:
+            path (str, optional): Path the index is loaded from and saved to.
+        """
+        self.path = path
+        self.files = {}
+        if path and os.path.exists(path):
+            opener = gzip.open if path.endswith('.gz') else open
+            with opener(path, 'rt') as f:
+                self.files = json.load(f).get('files', {})
+            logger.info(f"Loaded evidence index of {len(self.files)} files from {path}")
+
+    def add(self, key, records, size=None):
+        """
+        Index the records of one log file.
+
+        Args:
+            key (str): File path relative to the collected directory, or S3 object key.
+            records (list): Raw CloudTrail records of the file.
+            size (int, optional): Size of the file, used to notice files that changed.
+        """
+        times = [record['eventTime'] for record in records if record.get('eventTime')]
+        self.files[key] = {
+            'size': size,
+            'events': len(records),
+            'min_time': min(times) if times else None,
+            'max_time': max(times) if times else None,
+            'event_sources': sorted({record['eventSource'] for record in records if record.get('eventSource')}),
+            'event_names': sorted({record['eventName'] for record in records if record.get('eventName')}),
+            'principals': BloomFilter.from_items(
+                (value for record in records for value in record_principals(record)), EVIDENCE_ERROR_RATE
+            ).to_dict(),
+            'access_keys': BloomFilter.from_items(
+                (record_access_key(record) for record in records), EVIDENCE_ERROR_RATE
+            ).to_dict(),
+            'source_ips': BloomFilter.from_items(
+                (record.get('sourceIPAddress') for record in records), EVIDENCE_ERROR_RATE
+            ).to_dict()
+        }
+
+    def is_indexed(self, key, size=None):
+        """
+        Check whether a file is indexed and unchanged.
+
+        Args:
+            key (str): File path or S3 object key.
+            size (int, optional): Current size of the file, if known.
+
+        Returns:
+            bool: True if the index holds an up-to-date entry for the file.
+        """
+        entry = self.files.get(key)
+        return entry is not None and (size is None or entry.get('size') in (None, size))
+
+    def save(self, path=None):
+        """
+        Write the index.
+
+        Args:
+            path (str, optional): Path to write to. Defaults to the path the index was loaded from.
+
+        Returns:
+            str: Path to the written index.
+        """
+        path = path or self.path
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'wt') as f:
+            json.dump({'version': 1, 'files': self.files}, f, separators=(',', ':'))
+        logger.info(f"Saved evidence index of {len(self.files)} files to {path}")
+        return path
+
+    def file_filter(self, indicators):
+        """
+        Create a predicate that tells whether a file may contain a search's indicators.
+
+        Args:
+            indicators (EvidenceSearch): Indicators and filters of the search.
+
+        Returns:
+            callable: Function of (key, size=None) returning False only for files
+                that are indexed, unchanged and cannot match.
+        """
+        def may_match(key, size=None):
+            if not self.is_indexed(key, size):
+                return True
+            entry = self.files[key]
+
+            if indicators.event_names and not indicators.event_names.intersection(entry['event_names']):
+                return False
+            if indicators.event_sources and not indicators.event_sources.intersection(entry['event_sources']):
+                return False
+            if not indicators.has_indicators():
+                return True
+
+            # Decode the Bloom filters only for files that pass the cheaper checks
+            for field, values in (('principals', indicators.principals), ('access_keys', indicators.access_key_ids),
+                                  ('source_ips', indicators.source_ips)):
+                if values:
+                    bloom = BloomFilter.from_dict(entry[field])
+                    if any(value in bloom for value in values):
+                        return True
+            return False
+
+        return may_match
+
+class EvidenceSearch:
+    """
+    Indicators of compromise to search CloudTrail events for.
+
+    An event matches when it carries any of the indicators - one of the
+    principals, access key IDs or source IPs - and, if given, one of the
+    event names and one of the event sources. Used as a processing stage, it
+    keeps only matching events.
+    """
+
+    def __init__(self, principals=None, access_key_ids=None, source_ips=None,
+                 event_names=None, event_sources=None):
+        """
+        Initialize the search.
+
+        Args:
+            principals (list, optional): ARNs, principal IDs or user names.
+            access_key_ids (list, optional): Access key IDs.
+            source_ips (list, optional): Source IP addresses.
+            event_names (list, optional): Event names an event must have one of.
+            event_sources (list, optional): Event sources an event must have one of.
+        """
+        self.principals = set(principals or [])
+        self.access_key_ids = set(access_key_ids or [])
+        self.source_ips = set(source_ips or [])
+        self.event_names = set(event_names or [])
+        self.event_sources = set(event_sources or [])
+        self.matched = 0
+
+    def has_indicators(self):
+        """Check whether any principal, access key ID or source IP was given."""
+        return bool(self.principals or self.access_key_ids or self.source_ips)
+
+    def matches(self, record):
+        """
+        Check whether a raw CloudTrail record matches the search.
+
+        Args:
+            record (dict): Raw CloudTrail record.
+
+        Returns:
+            bool: True if the record matches.
+        """
+        if self.event_names and record.get('eventName') not in self.event_names:
+            return False
+        if self.event_sources and record.get('eventSource') not in self.event_sources:
+            return False
+        if not self.has_indicators():
+            return True
+        return (record.get('sourceIPAddress') in self.source_ips or
+                record_access_key(record) in self.access_key_ids or
+                not self.principals.isdisjoint(record_principals(record)))
+
+    def process(self, events):
+        """
+        Keep only the normalized events whose raw record matches.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            list: Matching events.
+        """
+        matching = [event for event in events if self.matches(event.get('raw_data') or {})]
+        self.matched += len(matching)
+        return matching
+
+    def close(self):
+        """Log the number of matching events."""
+        logger.info(f"Found {self.matched} events matching the search")
@@ -0,0 +1,225 @@
+"""
+State and polling schedule for following CloudTrail logs as they are delivered.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Version of the follow state file format
+STATE_VERSION = 1
+
+def utc_now():
+    """
+    Get the current time as a naive UTC datetime, the form times are kept in while following.
+
+    Returns:
+        datetime: Current UTC time without tzinfo.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class PollInterval:
+    """
+    Adaptive delay between polls.
+
+    After a poll that found new data the delay drops back to the minimum, so
+    a busy trail is read with low lag; every empty poll doubles it up to the
+    maximum, so an idle trail costs few requests. The time the poll itself
+    took is deducted from the wait.
+    """
+
+    def __init__(self, min_interval=10.0, max_interval=60.0):
+        """
+        Initialize the schedule.
+
+        Args:
+            min_interval (float, optional): Seconds between polls while new data keeps arriving.
+            max_interval (float, optional): Longest wait between polls while nothing arrives.
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(max_interval, min_interval)
+        self.interval = min_interval
+        self._started = None
+
+    def start(self):
+        """Mark the start of a poll."""
+        self._started = time.monotonic()
+
+    def update(self, found):
+        """
+        Adapt the interval to the outcome of the poll.
+
+        Args:
+            found (bool): Whether the poll found new data.
+
+        Returns:
+            float: Seconds to wait before the next poll.
+        """
+        if found:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        elapsed = time.monotonic() - self._started if self._started is not None else 0
+        return max(0.0, self.interval - elapsed)
+
+    def wait(self, found):
+        """Sleep until the next poll is due."""
+        delay = self.update(found)
+        if delay:
+            logger.debug(f"Next poll in {delay:.1f}s")
+            time.sleep(delay)
+
+class FollowState:
+    """
+    Log files and events already processed while following, persisted between runs.
+
+    Each followed stream - the log files of one region in a bucket, or the
+    LookupEvents results of one region - has a position, the time of the
+    newest item processed, and the IDs of the items processed within the
+    lookback window before it. Delivery is not strictly in time order, so
+    each poll looks back from the position and skips the items already
+    seen; older items are forgotten, as they are never listed again. Items
+    that could not be processed are counted, so that one which keeps failing
+    can be given up on instead of being fetched on every poll; until then,
+    the lookback reaches back to the oldest of them. All times are
+    naive UTC. The state may be read from several threads while it is
+    updated, so access is serialized by a lock. The file is replaced
+    atomically, so an interrupted save leaves the previous state intact.
+    """
+
+    TIME_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+    def __init__(self, path=None):
+        """
+        Load the state.
+
+        Args:
+            path (str, optional): JSON state file. It is created on the first save if it
+                doesn't exist. Without a path, the state only lives in memory.
+
+        Raises:
+            ValueError: If the file was written by an incompatible version
+        """
+        self.path = path
+        self.streams = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            if data.get('version') != STATE_VERSION:
+                raise ValueError(f"Unsupported follow state version in {path}: {data.get('version')}")
+            self.streams = data.get('streams', {})
+            logger.info(f"Resuming {len(self.streams)} followed streams from {path}")
+
+    def position(self, stream):
+        """
+        Get the time of the newest item processed in a stream.
+
+        Args:
+            stream (str): Name of the stream.
+
+        Returns:
+            datetime or None: Naive UTC time, or None if nothing was processed yet.
+        """
+        with self._lock:
+            position = self.streams.get(stream, {}).get('position')
+        return datetime.strptime(position, self.TIME_FORMAT) if position else None
+
+    def seen(self, stream, item):
+        """Check whether an item of a stream was already processed."""
+        with self._lock:
+            return item in self.streams.get(stream, {}).get('seen', {})
+
+    def add(self, stream, item, item_time):
+        """
+        Record a processed item.
+
+        Args:
+            stream (str): Name of the stream.
+            item (str): S3 key or event ID.
+            item_time (datetime): Naive UTC time of the item, moving the position forward.
+        """
+        timestamp = item_time.strftime(self.TIME_FORMAT)
+        with self._lock:
+            state = self.streams.setdefault(stream, {'position': None, 'seen': {}})
+            state['seen'][item] = timestamp
+            state.get('failed', {}).pop(item, None)
+            if not state['position'] or timestamp > state['position']:
+                state['position'] = timestamp
+
+    def fail(self, stream, item, item_time):
+        """
+        Count a failed attempt to process an item.
+
+        Args:
+            stream (str): Name of the stream.
+            item (str): S3 key or event ID.
+            item_time (datetime): Naive UTC time of the item.
+
+        Returns:
+            int: Number of attempts that failed so far.
+        """
+        with self._lock:
+            state = self.streams.setdefault(stream, {'position': None, 'seen': {}})
+            failed = state.setdefault('failed', {})
+            _, attempts = failed.get(item, (None, 0))
+            failed[item] = [item_time.strftime(self.TIME_FORMAT), attempts + 1]
+            return attempts + 1
+
+    def oldest_failure(self, stream):
+        """
+        Get the time of the oldest item of a stream that failed and was not given up on.
+
+        Args:
+            stream (str): Name of the stream.
+
+        Returns:
+            datetime or None: Naive UTC time, or None if no item is waiting to be retried.
+        """
+        with self._lock:
+            failed = self.streams.get(stream, {}).get('failed')
+            oldest = min(failure[0] for failure in failed.values()) if failed else None
+        return datetime.strptime(oldest, self.TIME_FORMAT) if oldest else None
+
+    def prune(self, stream, cutoff):
+        """
+        Forget the items of a stream older than a time.
+
+        Callers keep the cutoff at or before oldest_failure, so that failed
+        items are listed again; one that is pruned anyway will never be
+        retried, and is logged as given up.
+
+        Args:
+            stream (str): Name of the stream.
+            cutoff (datetime): Naive UTC time before which items are no longer listed.
+
+        Returns:
+            list: Failed items given up on because they are older than the cutoff.
+        """
+        timestamp = cutoff.strftime(self.TIME_FORMAT)
+        given_up = []
+        with self._lock:
+            state = self.streams.get(stream)
+            if state:
+                state['seen'] = {item: item_time for item, item_time in state['seen'].items() if item_time >= timestamp}
+                if state.get('failed'):
+                    given_up = [item for item, failure in state['failed'].items() if failure[0] < timestamp]
+                    for item in given_up:
+                        del state['failed'][item]
+        for item in given_up:
+            logger.error(f"Giving up on {item} in {stream}: it failed and is older than the lookback window")
+        return given_up
+
+    def save(self):
+        """Write the state to its file, if it has one."""
+        if not self.path:
+            return
+        temp_path = f"{self.path}.tmp"
+        with self._lock, open(temp_path, 'w') as f:
+            json.dump({'version': STATE_VERSION, 'streams': self.streams}, f)
+        os.replace(temp_path, self.path)
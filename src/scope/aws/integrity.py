@@ -0,0 +1,250 @@
+"""
+CloudTrail log file integrity validation against digest files.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# Digest file names end in the time the digest was delivered, e.g. _20240301T010203Z.json.gz
+DIGEST_TIME_SUFFIX = re.compile(r'_\d{8}T\d{6}Z\.json\.gz$')
+
+# Bytes read at a time when hashing local log files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def is_digest_key(key):
+    """
+    Check whether an S3 key or relative path is a CloudTrail digest file.
+
+    Args:
+        key (str): S3 object key or path with '/' separators.
+
+    Returns:
+        bool: True for files under a CloudTrail-Digest/ prefix.
+    """
+    return '/CloudTrail-Digest/' in '/' + key and key.endswith('.json.gz')
+
+def hash_log_object(item):
+    """
+    Compute the SHA-256 of the uncompressed content of a log file.
+
+    CloudTrail digests hash the uncompressed log, so gzip-compressed input is
+    decompressed first; local copies saved uncompressed by the collector are
+    hashed as they are. This is a module-level function so it can run in a
+    worker process.
+
+    Args:
+        item (tuple): (key, path, data) where either path names a local file or data
+            holds the downloaded object, and key identifies the log file to the caller.
+
+    Returns:
+        tuple: (key, hex digest). The digest is None if the file was not found and an
+            empty string if it could not be read or decompressed.
+    """
+    key, path, data = item
+    digest = hashlib.sha256()
+    try:
+        if path is not None:
+            with open(path, 'rb') as f:
+                compressed = f.read(2) == b'\x1f\x8b'
+            with (gzip.open(path, 'rb') if compressed else open(path, 'rb')) as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+        elif data is not None:
+            digest.update(gzip.decompress(data) if data[:2] == b'\x1f\x8b' else data)
+        else:
+            return key, None
+    except (OSError, EOFError) as e:
+        logger.error(f"Error hashing {key}: {e}")
+        return key, ''
+    return key, digest.hexdigest()
+
+class IntegrityReport:
+    """
+    Outcome of validating log files against their digests.
+    """
+
+    def __init__(self):
+        self.digests = 0
+        self.log_files = 0
+        self.verified = 0
+        self.missing = []
+        self.modified = []
+        self.missing_digests = []
+        self.broken_links = []
+        self.unreadable_digests = []
+        self.unreadable = []
+        self.unlisted_prefixes = []
+
+    @property
+    def ok(self):
+        """True if every digest and log file was found and matched."""
+        return not (self.missing or self.modified or self.missing_digests or
+                    self.broken_links or self.unreadable_digests or self.unreadable or
+                    self.unlisted_prefixes)
+
+    def to_dict(self):
+        """
+        Get the report as a dictionary.
+
+        Returns:
+            dict: Counts and lists of the keys of every problem found.
+        """
+        return {
+            'valid': self.ok,
+            'digests': self.digests,
+            'log_files': self.log_files,
+            'verified': self.verified,
+            'missing': sorted(self.missing),
+            'modified': sorted(self.modified),
+            'missing_digests': sorted(self.missing_digests),
+            'broken_links': sorted(self.broken_links),
+            'unreadable_digests': sorted(self.unreadable_digests),
+            'unreadable': sorted(self.unreadable),
+            'unlisted_prefixes': sorted(self.unlisted_prefixes)
+        }
+
+    def log_summary(self):
+        """Log the outcome of the validation."""
+        logger.info(f"Validated {self.digests} digest files and {self.verified}/{self.log_files} log files")
+        for name, keys in (('missing log files', self.missing), ('modified log files', self.modified),
+                           ('missing digest files', self.missing_digests),
+                           ('digest files not matching the chain', self.broken_links),
+                           ('unreadable digest files', self.unreadable_digests),
+                           ('log files that could not be fetched or read', self.unreadable),
+                           ('digest prefixes that could not be listed', self.unlisted_prefixes)):
+            if keys:
+                logger.error(f"{len(keys)} {name}:")
+                for key in sorted(keys):
+                    logger.error(f"  - {key}")
+        if self.ok:
+            logger.info("All log files are intact")
+
+    def export_json(self, output_file):
+        """
+        Write the report to a JSON file.
+
+        Args:
+            output_file (str): Path to output JSON file.
+
+        Returns:
+            str: Path to the created file.
+        """
+        with open(output_file, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+        logger.info(f"Integrity report exported to {output_file}")
+        return output_file
+
+class DigestValidator:
+    """
+    Checks the chain of CloudTrail digest files and the log hashes they list.
+
+    Every digest holds the SHA-256 of the uncompressed previous digest of
+    the same trail and region, and of every log file delivered in its hour.
+    Digests are added as they are read; once all are in, check_chain
+    verifies the links between them and expected_hashes lists the log files
+    to hash and compare with check_log_hashes. The RSA signatures of the
+    digests are not verified.
+    """
+
+    def __init__(self):
+        self.report = IntegrityReport()
+        self.digests = {}
+        self._hashes = {}
+
+    def add_digest(self, key, data):
+        """
+        Add a digest file.
+
+        Args:
+            key (str): S3 key of the digest, or its path relative to the validated directory.
+            data (bytes): Content of the digest file, gzip-compressed or not.
+
+        Returns:
+            str or None: S3 key the digest was delivered to, or None if it could not be read.
+        """
+        try:
+            content = gzip.decompress(data) if data[:2] == b'\x1f\x8b' else data
+            digest = json.loads(content.decode('utf-8'))
+        except (OSError, EOFError, ValueError) as e:
+            logger.error(f"Error reading digest {key}: {e}")
+            self.report.unreadable_digests.append(key)
+            return None
+
+        # Chain links refer to the digest's own S3 key, which may differ from a local path
+        object_key = digest.get('digestS3Object') or key
+        digest['_key'] = key
+        self.digests[object_key] = digest
+        self._hashes[object_key] = hashlib.sha256(content).hexdigest()
+        self.report.digests += 1
+        return object_key
+
+    def check_chain(self):
+        """
+        Verify that every digest matches the hash recorded by its successor.
+
+        The earliest digest of each trail and region may point to a digest
+        outside the validated range, which is not an error; any other link to
+        a digest that was not found is reported as a missing digest.
+        """
+        chains = {}
+        for object_key, digest in self.digests.items():
+            chain = DIGEST_TIME_SUFFIX.sub('', object_key.rsplit('/', 1)[-1])
+            chains.setdefault(chain, []).append(object_key)
+
+        for chain, keys in chains.items():
+            keys.sort(key=lambda object_key: self.digests[object_key].get('digestEndTime') or '')
+            for position, object_key in enumerate(keys):
+                digest = self.digests[object_key]
+                previous = digest.get('previousDigestS3Object')
+                if not previous:
+                    continue
+                if previous not in self._hashes:
+                    if position:
+                        self.report.missing_digests.append(previous)
+                    continue
+                if digest.get('previousDigestHashValue') != self._hashes[previous]:
+                    self.report.broken_links.append(self.digests[previous]['_key'])
+
+    def expected_hashes(self):
+        """
+        List the log files named in the digests.
+
+        Returns:
+            list: (bucket, key, expected SHA-256 hex digest) tuples.
+        """
+        expected = {}
+        for digest in self.digests.values():
+            for log_file in digest.get('logFiles') or []:
+                expected[(log_file.get('s3Bucket'), log_file['s3Object'])] = log_file.get('hashValue')
+        self.report.log_files = len(expected)
+        return [(bucket, key, hash_value) for (bucket, key), hash_value in expected.items()]
+
+    def check_log_hashes(self, expected, results):
+        """
+        Compare computed log hashes with the digests.
+
+        A log file that does not exist is reported as missing, while one that
+        could not be fetched or read is reported as unreadable, since a failed
+        download is no evidence of tampering.
+
+        Args:
+            expected (list): Tuples returned by expected_hashes.
+            results (iterable): ((bucket, key), hex digest) pairs, as returned by hash_log_object
+                for items keyed by bucket and key.
+        """
+        # Digests of several trails may name the same key in different buckets
+        wanted = {(bucket, key): hash_value for bucket, key, hash_value in expected}
+        for (bucket, key), actual in results:
+            if actual is None:
+                self.report.missing.append(key)
+            elif not actual:
+                self.report.unreadable.append(key)
+            elif actual != wanted.get((bucket, key)):
+                self.report.modified.append(key)
+            else:
+                self.report.verified += 1
@@ -0,0 +1,55 @@
+"""
+Parsing of S3 object-created notifications delivered through SQS.
+"""
+
+import json
+import logging
+from urllib.parse import unquote_plus
+
+logger = logging.getLogger(__name__)
+
+def parse_s3_notification(body):
+    """
+    Get the objects an SQS message body announces.
+
+    Accepts S3 event notifications sent to the queue directly or through an
+    SNS topic (raw or wrapped in the SNS envelope), and EventBridge "Object
+    Created" events. Test events and events other than object creation
+    announce nothing.
+
+    Args:
+        body (str): Body of the SQS message.
+
+    Returns:
+        list: (bucket, key) tuples, with keys URL-decoded.
+
+    Raises:
+        ValueError: If the body is not JSON
+    """
+    message = json.loads(body)
+
+    # SNS wraps the S3 notification in the Message field of its envelope
+    if isinstance(message, dict) and message.get('Type') == 'Notification' and 'Message' in message:
+        message = json.loads(message['Message'])
+    if not isinstance(message, dict):
+        return []
+
+    objects = []
+    if message.get('detail-type') == 'Object Created':
+        detail = message.get('detail') or {}
+        bucket = (detail.get('bucket') or {}).get('name')
+        key = (detail.get('object') or {}).get('key')
+        if bucket and key:
+            objects.append((bucket, key))
+        return objects
+
+    for record in message.get('Records') or []:
+        if not str(record.get('eventName', '')).startswith('ObjectCreated:'):
+            continue
+        s3 = record.get('s3') or {}
+        bucket = (s3.get('bucket') or {}).get('name')
+        key = (s3.get('object') or {}).get('key')
+        if bucket and key:
+            # Keys in S3 event notifications are URL-encoded, with spaces as '+'
+            objects.append((bucket, unquote_plus(key)))
+    return objects
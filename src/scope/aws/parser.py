@@ -6,9 +6,59 @@ import json
 import logging
 import ipaddress
 from datetime import datetime
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
+# Order of the fields produced by CloudTrailParser.normalize_event
+NORMALIZED_FIELDS = (
+    'event_id', 'event_time', 'event_source', 'event_name', 'event_type',
+    'username', 'aws_region', 'source_ip', 'user_agent', 'resources', 'raw_data'
+)
+
+@lru_cache(maxsize=4096)
+def _parse_cloudtrail_time(datetime_str):
+    """
+    Parse a timestamp in CloudTrail's fixed '%Y-%m-%dT%H:%M:%SZ' format.
+    
+    Slicing the fixed-width fields is several times faster than strptime, and
+    events delivered in the same second share one cached result.
+    
+    Returns:
+        datetime or None: Parsed datetime, or None if the string is not in the fixed format
+    """
+    if (len(datetime_str) != 20 or datetime_str[4] != '-' or datetime_str[7] != '-' or
+            datetime_str[10] != 'T' or datetime_str[13] != ':' or datetime_str[16] != ':' or
+            datetime_str[19] != 'Z'):
+        return None
+    # int() also accepts signs and whitespace, which strptime rejects
+    digits = (datetime_str[0:4] + datetime_str[5:7] + datetime_str[8:10] + datetime_str[11:13] +
+              datetime_str[14:16] + datetime_str[17:19])
+    if not digits.isdigit():
+        return None
+    try:
+        return datetime(
+            int(datetime_str[0:4]), int(datetime_str[5:7]), int(datetime_str[8:10]),
+            int(datetime_str[11:13]), int(datetime_str[14:16]), int(datetime_str[17:19])
+        )
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=65536)
+def _validate_ip(source_ip):
+    """
+    Return the source IP if it is a valid address, otherwise None.
+    
+    Source IPs repeat heavily across events, so results are memoized.
+    """
+    try:
+        # This will raise a ValueError if the IP is not valid
+        ipaddress.ip_address(source_ip)
+        return source_ip
+    except ValueError:
+        logger.debug(f"Invalid source IP: {source_ip}")
+        return None
+
 class CloudTrailParser:
     """
     Parser for CloudTrail logs to extract and normalize event data.
@@ -28,6 +78,11 @@ class CloudTrailParser:
         if not datetime_str or datetime_str in ['N/A', 'not_supported']:
             return None
             
+        if isinstance(datetime_str, str):
+            parsed = _parse_cloudtrail_time(datetime_str)
+            if parsed:
+                return parsed
+            
         try:
             return datetime.strptime(datetime_str, '%Y-%m-%dT%H:%M:%SZ')
         except ValueError:
@@ -45,6 +100,19 @@ class CloudTrailParser:
         Returns:
             dict: Normalized event data
         """
+        return dict(zip(NORMALIZED_FIELDS, CloudTrailParser._normalize_values(raw_event)))
+        
+    @staticmethod
+    def _normalize_values(raw_event):
+        """
+        Extract the normalized field values of a CloudTrail event.
+        
+        Args:
+            raw_event (dict): Raw CloudTrail event
+            
+        Returns:
+            tuple: Field values in NORMALIZED_FIELDS order
+        """
         # Handle Records array if present
         if 'Records' in raw_event:
             raw_event = raw_event['Records'][0]  # Take the first record
@@ -89,29 +157,22 @@ class CloudTrailParser:
         # Validate and process the source IP address
         source_ip = raw_event.get('sourceIPAddress')
         if source_ip:
-            try:
-                # This will raise a ValueError if the IP is not valid
-                ipaddress.ip_address(source_ip)
-            except ValueError:
-                logger.debug(f"Invalid source IP: {source_ip}")
-                source_ip = None
+            source_ip = _validate_ip(source_ip)
         
-        # Build normalized event data
-        normalized_data = {
-            'event_id': raw_event.get('eventID'),
-            'event_time': event_time,
-            'event_source': raw_event.get('eventSource'),
-            'event_name': raw_event.get('eventName'),
-            'event_type': raw_event.get('eventType'),
-            'username': username,
-            'aws_region': raw_event.get('awsRegion'),
-            'source_ip': source_ip,
-            'user_agent': raw_event.get('userAgent'),
-            'resources': resources,
-            'raw_data': raw_event
-        }
-
-        return normalized_data
+        # Build normalized event data in NORMALIZED_FIELDS order
+        return (
+            raw_event.get('eventID'),
+            event_time,
+            raw_event.get('eventSource'),
+            raw_event.get('eventName'),
+            raw_event.get('eventType'),
+            username,
+            raw_event.get('awsRegion'),
+            source_ip,
+            raw_event.get('userAgent'),
+            resources,
+            raw_event
+        )
         
     @staticmethod
     def batch_normalize_events(events):
@@ -134,7 +195,39 @@ class CloudTrailParser:
                 logger.error(f"Error normalizing event: {e}")
                 continue
                 
-        return normalized_events 
+        return normalized_events
+
+    @staticmethod
+    def batch_normalize_columns(events, fields=None):
+        """
+        Normalize a batch of CloudTrail events into columns.
+        
+        Produces the same values as batch_normalize_events, but as one list per
+        field instead of one dict per event, which is cheaper to build and lets
+        writers and columnar timelines consume whole columns at once.
+        
+        Args:
+            events (list): List of raw CloudTrail events
+            fields (list, optional): Normalized fields to keep. If None, keeps all fields.
+            
+        Returns:
+            dict: Mapping of field name to a list of values, one per normalized event
+        """
+        fields = fields or NORMALIZED_FIELDS
+        indexes = [NORMALIZED_FIELDS.index(field) for field in fields]
+        columns = [[] for _ in fields]
+        appends = [column.append for column in columns]
+        
+        for event in events:
+            try:
+                values = CloudTrailParser._normalize_values(event)
+            except Exception as e:
+                logger.error(f"Error normalizing event: {e}")
+                continue
+            for append, index in zip(appends, indexes):
+                append(values[index])
+                
+        return dict(zip(fields, columns))
 
     @staticmethod
     def parse_resource_data(resource_data):
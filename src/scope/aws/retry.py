@@ -0,0 +1,222 @@
+"""
+Retry and throttling control for AWS API calls.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+from botocore.exceptions import (
+    ClientError, ConnectionClosedError, EndpointConnectionError, ReadTimeoutError
+)
+
+logger = logging.getLogger(__name__)
+
+# Error codes AWS services return when a caller exceeds its request rate
+THROTTLING_ERROR_CODES = {
+    'SlowDown', 'Throttling', 'ThrottlingException', 'ThrottledException', 'RequestThrottled',
+    'RequestThrottledException', 'RequestLimitExceeded', 'TooManyRequestsException',
+    'ProvisionedThroughputExceededException', 'BandwidthLimitExceeded'
+}
+
+# Error codes for failures that usually succeed when retried
+TRANSIENT_ERROR_CODES = {
+    'InternalError', 'InternalFailure', 'ServiceUnavailable', 'RequestTimeout',
+    'RequestTimeoutException', 'PriorRequestNotComplete', '500', '502', '503', '504'
+}
+
+def is_throttling_error(error):
+    """
+    Check whether an exception is an AWS throttling error.
+
+    Args:
+        error (Exception): Exception raised by a boto3 call
+
+    Returns:
+        bool: True if the request was rejected for exceeding a rate limit
+    """
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLING_ERROR_CODES
+
+def is_retryable_error(error):
+    """
+    Check whether an exception is worth retrying.
+
+    Args:
+        error (Exception): Exception raised by a boto3 call
+
+    Returns:
+        bool: True for throttling, transient server errors and connection failures
+    """
+    if isinstance(error, (EndpointConnectionError, ConnectionClosedError, ReadTimeoutError)):
+        return True
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        return code in THROTTLING_ERROR_CODES or code in TRANSIENT_ERROR_CODES
+    return False
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of concurrent requests, backing off when AWS throttles.
+
+    The limit is halved on a throttling error (at most once per cooldown
+    period, so one burst of errors counts once) and raised by one after every
+    run of successful requests, up to max_concurrency. Used as a context
+    manager around each request.
+    """
+
+    def __init__(self, max_concurrency, min_concurrency=1, increase_after=50, cooldown=1.0):
+        """
+        Initialize the limiter.
+
+        Args:
+            max_concurrency (int): Upper bound, normally the size of the worker pool.
+            min_concurrency (int, optional): Lower bound the limit never drops below.
+            increase_after (int, optional): Successful requests needed to raise the limit by one.
+            cooldown (float, optional): Seconds after a decrease during which further throttles are ignored.
+        """
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.increase_after = increase_after
+        self.cooldown = cooldown
+        self.active = 0
+        self.throttles = 0
+        self._successes = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def __enter__(self):
+        with self._condition:
+            while self.active >= self.limit:
+                self._condition.wait()
+            self.active += 1
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        with self._condition:
+            self.active -= 1
+            if exc_value is not None and is_throttling_error(exc_value):
+                self.on_throttle()
+            elif exc_value is None:
+                self._on_success()
+            self._condition.notify_all()
+
+    def on_throttle(self):
+        """Halve the concurrency limit in response to a throttling error."""
+        with self._condition:
+            self.throttles += 1
+            now = time.monotonic()
+            if now - self._last_decrease < self.cooldown:
+                return
+            self._last_decrease = now
+            self._successes = 0
+            new_limit = max(self.min_concurrency, self.limit // 2)
+            if new_limit < self.limit:
+                logger.warning(f"Throttled by AWS, reducing concurrency from {self.limit} to {new_limit}")
+                self.limit = new_limit
+
+    def _on_success(self):
+        self._successes += 1
+        if self._successes >= self.increase_after and self.limit < self.max_concurrency:
+            self._successes = 0
+            self.limit += 1
+            logger.debug(f"Raising concurrency to {self.limit}")
+
+class RetryPolicy:
+    """
+    Retries AWS calls with exponential backoff and full jitter.
+
+    Only throttling, transient server errors and connection failures are
+    retried; anything else is raised immediately. When a limiter is given,
+    every attempt holds one of its slots, and throttling errors lower its limit.
+    """
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=20.0, limiter=None):
+        """
+        Initialize the retry policy.
+
+        Args:
+            max_attempts (int, optional): Total number of attempts per call.
+            base_delay (float, optional): Delay cap in seconds before the first retry; doubles with each retry.
+            max_delay (float, optional): Maximum delay cap in seconds.
+            limiter (AdaptiveConcurrencyLimiter, optional): Limiter every attempt runs under.
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.limiter = limiter
+
+    def backoff(self, attempt):
+        """
+        Compute the delay before a retry.
+
+        Args:
+            attempt (int): Number of attempts made so far (1 after the first failure).
+
+        Returns:
+            float: Delay in seconds, drawn uniformly between 0 and the exponential cap.
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def call(self, func, *args, **kwargs):
+        """
+        Call a function, retrying retryable AWS errors.
+
+        Args:
+            func (callable): Function making the AWS call.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            Any: The return value of func.
+
+        Raises:
+            Exception: The last error once attempts are exhausted, or any non-retryable error.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self.limiter:
+                    with self.limiter:
+                        return func(*args, **kwargs)
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_retryable_error(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.debug(f"Retrying after error ({e}), attempt {attempt + 1}/{self.max_attempts} in {delay:.2f}s")
+                time.sleep(delay)
+
+    async def call_async(self, func, *args, **kwargs):
+        """
+        Await a coroutine function, retrying retryable AWS errors.
+
+        The counterpart of call for aiobotocore clients. The limiter is not
+        used, since it blocks threads; on an event loop, concurrency is bounded
+        by the number of tasks instead.
+
+        Args:
+            func (callable): Coroutine function making the AWS call.
+            *args: Positional arguments for func.
+            **kwargs: Keyword arguments for func.
+
+        Returns:
+            Any: The result of func.
+
+        Raises:
+            Exception: The last error once attempts are exhausted, or any non-retryable error.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_attempts or not is_retryable_error(e):
+                    raise
+                delay = self.backoff(attempt)
+                logger.debug(f"Retrying after error ({e}), attempt {attempt + 1}/{self.max_attempts} in {delay:.2f}s")
+                await asyncio.sleep(delay)
@@ -0,0 +1,422 @@
+"""
+Declarative detection rules evaluated over the normalized event stream.
+"""
+
+import ipaddress
+import json
+import logging
+import os
+import re
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Fields used to index rules, so each event is only checked against rules that can match it
+DISPATCH_FIELDS = ('event_source', 'event_name')
+
+# Fields copied from the triggering event into each alert
+ALERT_EVENT_FIELDS = ('event_time', 'event_id', 'event_source', 'event_name', 'username', 'source_ip', 'aws_region')
+
+# Severities accepted in rule files
+SEVERITIES = ('informational', 'low', 'medium', 'high', 'critical')
+
+@lru_cache(maxsize=65536)
+def _parse_ip(value):
+    """Parse an IP address, returning None for values such as 'AWS Internal'."""
+    try:
+        return ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+def load_rules(paths):
+    """
+    Load detection rules from JSON or YAML files.
+
+    A file holds either a list of rules or a mapping with a 'rules' list.
+    YAML files (.yaml or .yml) require PyYAML.
+
+    Args:
+        paths (list): Rule files, or directories whose .json, .yaml and .yml files are loaded.
+
+    Returns:
+        list: Rule definitions, in the order they were loaded.
+
+    Raises:
+        ImportError: If a YAML file is given and PyYAML is not installed
+        ValueError: If a file does not contain a list of rules
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if name.endswith(('.json', '.yaml', '.yml')))
+        else:
+            files.append(path)
+
+    rules = []
+    for file_path in files:
+        with open(file_path, 'r') as f:
+            if file_path.endswith(('.yaml', '.yml')):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ImportError(
+                        "YAML rule files require PyYAML. "
+                        "Install it with: pip install scope-forensics[rules]"
+                    )
+                data = yaml.safe_load(f)
+            else:
+                data = json.load(f)
+
+        if isinstance(data, dict):
+            data = data.get('rules')
+        if not isinstance(data, list):
+            raise ValueError(f"{file_path} must contain a list of rules")
+        rules.extend(data)
+
+    logger.info(f"Loaded {len(rules)} rules from {len(files)} files")
+    return rules
+
+def _field_getter(field):
+    """Get a function reading a field, or a dotted path into the event such as raw_data.errorCode."""
+    if '.' not in field:
+        return lambda event: event.get(field)
+    path = field.split('.')
+
+    def get(event):
+        value = event
+        for key in path:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(key)
+        return value
+    return get
+
+def _one_of(values):
+    """Get a predicate checking membership of a set, where unhashable values such as lists never match."""
+    values = set(values)
+
+    def contains(value):
+        try:
+            return value in values
+        except TypeError:
+            return False
+    return contains
+
+def _compile_condition(condition):
+    """
+    Compile the condition on one field into a predicate on the field's value.
+
+    A condition is a value to equal, a list of values to equal one of, or a
+    mapping with one of the keys 'equals', 'in', 'regex', 'cidr', 'exists'
+    or 'not' (negating a nested condition).
+    """
+    if isinstance(condition, list):
+        return _one_of(condition)
+    if not isinstance(condition, dict):
+        return lambda value: value == condition
+    if len(condition) != 1:
+        raise ValueError(f"Condition must have exactly one operator: {condition}")
+
+    operator, operand = next(iter(condition.items()))
+    if operator == 'equals':
+        return lambda value: value == operand
+    if operator == 'in':
+        return _one_of(operand)
+    if operator == 'regex':
+        pattern = re.compile(operand)
+        return lambda value: value is not None and pattern.search(str(value)) is not None
+    if operator == 'cidr':
+        networks = [ipaddress.ip_network(network, strict=False)
+                    for network in ([operand] if isinstance(operand, str) else operand)]
+
+        def in_networks(value):
+            address = _parse_ip(value) if isinstance(value, str) else None
+            return address is not None and any(address in network for network in networks)
+        return in_networks
+    if operator == 'exists':
+        return lambda value: (value is not None) == bool(operand)
+    if operator == 'not':
+        predicate = _compile_condition(operand)
+        return lambda value: not predicate(value)
+    raise ValueError(f"Unknown condition operator: {operator}")
+
+def _dispatch_values(condition):
+    """Get the exact values a condition on a dispatch field accepts, or None if it can't be indexed."""
+    if isinstance(condition, list):
+        return list(condition)
+    if isinstance(condition, dict):
+        if len(condition) != 1:
+            # Left to _compile_condition, which rejects it
+            return None
+        if 'equals' in condition:
+            return [condition['equals']]
+        if 'in' in condition:
+            return list(condition['in'])
+        return None
+    return [condition]
+
+class Rule:
+    """
+    A compiled detection rule.
+
+    A rule matches an event when every condition in its 'match' mapping
+    holds. With a 'threshold' of count events within window seconds, it only
+    fires once that many matching events with the same group_by values fall
+    within the window, after which the group's count starts over. Events are
+    not assumed to arrive in time order: CloudTrail files of different
+    regions and accounts interleave, so each group keeps its event times
+    sorted and a late event is counted in the windows it falls in.
+    """
+
+    def __init__(self, definition):
+        """
+        Compile a rule definition.
+
+        Args:
+            definition (dict): Rule with an 'id', optional 'title', 'severity' and
+                'threshold', and a 'match' mapping of fields to conditions.
+
+        Raises:
+            ValueError: If the definition is invalid
+        """
+        self.id = definition.get('id')
+        if not self.id:
+            raise ValueError(f"Rule without an id: {definition}")
+        self.title = definition.get('title', self.id)
+        self.severity = definition.get('severity', 'medium')
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Rule {self.id}: severity must be one of {', '.join(SEVERITIES)}")
+
+        match = definition.get('match') or {}
+        if not isinstance(match, dict):
+            raise ValueError(f"Rule {self.id}: 'match' must be a mapping of fields to conditions")
+
+        # Conditions on dispatch fields with exact values are enforced by the index instead
+        self.dispatch = {}
+        self.conditions = []
+        try:
+            for field, condition in match.items():
+                values = _dispatch_values(condition) if field in DISPATCH_FIELDS else None
+                if values is not None:
+                    self.dispatch[field] = values
+                else:
+                    self.conditions.append((_field_getter(field), _compile_condition(condition)))
+        except (ValueError, TypeError, re.error) as e:
+            raise ValueError(f"Rule {self.id}: {e}")
+
+        threshold = definition.get('threshold')
+        self.count = self.window = None
+        self.group_by = ()
+        self.groups = {}
+        if threshold:
+            try:
+                self.count = int(threshold['count'])
+                self.window = float(threshold['window'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Rule {self.id}: threshold needs a numeric 'count' and 'window' in seconds")
+            self.group_by = tuple(threshold.get('group_by') or ())
+            self._group_getters = [_field_getter(field) for field in self.group_by]
+
+    def matches(self, event):
+        """Check the conditions not enforced by the dispatch index."""
+        for get, predicate in self.conditions:
+            if not predicate(get(event)):
+                return False
+        return True
+
+    def observe(self, event):
+        """
+        Count a matching event towards the threshold.
+
+        Args:
+            event (dict): Normalized event that matched the rule.
+
+        Returns:
+            tuple or None: (group values, count) if the threshold was reached, otherwise None.
+                Rules without a threshold fire on every matching event.
+        """
+        if self.count is None:
+            return (), 1
+        event_time = event.get('event_time')
+        if not event_time:
+            return None
+
+        now = event_time.timestamp()
+        group = tuple(get(event) for get in self._group_getters)
+        times = self.groups.get(group)
+        if times is None:
+            times = self.groups[group] = []
+        insort(times, now)
+
+        # The busiest window holding this event starts at this event or at one shortly before it
+        window = self.window
+        last = bisect_right(times, now)
+        for first in range(bisect_right(times, now - window), last):
+            count = bisect_left(times, times[first] + window, first) - first
+            if count >= self.count:
+                del self.groups[group]
+                return group, count
+        return None
+
+    def evict(self, now):
+        """
+        Forget the event times that fell out of the window before now.
+
+        Args:
+            now (float): Timestamp of the newest event seen. Groups with no event
+                within the window before it are dropped.
+        """
+        bound = now - self.window
+        stale = []
+        for group, times in self.groups.items():
+            expired = bisect_right(times, bound)
+            if expired == len(times):
+                stale.append(group)
+            elif expired:
+                del times[:expired]
+        for group in stale:
+            del self.groups[group]
+
+class RuleEngine:
+    """
+    Evaluates detection rules against normalized events as they stream by.
+
+    Rules are indexed by the exact event_source and event_name values they
+    require. The candidate rules of each (event_source, event_name) pair are
+    resolved once and cached, so an event costs one dictionary lookup plus
+    the rules that can actually match it, however many rules are loaded.
+    Used as a processing stage, it passes events through unchanged and
+    writes alerts as JSON lines as soon as they fire.
+    """
+
+    def __init__(self, rules, alerts_file=None):
+        """
+        Compile the rules.
+
+        Args:
+            rules (list): Rule definitions, as returned by load_rules.
+            alerts_file (str, optional): File to write alerts to as JSON lines. Without it,
+                alerts are logged.
+
+        Raises:
+            ValueError: If a rule is invalid or rule ids are not unique
+        """
+        self.rules = [Rule(definition) for definition in rules]
+        duplicates = [rule_id for rule_id, count in Counter(rule.id for rule in self.rules).items() if count > 1]
+        if duplicates:
+            raise ValueError(f"Duplicate rule ids: {', '.join(duplicates)}")
+
+        self._by_pair = {}
+        self._by_source = {}
+        self._by_name = {}
+        self._unindexed = []
+        for rule in self.rules:
+            sources = rule.dispatch.get('event_source')
+            names = rule.dispatch.get('event_name')
+            if sources and names:
+                for source in sources:
+                    for name in names:
+                        self._by_pair.setdefault((source, name), []).append(rule)
+            elif sources:
+                for source in sources:
+                    self._by_source.setdefault(source, []).append(rule)
+            elif names:
+                for name in names:
+                    self._by_name.setdefault(name, []).append(rule)
+            else:
+                self._unindexed.append(rule)
+        self._candidates = {}
+
+        self.threshold_rules = [rule for rule in self.rules if rule.window]
+        self.alerts = Counter()
+        self._alerts_file = open(alerts_file, 'w') if alerts_file else None
+        self._latest = None
+        logger.info(f"Compiled {len(self.rules)} rules, {len(self._unindexed)} of them checked against every event")
+
+    def candidates(self, event_source, event_name):
+        """
+        Get the rules that may match events with a given source and name.
+
+        Args:
+            event_source (str): Event source of the event.
+            event_name (str): Event name of the event.
+
+        Returns:
+            list: Candidate rules, in the order they were loaded.
+        """
+        key = (event_source, event_name)
+        rules = self._candidates.get(key)
+        if rules is None:
+            matched = set(self._by_pair.get(key, ()))
+            matched.update(self._by_source.get(event_source, ()))
+            matched.update(self._by_name.get(event_name, ()))
+            matched.update(self._unindexed)
+            rules = self._candidates[key] = [rule for rule in self.rules if rule in matched]
+        return rules
+
+    def process(self, events):
+        """
+        Evaluate the rules against a batch of events.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            list: The same events, unchanged.
+        """
+        candidates = self._candidates
+        for event in events:
+            key = (event.get('event_source'), event.get('event_name'))
+            rules = candidates.get(key)
+            if rules is None:
+                rules = self.candidates(*key)
+            for rule in rules:
+                if rule.matches(event):
+                    fired = rule.observe(event)
+                    if fired is not None:
+                        self._emit(rule, event, *fired)
+
+        self._evict_groups(events)
+        return events
+
+    def close(self):
+        """Close the alerts file and log the number of alerts per rule."""
+        if self._alerts_file:
+            self._alerts_file.close()
+        for rule_id, count in self.alerts.most_common():
+            logger.info(f"Rule {rule_id}: {count} alerts")
+        logger.info(f"Raised {sum(self.alerts.values())} alerts")
+
+    def _emit(self, rule, event, group, count):
+        alert = {'rule_id': rule.id, 'title': rule.title, 'severity': rule.severity}
+        for field in ALERT_EVENT_FIELDS:
+            value = event.get(field)
+            alert[field] = value.isoformat() if hasattr(value, 'isoformat') else value
+        if rule.window:
+            alert['count'] = count
+            alert['window'] = rule.window
+            alert['group'] = dict(zip(rule.group_by, group))
+        self.alerts[rule.id] += 1
+
+        if self._alerts_file:
+            self._alerts_file.write(json.dumps(alert, default=str) + '\n')
+            self._alerts_file.flush()
+        else:
+            logger.warning(f"[{rule.severity}] {rule.title}: {event.get('event_name')} by "
+                           f"{event.get('username')} from {event.get('source_ip')} at {alert['event_time']}")
+
+    def _evict_groups(self, events):
+        """Drop threshold groups that fell out of their window, bounding memory on long streams."""
+        if not self.threshold_rules:
+            return
+        times = [event['event_time'] for event in events if event.get('event_time')]
+        if not times:
+            return
+        latest = max(times).timestamp()
+        if self._latest is None or latest > self._latest:
+            self._latest = latest
+        for rule in self.threshold_rules:
+            rule.evict(self._latest)
@@ -0,0 +1,187 @@
+"""
+Streaming reconstruction of actor sessions from CloudTrail events.
+"""
+
+import json
+import logging
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Number of most frequent event names listed per session
+SESSION_TOP_EVENTS = 10
+
+# Maximum number of distinct user agents remembered per session
+SESSION_MAX_USER_AGENTS = 10
+
+class Session:
+    """Activity of one credential from one source IP without a long pause."""
+
+    __slots__ = ('key', 'identity', 'first_time', 'last_time', 'events', 'errors',
+                 'event_names', 'regions', 'user_agents')
+
+    def __init__(self, key, identity, event_time):
+        self.key = key
+        self.identity = identity
+        self.first_time = event_time
+        self.last_time = event_time
+        self.events = 0
+        self.errors = 0
+        self.event_names = Counter()
+        self.regions = set()
+        self.user_agents = set()
+
+    def add(self, event, event_time):
+        """Add an event to the session."""
+        self.events += 1
+        if event_time < self.first_time:
+            self.first_time = event_time
+        if event_time > self.last_time:
+            self.last_time = event_time
+        self.event_names[event.get('event_name')] += 1
+        if event.get('aws_region'):
+            self.regions.add(event['aws_region'])
+        user_agent = event.get('user_agent')
+        if user_agent and len(self.user_agents) < SESSION_MAX_USER_AGENTS:
+            self.user_agents.add(user_agent)
+        if (event.get('raw_data') or {}).get('errorCode'):
+            self.errors += 1
+
+    def summary(self):
+        """
+        Summarize the session.
+
+        Returns:
+            dict: Identity, source IP, time range, duration, event and error counts,
+                most frequent event names, regions and user agents.
+        """
+        summary = dict(self.identity)
+        summary.update({
+            'source_ip': self.key[2],
+            'first_event_time': self.first_time.isoformat(),
+            'last_event_time': self.last_time.isoformat(),
+            'duration_seconds': int((self.last_time - self.first_time).total_seconds()),
+            'events': self.events,
+            'errors': self.errors,
+            'event_names': dict(self.event_names.most_common(SESSION_TOP_EVENTS)),
+            'regions': sorted(self.regions),
+            'user_agents': sorted(self.user_agents)
+        })
+        return summary
+
+def event_identity(raw):
+    """
+    Get the identity of the caller of a CloudTrail record.
+
+    Args:
+        raw (dict): Raw CloudTrail record.
+
+    Returns:
+        dict: Access key ID, ARN, principal type, user name and account ID of the caller.
+    """
+    identity = raw.get('userIdentity') or {}
+    issuer = (identity.get('sessionContext') or {}).get('sessionIssuer') or {}
+    return {
+        'access_key_id': identity.get('accessKeyId'),
+        'arn': identity.get('arn'),
+        'principal_type': identity.get('type'),
+        'username': identity.get('userName') or issuer.get('userName'),
+        'account_id': identity.get('accountId') or raw.get('recipientAccountId')
+    }
+
+class SessionTracker:
+    """
+    Groups events into sessions as they stream by, in bounded memory.
+
+    A session is the run of events signed with the same access key, by the
+    same session ARN, from the same source IP, without a pause longer than
+    idle_timeout. Time is measured by event_time: once the latest event_time
+    seen is more than idle_timeout past a session's last event, the session
+    is closed, summarized and forgotten. If more than max_sessions are open,
+    the least recently active ones are closed early. Used as a processing
+    stage, it passes events through unchanged and writes one JSON line per
+    closed session.
+    """
+
+    def __init__(self, sessions_file, idle_timeout=1800, max_sessions=100000):
+        """
+        Initialize the tracker.
+
+        Args:
+            sessions_file (str): File to write session summaries to as JSON lines.
+            idle_timeout (int, optional): Seconds without events after which a session ends.
+            max_sessions (int, optional): Maximum number of open sessions kept in memory.
+        """
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.watermark = None
+        self.closed = 0
+        self.forced = 0
+        self.untimed = 0
+        self._output = open(sessions_file, 'w')
+        self.sessions_file = sessions_file
+
+    def process(self, events):
+        """
+        Add a batch of events to their sessions and close the idle ones.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            list: The same events, unchanged.
+        """
+        sessions = self.sessions
+        for event in events:
+            event_time = event.get('event_time')
+            if not event_time:
+                self.untimed += 1
+                continue
+            raw = event.get('raw_data') or {}
+            identity = raw.get('userIdentity') or {}
+            key = (identity.get('accessKeyId'), identity.get('arn'), event.get('source_ip') or raw.get('sourceIPAddress'))
+
+            session = sessions.get(key)
+            if session is not None and (event_time - session.last_time).total_seconds() > self.idle_timeout:
+                # The credential came back after a pause, which starts a new session
+                self._close(sessions.pop(key))
+                session = None
+            if session is None:
+                session = sessions[key] = Session(key, event_identity(raw), event_time)
+            else:
+                sessions.move_to_end(key)
+            session.add(event, event_time)
+
+            if self.watermark is None or event_time > self.watermark:
+                self.watermark = event_time
+
+        self._evict()
+        return events
+
+    def close(self):
+        """Close all open sessions and the output file."""
+        while self.sessions:
+            self._close(self.sessions.popitem(last=False)[1])
+        self._output.close()
+        if self.forced:
+            logger.warning(f"Closed {self.forced} sessions early to stay within {self.max_sessions} open sessions")
+        if self.untimed:
+            logger.debug(f"Skipped {self.untimed} events without an event time")
+        logger.info(f"Wrote {self.closed} sessions to {self.sessions_file}")
+
+    def _evict(self):
+        sessions = self.sessions
+        # Sessions are kept in order of last activity, so idle ones are at the front
+        while sessions:
+            session = next(iter(sessions.values()))
+            if (self.watermark - session.last_time).total_seconds() <= self.idle_timeout:
+                break
+            self._close(sessions.popitem(last=False)[1])
+        while len(sessions) > self.max_sessions:
+            self._close(sessions.popitem(last=False)[1])
+            self.forced += 1
+
+    def _close(self, session):
+        self._output.write(json.dumps(session.summary()) + '\n')
+        self.closed += 1
@@ -0,0 +1,216 @@
+"""
+Streaming summary statistics of CloudTrail events.
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from scope.aws.columnar import ColumnarTimeline
+from scope.common.sketches import HyperLogLog, SpaceSaving
+
+logger = logging.getLogger(__name__)
+
+# Fields with top-N and distinct counts in the summary
+SUMMARY_FIELDS = ('username', 'source_ip', 'event_name', 'event_source', 'user_agent', 'aws_region')
+
+class EventSummarizer:
+    """
+    Summarizes a stream of normalized events in constant memory.
+
+    For every field in SUMMARY_FIELDS the most frequent values are tracked
+    with a Space-Saving sketch and the number of distinct values with a
+    HyperLogLog, alongside the event count and time range. Events are never
+    stored. It can run as a processing stage, passing events through
+    unchanged, or be fed columns directly.
+    """
+
+    # Whether counts and distinct values are estimates
+    approximate = True
+
+    def __init__(self, capacity=1000, precision=14):
+        """
+        Initialize the summarizer.
+
+        Args:
+            capacity (int, optional): Values tracked per field; counts are exact below this many distinct values.
+            precision (int, optional): HyperLogLog precision for distinct counts.
+        """
+        self.total = 0
+        self.first_time = None
+        self.last_time = None
+        self.top = {field: SpaceSaving(capacity) for field in SUMMARY_FIELDS}
+        self.distinct = {field: HyperLogLog(precision) for field in SUMMARY_FIELDS}
+
+    def process(self, events):
+        """
+        Add a batch of normalized events to the summary.
+
+        Args:
+            events (list): List of normalized CloudTrail events.
+
+        Returns:
+            list: The same events, unchanged.
+        """
+        columns = {field: [event.get(field) for event in events] for field in SUMMARY_FIELDS}
+        columns['event_time'] = [event.get('event_time') for event in events]
+        self.add_columns(columns)
+        return events
+
+    def add_columns(self, columns):
+        """
+        Add a batch of normalized events given as columns.
+
+        Args:
+            columns (dict): Mapping of field name to list of values, as returned by
+                CloudTrailParser.batch_normalize_columns.
+        """
+        times = [event_time for event_time in columns.get('event_time', []) if event_time]
+        self.total += len(columns.get('event_time', []))
+        if times:
+            low, high = min(times), max(times)
+            if self.first_time is None or low < self.first_time:
+                self.first_time = low
+            if self.last_time is None or high > self.last_time:
+                self.last_time = high
+
+        for field in SUMMARY_FIELDS:
+            values = columns.get(field)
+            if values:
+                self.top[field].update(values)
+                self.distinct[field].update(values)
+
+    def close(self):
+        """Log the number of summarized events."""
+        logger.info(f"Summarized {self.total} events")
+
+    def report(self, top_n=10):
+        """
+        Build the summary report.
+
+        Args:
+            top_n (int, optional): Number of most frequent values per field.
+
+        Returns:
+            dict: Event count, time range and per-field distinct count and top values.
+        """
+        return {
+            'events': self.total,
+            'first_event_time': self.first_time.isoformat() if self.first_time else None,
+            'last_event_time': self.last_time.isoformat() if self.last_time else None,
+            'fields': {
+                field: {
+                    'distinct': self.distinct[field].count(),
+                    'top': [
+                        {'value': value, 'count': count, 'error': error}
+                        for value, count, error in self.top[field].top(top_n)
+                    ]
+                }
+                for field in SUMMARY_FIELDS
+            }
+        }
+
+    def format_report(self, top_n=10):
+        """
+        Format the summary report as text for the terminal.
+
+        Args:
+            top_n (int, optional): Number of most frequent values per field.
+
+        Returns:
+            str: Human-readable report.
+        """
+        report = self.report(top_n)
+        lines = [
+            f"Events: {report['events']}",
+            f"Time range: {report['first_event_time']} - {report['last_event_time']}"
+        ]
+        for field, summary in report['fields'].items():
+            lines.append("")
+            lines.append(f"{field} ({'~' if self.approximate else ''}{summary['distinct']} distinct)")
+            for entry in summary['top']:
+                # Counts with an error are upper bounds; the true count is at least count - error
+                count = f"{entry['count']}" if not entry['error'] else f"<= {entry['count']} (>= {entry['count'] - entry['error']})"
+                lines.append(f"  {count:>12}  {entry['value']}")
+        return '\n'.join(lines)
+
+    def export_json(self, output_file, top_n=10):
+        """
+        Write the summary report to a JSON file.
+
+        Args:
+            output_file (str): Path to output JSON file.
+            top_n (int, optional): Number of most frequent values per field.
+
+        Returns:
+            str: Path to the created file.
+        """
+        with open(output_file, 'w') as f:
+            json.dump(self.report(top_n), f, indent=2)
+        logger.info(f"Summary exported to {output_file}")
+        return output_file
+
+class ExactEventSummarizer(EventSummarizer):
+    """
+    Summarizes events with exact counts, keeping them in a ColumnarTimeline.
+
+    Instead of sketches, the summarized fields are stored as integer codes in
+    NumPy arrays, and counts and distinct values are computed exactly with
+    vectorized group-bys once all events are in. Memory grows by a few dozen
+    bytes per event, so this suits timelines that fit in memory.
+    """
+
+    approximate = False
+
+    def __init__(self):
+        """
+        Initialize the summarizer.
+
+        Raises:
+            ImportError: If NumPy is not installed
+        """
+        self.timeline = ColumnarTimeline()
+
+    def add_columns(self, columns):
+        """
+        Add a batch of normalized events given as columns.
+
+        Args:
+            columns (dict): Mapping of field name to list of values, as returned by
+                CloudTrailParser.batch_normalize_columns.
+        """
+        self.timeline.add_columns(columns)
+
+    def close(self):
+        """Log the number of summarized events."""
+        logger.info(f"Summarized {len(self.timeline)} events")
+
+    def report(self, top_n=10):
+        """
+        Build the summary report, in the format of EventSummarizer.report with every error 0.
+
+        Args:
+            top_n (int, optional): Number of most frequent values per field.
+
+        Returns:
+            dict: Event count, time range and per-field distinct count and top values.
+        """
+        timeline = self.timeline
+        mask = timeline.time_mask()
+        times = timeline.event_time[mask]
+        first_time = times.min().astype(datetime) if len(times) else None
+        last_time = times.max().astype(datetime) if len(times) else None
+
+        fields = {}
+        for field in SUMMARY_FIELDS:
+            counts = [(value, count) for value, count in timeline.group_counts(field) if value is not None]
+            fields[field] = {
+                'distinct': len(counts),
+                'top': [{'value': value, 'count': count, 'error': 0} for value, count in counts[:top_n]]
+            }
+        return {
+            'events': len(timeline),
+            'first_event_time': first_time.isoformat() if first_time else None,
+            'last_event_time': last_time.isoformat() if last_time else None,
+            'fields': fields
+        }
@@ -0,0 +1,308 @@
+"""
+Sparse timestamp index for random access into exported timelines.
+"""
+
+import csv
+import gzip
+import io
+import json
+import logging
+import os
+import sys
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of events covered by one index block
+INDEX_BLOCK_EVENTS = 1000
+
+# Formats accepted for the bounds of a slice
+TIME_BOUND_FORMATS = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+
+def index_path(timeline_file):
+    """
+    Get the path of the index sidecar of a timeline file.
+
+    Args:
+        timeline_file (str): Path to the timeline file.
+
+    Returns:
+        str: Path to the sidecar index.
+    """
+    return timeline_file + '.idx'
+
+def parse_time_bound(value):
+    """
+    Parse the bound of a time range given on the command line.
+
+    Args:
+        value (str): Time such as '2024-03-01', '2024-03-01T10:00' or '2024-03-01 10:00:00'.
+
+    Returns:
+        str: The time in the ISO format used for event_time in exported timelines.
+
+    Raises:
+        ValueError: If the value is in none of the supported formats
+    """
+    value = value.strip().rstrip('Z')
+    for fmt in TIME_BOUND_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).isoformat()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time: {value} (expected e.g. 2024-03-01 or 2024-03-01T10:00:00)")
+
+class TimestampIndex:
+    """
+    Sparse index mapping event_time ranges to byte ranges of a timeline file.
+
+    The data of the file is covered by contiguous blocks of at most
+    block_events events. For every block the index stores its byte offset,
+    event count, number of events with a timestamp and minimum and maximum
+    event_time, so a time range can be
+    read by seeking to just the blocks that overlap it. Blocks carry both
+    bounds, so the index also works for files that are not sorted by time,
+    such as streamed timelines. For compressed NDJSON every block is one gzip
+    member or zstd frame, which can be decompressed on its own.
+
+    The index is saved as JSON next to the timeline, e.g. timeline.csv.idx.
+    """
+
+    def __init__(self, timeline_file, output_format, compression=None, block_events=INDEX_BLOCK_EVENTS):
+        """
+        Initialize an empty index.
+
+        Args:
+            timeline_file (str): Path to the indexed timeline file.
+            output_format (str): 'csv', 'json' or 'ndjson'.
+            compression (str, optional): 'gzip' or 'zstd' for compressed NDJSON.
+            block_events (int, optional): Maximum number of events per block.
+        """
+        self.timeline_file = timeline_file
+        self.output_format = output_format
+        self.compression = compression
+        self.block_events = block_events
+        self.data_start = 0
+        self.data_end = None
+        self.blocks = []
+
+    def add_block(self, offset, events):
+        """
+        Record the events written starting at a byte offset.
+
+        Consecutive small batches are merged into one block while the block
+        stays within block_events, so small writes don't bloat the index.
+
+        Args:
+            offset (int): Byte offset where the events start.
+            events (list): Normalized events written from that offset, in order.
+        """
+        if not events:
+            return
+
+        times = [event['event_time'] for event in events if event.get('event_time')]
+        low = min(times).isoformat() if times else None
+        high = max(times).isoformat() if times else None
+
+        # Compressed blocks must stay separate, since each one is decompressed on its own
+        if self.blocks and not self.compression and self.blocks[-1][1] + len(events) <= self.block_events:
+            block = self.blocks[-1]
+            block[1] += len(events)
+            block[2] += len(times)
+            if low is not None:
+                block[3] = low if block[3] is None else min(block[3], low)
+                block[4] = high if block[4] is None else max(block[4], high)
+        else:
+            self.blocks.append([offset, len(events), len(times), low, high])
+
+    def save(self, data_end):
+        """
+        Write the index sidecar.
+
+        Args:
+            data_end (int): Byte offset where the event data ends, e.g. before the closing bracket of a JSON array.
+
+        Returns:
+            str: Path to the sidecar.
+        """
+        self.data_end = data_end
+        path = index_path(self.timeline_file)
+        with open(path, 'w') as f:
+            json.dump({
+                'format': self.output_format,
+                'compression': self.compression,
+                'data_start': self.data_start,
+                'data_end': data_end,
+                'blocks': self.blocks
+            }, f)
+        logger.debug(f"Wrote index of {len(self.blocks)} blocks to {path}")
+        return path
+
+    @classmethod
+    def load(cls, timeline_file):
+        """
+        Load the index sidecar of a timeline file.
+
+        Args:
+            timeline_file (str): Path to the timeline file.
+
+        Returns:
+            TimestampIndex: The saved index.
+        """
+        with open(index_path(timeline_file)) as f:
+            saved = json.load(f)
+        index = cls(timeline_file, saved['format'], saved.get('compression'))
+        index.data_start = saved['data_start']
+        index.data_end = saved['data_end']
+        index.blocks = saved['blocks']
+        return index
+
+    @classmethod
+    def scan(cls, timeline_file, output_format):
+        """
+        Build a stand-in index covering an unindexed file as a single block.
+
+        Args:
+            timeline_file (str): Path to an uncompressed CSV, JSON or NDJSON timeline.
+            output_format (str): 'csv', 'json' or 'ndjson'.
+
+        Returns:
+            TimestampIndex: Index whose one block spans all event data.
+        """
+        index = cls(timeline_file, output_format)
+        if output_format == 'csv':
+            with open(timeline_file, 'rb') as f:
+                f.readline()
+                index.data_start = f.tell()
+        index.data_end = os.path.getsize(timeline_file)
+        index.blocks = [[index.data_start, None, None, None, None]]
+        return index
+
+    def block_ranges(self, start=None, end=None):
+        """
+        Find the blocks that may contain events in [start, end).
+
+        Args:
+            start (str, optional): Inclusive lower bound in ISO format.
+            end (str, optional): Exclusive upper bound in ISO format.
+
+        Returns:
+            list: (offset, end offset, event count, contained) tuples in file order, where
+                contained is True if every event of the block lies within the range.
+        """
+        ranges = []
+        for i, (offset, count, timed, low, high) in enumerate(self.blocks):
+            block_end = self.blocks[i + 1][0] if i + 1 < len(self.blocks) else self.data_end
+            if low is None and high is None:
+                # Unknown bounds (a scanned file) - or no timestamps at all, which never match a range
+                if count is None:
+                    ranges.append((offset, block_end, count, False))
+                continue
+            if (start is not None and high < start) or (end is not None and low >= end):
+                continue
+            contained = timed == count and (start is None or low >= start) and (end is None or high < end)
+            ranges.append((offset, block_end, count, contained))
+        return ranges
+
+def _in_range(event_time, start, end):
+    if not event_time:
+        return False
+    return (start is None or event_time >= start) and (end is None or event_time < end)
+
+def _decompress_block(data, compression):
+    if compression == 'gzip':
+        return gzip.decompress(data)
+    if compression == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    return data
+
+def slice_timeline(timeline_file, start=None, end=None, output=None, output_format=None):
+    """
+    Write the events of an exported timeline that fall in a time range.
+
+    The sidecar index is used to read only the blocks overlapping the
+    range. Blocks entirely inside the range are copied as they are, and only
+    events of the blocks at its edges are parsed to check their time. The
+    result is in the format of the input: a CSV file with its header, JSON
+    Lines, or a JSON array. Compressed NDJSON is written decompressed.
+    Without an index, the whole file is scanned.
+
+    Args:
+        timeline_file (str): Path to a CSV, JSON or NDJSON timeline exported by Scope.
+        start (str, optional): Inclusive lower bound, as returned by parse_time_bound.
+        end (str, optional): Exclusive upper bound, as returned by parse_time_bound.
+        output (file, optional): Binary file to write to. Defaults to standard output.
+        output_format (str, optional): Format of an unindexed file. Defaults to its extension.
+
+    Returns:
+        int: Number of events written.
+
+    Raises:
+        ValueError: If an unindexed file is compressed or its format cannot be determined
+    """
+    if output is None:
+        output = sys.stdout.buffer
+
+    if os.path.exists(index_path(timeline_file)):
+        index = TimestampIndex.load(timeline_file)
+    else:
+        output_format = output_format or os.path.splitext(timeline_file)[1].lstrip('.')
+        if output_format not in ('csv', 'json', 'ndjson'):
+            raise ValueError(f"No index for {timeline_file} and cannot scan format '{output_format}'")
+        logger.warning(f"No index found for {timeline_file}, scanning the whole file")
+        index = TimestampIndex.scan(timeline_file, output_format)
+
+    ranges = index.block_ranges(start, end)
+    logger.info(f"Reading {len(ranges)} of {len(index.blocks)} blocks of {timeline_file}")
+
+    count = 0
+    with open(timeline_file, 'rb') as f:
+        if index.output_format == 'csv':
+            header = f.read(index.data_start)
+            output.write(header)
+            time_column = next(csv.reader([header.decode('utf-8')])).index('event_time')
+        elif index.output_format == 'json':
+            output.write(b'[\n')
+
+        for offset, block_end, block_count, contained in ranges:
+            f.seek(offset)
+            data = _decompress_block(f.read(block_end - offset), index.compression)
+
+            if index.output_format == 'csv':
+                if contained:
+                    output.write(data)
+                    count += block_count
+                    continue
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                for row in csv.reader(io.StringIO(data.decode('utf-8'), newline='')):
+                    if len(row) > time_column and _in_range(row[time_column], start, end):
+                        writer.writerow(row)
+                        count += 1
+                output.write(buffer.getvalue().encode('utf-8'))
+
+            elif index.output_format == 'ndjson':
+                if contained:
+                    output.write(data)
+                    count += block_count
+                    continue
+                for line in data.splitlines(True):
+                    if line.strip() and _in_range(json.loads(line).get('event_time'), start, end):
+                        output.write(line)
+                        count += 1
+
+            else:
+                # Blocks hold array elements separated by commas; a scanned file includes the brackets
+                text = data.decode('utf-8').strip().lstrip('[').rstrip(']').strip().lstrip(',')
+                for event in json.loads('[' + text + ']'):
+                    if contained or _in_range(event.get('event_time'), start, end):
+                        if count:
+                            output.write(b',\n')
+                        output.write(json.dumps(event, indent=2).encode('utf-8'))
+                        count += 1
+
+        if index.output_format == 'json':
+            output.write(b'\n]\n')
+
+    return count
@@ -3,13 +3,140 @@ AWS timeline generation module for creating forensic timelines from CloudTrail l
 """
 
 import csv
+import gzip
+import io
 import json
 import logging
+import multiprocessing
 import os
+import sys
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from scope.aws.timeindex import TimestampIndex
+from scope.common.pipeline import bounded_map
+
 logger = logging.getLogger(__name__)
 
+# Number of CSV rows serialized in memory before they are written out
+CSV_CHUNK_ROWS = 5000
+
+# Buffer size for timeline output files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# Number of events each worker serializes at a time in a parallel export
+EXPORT_CHUNK_EVENTS = 100000
+
+# Events of the timeline being exported, inherited by forked export workers
+_export_events = None
+
+def iter_csv_chunks(events, fields, chunk_rows=CSV_CHUNK_ROWS):
+    """
+    Serialize events to CSV text in chunks of rows.
+    
+    Only the selected fields are read from each event, and only those values
+    are converted: datetimes to ISO format and dicts/lists to JSON. Rows are
+    built in a single reused list rather than a copy of each event.
+    
+    Args:
+        events (iterable): Normalized CloudTrail events.
+        fields (list): Fields to write, in column order.
+        chunk_rows (int, optional): Number of rows per yielded chunk.
+        
+    Returns:
+        generator: Yields CSV text, one string per chunk of rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    row = [None] * len(fields)
+    columns = list(enumerate(fields))
+    pending = 0
+    
+    for event in events:
+        for i, field in columns:
+            value = event.get(field)
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            elif isinstance(value, (dict, list)):
+                value = json.dumps(value)
+            row[i] = value
+        writer.writerow(row)
+        pending += 1
+        
+        if pending >= chunk_rows:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+            
+    if pending:
+        yield buffer.getvalue()
+
+def _json_default(value):
+    """JSON fallback that writes datetimes in ISO format and anything else as a string."""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def to_ndjson_line(event):
+    """
+    Serialize a normalized event as one compact JSON line.
+    
+    Args:
+        event (dict): Normalized CloudTrail event.
+        
+    Returns:
+        str: JSON text terminated by a newline.
+    """
+    return json.dumps(event, separators=(',', ':'), default=_json_default) + '\n'
+
+def _serialize_json_elements(events):
+    """Serialize events as the elements of an indented JSON array, without the brackets."""
+    serializable_events = []
+    for event in events:
+        event_copy = event.copy()
+        if event_copy.get('event_time') and isinstance(event_copy['event_time'], datetime):
+            event_copy['event_time'] = event_copy['event_time'].isoformat()
+        serializable_events.append(event_copy)
+        
+    # Strip the "[\n" and "\n]" around the elements so chunks can be joined with ",\n"
+    return json.dumps(serializable_events, indent=2)[2:-2]
+
+def serialize_chunk(item):
+    """
+    Serialize one contiguous chunk of a timeline for a parallel export.
+    
+    This is a module-level function so it can run in a worker process. Forked
+    workers read the chunk from the timeline they inherited, so only the
+    chunk bounds are sent to them; otherwise the events are sent along.
+    
+    Args:
+        item (tuple): (output_format, fields, compression, events, start, end). If events is
+            None, the chunk is events[start:end] of the timeline being exported.
+            
+    Returns:
+        bytes: The chunk in the output format, without any file header or footer.
+            NDJSON is compressed as a gzip member or zstd frame if requested.
+    """
+    output_format, fields, compression, events, start, end = item
+    if events is None:
+        events = _export_events[start:end]
+        
+    if output_format == 'csv':
+        data = ''.join(iter_csv_chunks(events, fields)).encode('utf-8')
+    elif output_format == 'json':
+        data = _serialize_json_elements(events).encode('utf-8')
+    else:
+        data = ''.join(to_ndjson_line(event) for event in events).encode('utf-8')
+        if compression == 'gzip':
+            data = gzip.compress(data)
+        elif compression == 'zstd':
+            import zstandard
+            data = zstandard.ZstdCompressor().compress(data)
+    return data
+
 class AWSTimeline:
     """
     Creates forensic timelines from AWS CloudTrail events.
@@ -55,13 +182,14 @@ class AWSTimeline:
         """
         return [event for event in self.events if filter_func(event)]
         
-    def export_csv(self, output_file, fields=None):
+    def export_csv(self, output_file, fields=None, index=False):
         """
         Export timeline to CSV format.
         
         Args:
             output_file (str): Path to output CSV file.
             fields (list, optional): List of fields to include. If None, includes standard fields.
+            index (bool, optional): Also write a timestamp index sidecar for slicing by time.
             
         Returns:
             str: Path to the created CSV file.
@@ -78,32 +206,29 @@ class AWSTimeline:
         # Sort events by time before export
         self.sort_events()
         
-        with open(output_file, 'w', newline='') as csvfile:
+        with open(output_file, 'w', newline='', buffering=WRITE_BUFFER_SIZE) as csvfile:
             writer = csv.DictWriter(csvfile, fieldnames=fields, extrasaction='ignore')
             writer.writeheader()
             
-            for event in self.events:
-                # Convert datetime objects to strings
-                row = event.copy()
-                if row.get('event_time') and isinstance(row['event_time'], datetime):
-                    row['event_time'] = row['event_time'].isoformat()
-                    
-                # Convert complex objects to JSON strings
-                for key, value in row.items():
-                    if isinstance(value, (dict, list)):
-                        row[key] = json.dumps(value)
-                        
-                writer.writerow(row)
+            if index:
+                timestamp_index = TimestampIndex(output_file, 'csv')
+                timestamp_index.data_start = csvfile.tell()
+                self._write_indexed_csv(csvfile, fields, timestamp_index)
+                timestamp_index.save(csvfile.tell())
+            else:
+                for chunk in iter_csv_chunks(self.events, fields):
+                    csvfile.write(chunk)
                 
         logger.info(f"Exported {len(self.events)} events to {output_file}")
         return output_file
         
-    def export_json(self, output_file):
+    def export_json(self, output_file, index=False):
         """
         Export timeline to JSON format.
         
         Args:
             output_file (str): Path to output JSON file.
+            index (bool, optional): Also write a timestamp index sidecar for slicing by time.
             
         Returns:
             str: Path to the created JSON file.
@@ -114,6 +239,24 @@ class AWSTimeline:
         # Sort events by time before export
         self.sort_events()
         
+        if index and self.events:
+            # Write the array a block of elements at a time, recording where each block starts
+            timestamp_index = TimestampIndex(output_file, 'json')
+            with open(output_file, 'w', buffering=WRITE_BUFFER_SIZE) as jsonfile:
+                jsonfile.write('[\n')
+                timestamp_index.data_start = jsonfile.tell()
+                for start in range(0, len(self.events), timestamp_index.block_events):
+                    block = self.events[start:start + timestamp_index.block_events]
+                    timestamp_index.add_block(jsonfile.tell(), block)
+                    if start:
+                        jsonfile.write(',\n')
+                    jsonfile.write(_serialize_json_elements(block))
+                timestamp_index.save(jsonfile.tell())
+                jsonfile.write('\n]')
+                
+            logger.info(f"Exported {len(self.events)} events to {output_file}")
+            return output_file
+        
         # Convert datetime objects to strings
         serializable_events = []
         for event in self.events:
@@ -137,26 +280,27 @@ class AWSTimeline:
             writer = csv.DictWriter(csvfile, fieldnames=self.csv_fields)
             writer.writeheader()
 
-    def append_csv(self, filename):
-        """Append events to an existing CSV file."""
-        with open(filename, 'a', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=self.csv_fields, extrasaction='ignore')
-            for event in self.events:
-                # Convert datetime objects to strings
-                row = event.copy()
-                if row.get('event_time') and isinstance(row['event_time'], datetime):
-                    row['event_time'] = row['event_time'].isoformat()
+    def append_csv(self, filename, index=None):
+        """Append events to an existing CSV file, recording them in the timestamp index if given."""
+        with open(filename, 'a', newline='', buffering=WRITE_BUFFER_SIZE) as csvfile:
+            if index:
+                self._write_indexed_csv(csvfile, self.csv_fields, index)
+            else:
+                for chunk in iter_csv_chunks(self.events, self.csv_fields):
+                    csvfile.write(chunk)
                     
-                # Convert complex objects to JSON strings
-                for key, value in row.items():
-                    if isinstance(value, (dict, list)):
-                        row[key] = json.dumps(value)
-                        
-                writer.writerow(row)
-
-    def append_json(self, filename, first_batch=False):
-        """Append events to a JSON file."""
+    def _write_indexed_csv(self, csvfile, fields, index):
+        for start in range(0, len(self.events), index.block_events):
+            block = self.events[start:start + index.block_events]
+            index.add_block(csvfile.tell(), block)
+            for chunk in iter_csv_chunks(block, fields):
+                csvfile.write(chunk)
+
+    def append_json(self, filename, first_batch=False, index=None):
+        """Append events to a JSON file, recording them in the timestamp index if given."""
         with open(filename, 'a') as f:
+            if index:
+                index.add_block(f.tell(), self.events)
             for i, event in enumerate(self.events):
                 # Convert datetime objects to strings
                 event_copy = event.copy()
@@ -166,4 +310,638 @@ class AWSTimeline:
                 # Add comma if not the first event in the file
                 if not first_batch or i > 0:
                     f.write(',\n')
-                f.write(json.dumps(event_copy, default=str, indent=2)) 
\ No newline at end of file
+                f.write(json.dumps(event_copy, default=str, indent=2))
+
+    def export_ndjson(self, output_file, compression=None, max_file_size=None, index=False):
+        """
+        Export timeline to JSON Lines format, one compact event per line.
+        
+        Args:
+            output_file (str): Path to output file.
+            compression (str, optional): 'gzip' or 'zstd' to compress the output.
+            max_file_size (int, optional): Rotate to a new numbered file once this many bytes are written.
+            index (bool, optional): Also write a timestamp index sidecar for each file for slicing by time.
+            
+        Returns:
+            list: Paths of the created files.
+        """
+        # Sort events by time before export
+        self.sort_events()
+        
+        with NDJSONWriter(output_file, compression=compression, max_file_size=max_file_size, index=index) as writer:
+            writer.write(self.events)
+            
+        logger.info(f"Exported {len(self.events)} events to {', '.join(writer.files)}")
+        return writer.files
+
+    def export_parallel(self, output_file, output_format='csv', workers=None, chunk_size=EXPORT_CHUNK_EVENTS,
+                        split=False, compression=None, fields=None, index=False):
+        """
+        Export the timeline by serializing contiguous chunks in worker processes.
+        
+        The sorted timeline is split into chunks of chunk_size events. Workers
+        serialize the chunks while the calling process writes the results in
+        order, holding at most two results per worker in memory. The output is
+        the same as that of export_csv, export_json or export_ndjson.
+        
+        With split, every chunk is written to its own complete file, e.g.
+        timeline-00000.csv, timeline-00001.csv, ..., and an index listing each
+        file with its event count and time range is written to timeline.index.json.
+        
+        Args:
+            output_file (str): Path to output file.
+            output_format (str, optional): 'csv', 'json' or 'ndjson'.
+            workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+            chunk_size (int, optional): Number of events per chunk.
+            split (bool, optional): Write one file per chunk plus an index.
+            compression (str, optional): 'gzip' or 'zstd' to compress NDJSON output.
+            fields (list, optional): Fields to include in CSV output. Defaults to the standard fields.
+            index (bool, optional): Also write a timestamp index sidecar with one block per chunk. Not
+                needed with split, whose index already records the time range of every file.
+            
+        Returns:
+            list: Paths of the created files.
+        """
+        global _export_events
+        
+        if output_format not in ('csv', 'json', 'ndjson'):
+            raise ValueError(f"Unsupported output format: {output_format}")
+        fields = fields or self.csv_fields
+        workers = workers or os.cpu_count() or 1
+        
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        
+        # Sort events by time before export
+        self.sort_events()
+        
+        bounds = [(start, min(start + chunk_size, len(self.events))) for start in range(0, len(self.events), chunk_size)]
+        
+        # Forked workers inherit the events, so only chunk bounds need to be sent
+        shared = multiprocessing.get_start_method() == 'fork'
+        items = (
+            (output_format, fields, compression, None if shared else self.events[start:end], start, end)
+            for start, end in bounds
+        )
+        
+        if shared:
+            _export_events = self.events
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunks = bounded_map(executor, serialize_chunk, items, workers * 2)
+                if split:
+                    files = self._write_split_files(output_file, output_format, fields, bounds, chunks)
+                else:
+                    files = [self._write_joined_file(output_file, output_format, fields, bounds, chunks,
+                                                     compression, index)]
+        finally:
+            _export_events = None
+            
+        logger.info(f"Exported {len(self.events)} events to {', '.join(files)} using {workers} workers")
+        return files
+        
+    def _file_header(self, output_format, fields):
+        if output_format == 'csv':
+            header = io.StringIO()
+            csv.DictWriter(header, fieldnames=fields).writeheader()
+            return header.getvalue().encode('utf-8')
+        if output_format == 'json':
+            return b'[\n'
+        return b''
+        
+    def _write_joined_file(self, output_file, output_format, fields, bounds, chunks, compression=None, index=False):
+        timestamp_index = None
+        if index and bounds:
+            timestamp_index = TimestampIndex(output_file, output_format, compression, block_events=bounds[0][1])
+            
+        with open(output_file, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+            if output_format == 'json' and not self.events:
+                f.write(b'[]')
+                return output_file
+                
+            f.write(self._file_header(output_format, fields))
+            if timestamp_index:
+                timestamp_index.data_start = f.tell()
+            for (start, end), data in zip(bounds, chunks):
+                if timestamp_index:
+                    timestamp_index.add_block(f.tell(), self.events[start:end])
+                if output_format == 'json' and start:
+                    f.write(b',\n')
+                f.write(data)
+            if timestamp_index:
+                timestamp_index.save(f.tell())
+            if output_format == 'json':
+                f.write(b'\n]')
+        return output_file
+        
+    def _write_split_files(self, output_file, output_format, fields, bounds, chunks):
+        root, ext = os.path.splitext(output_file)
+        if ext in NDJSONWriter.COMPRESSION_EXTENSIONS.values():
+            root, inner_ext = os.path.splitext(root)
+            ext = inner_ext + ext
+            
+        files = []
+        index = []
+        for (start, end), data in zip(bounds, chunks):
+            path = f"{root}-{len(files):05d}{ext}"
+            with open(path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+                f.write(self._file_header(output_format, fields))
+                f.write(data)
+                if output_format == 'json':
+                    f.write(b'\n]')
+            files.append(path)
+            
+            first_time = self.events[start].get('event_time')
+            last_time = self.events[end - 1].get('event_time')
+            index.append({
+                'file': os.path.basename(path),
+                'events': end - start,
+                'first_event_time': first_time.isoformat() if isinstance(first_time, datetime) else first_time,
+                'last_event_time': last_time.isoformat() if isinstance(last_time, datetime) else last_time
+            })
+            
+        index_file = f"{root}.index.json"
+        with open(index_file, 'w') as f:
+            json.dump({'format': output_format, 'events': len(self.events), 'files': index}, f, indent=2)
+        logger.info(f"Wrote index of {len(files)} files to {index_file}")
+        return files
+
+class TimelineWriter(ABC):
+    """
+    Base class for writers that stream batches of normalized events to an output file.
+    """
+    
+    def __init__(self, output_file):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_file (str): Path to the output file.
+        """
+        self.output_file = output_file
+        self.files = [output_file]
+        
+    @abstractmethod
+    def write(self, events):
+        """
+        Append a batch of normalized events to the output.
+        
+        Args:
+            events (list): List of normalized CloudTrail events.
+        """
+        
+    def close(self):
+        """Finish the output."""
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+class CSVTimelineWriter(TimelineWriter):
+    """
+    Streams events to a CSV file with the standard timeline columns, or the given fields.
+    
+    When appending to a non-empty file, its header is kept and not written again.
+    """
+    
+    def __init__(self, output_file, index=False, fields=None, append=False):
+        super().__init__(output_file)
+        self.timeline = AWSTimeline([])
+        if fields:
+            self.timeline.csv_fields = list(fields)
+        if not (append and os.path.exists(output_file) and os.path.getsize(output_file)):
+            self.timeline.export_csv_header(output_file)
+        self.index = None
+        if index:
+            self.index = TimestampIndex(output_file, 'csv')
+            self.index.data_start = os.path.getsize(output_file)
+        
+    def write(self, events):
+        self.timeline.events = events
+        self.timeline.append_csv(self.output_file, self.index)
+        
+    def close(self):
+        if self.index:
+            self.index.save(os.path.getsize(self.output_file))
+
+class JSONTimelineWriter(TimelineWriter):
+    """
+    Streams events into a single JSON array.
+    
+    The array is only closed when the writer is closed, so the file is not
+    valid JSON until the run finishes.
+    """
+    
+    def __init__(self, output_file, index=False):
+        super().__init__(output_file)
+        self.timeline = AWSTimeline([])
+        self.first_batch = True
+        
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        
+        # Initialize JSON file with opening bracket
+        with open(output_file, 'w') as f:
+            f.write('[\n')
+            
+        self.index = None
+        if index:
+            self.index = TimestampIndex(output_file, 'json')
+            self.index.data_start = os.path.getsize(output_file)
+            
+    def write(self, events):
+        if not events:
+            return
+        self.timeline.events = events
+        self.timeline.append_json(self.output_file, self.first_batch, self.index)
+        self.first_batch = False
+        
+    def close(self):
+        with open(self.output_file, 'a') as f:
+            if self.index:
+                self.index.save(f.tell())
+            f.write('\n]')
+
+class NDJSONWriter(TimelineWriter):
+    """
+    Streams events as JSON Lines, one compact event per line.
+    
+    Every batch is flushed as a complete unit - a gzip member or zstd frame
+    when compressing - so the output is readable after each batch. With a
+    maximum file size, output rotates through numbered files such as
+    timeline-00000.ndjson.gz, timeline-00001.ndjson.gz, ... With an index,
+    every file gets a timestamp index sidecar whose blocks are the chunks.
+    """
+    
+    COMPRESSION_EXTENSIONS = {'gzip': '.gz', 'zstd': '.zst'}
+    
+    # Uncompressed bytes compressed and written at a time
+    CHUNK_SIZE = 4 * 1024 * 1024
+    
+    def __init__(self, output_file, compression=None, max_file_size=None, index=False, append=False):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_file (str): Path to the output file.
+            compression (str, optional): 'gzip' or 'zstd'.
+            max_file_size (int, optional): Rotate to a new file once this many bytes have been
+                written. A file only exceeds it when a single line (or compressed chunk) is larger.
+            index (bool, optional): Write a timestamp index sidecar for each file.
+            append (bool, optional): Append to existing files instead of replacing them. With
+                rotation, files already at the maximum size are filled no further.
+                
+        Raises:
+            ValueError: If the compression method is not supported
+            ImportError: If zstd compression is requested without the zstandard package
+        """
+        super().__init__(output_file)
+        if compression and compression not in self.COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unsupported compression: {compression}")
+            
+        self.compression = compression
+        self.max_file_size = max_file_size
+        self.index = index
+        self.append = append
+        self.files = []
+        self._file = None
+        self._file_size = 0
+        self._index = None
+        
+        if compression == 'zstd':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError("zstd compression requires the zstandard package: pip install scope-forensics[zstd]")
+            self._zstd = zstandard.ZstdCompressor()
+            
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+        self._open_next()
+        
+    def write(self, events):
+        chunk = []
+        chunk_size = 0
+        chunk_start = 0
+        
+        # With an index, chunks also end after a block of events so that index blocks stay small
+        block_events = self._index.block_events if self.index else None
+        
+        for i, event in enumerate(events):
+            line = to_ndjson_line(event).encode('utf-8')
+            if chunk and (chunk_size + len(line) > self._chunk_limit() or len(chunk) == block_events):
+                self._write_chunk(b''.join(chunk), events[chunk_start:i])
+                chunk = []
+                chunk_size = 0
+                chunk_start = i
+            chunk.append(line)
+            chunk_size += len(line)
+            
+        if chunk:
+            self._write_chunk(b''.join(chunk), events[chunk_start:])
+        self._file.flush()
+        
+    def close(self):
+        if self._file:
+            if self._index:
+                self._index.save(self._file_size)
+                self._index = None
+            self._file.close()
+            self._file = None
+            
+    def _chunk_limit(self):
+        if not self.max_file_size:
+            return self.CHUNK_SIZE
+        if self.compression:
+            return min(self.CHUNK_SIZE, self.max_file_size)
+        
+        # Fill the current file up to its limit before rotating
+        remaining = self.max_file_size - self._file_size
+        return remaining if remaining > 0 else self.max_file_size
+        
+    def _write_chunk(self, data, events):
+        if self.compression == 'gzip':
+            data = gzip.compress(data)
+        elif self.compression == 'zstd':
+            data = self._zstd.compress(data)
+            
+        if self.max_file_size and self._file_size and self._file_size + len(data) > self.max_file_size:
+            self._open_next()
+            
+        if self._index:
+            self._index.add_block(self._file_size, events)
+        self._file.write(data)
+        self._file_size += len(data)
+        
+    def _open_next(self):
+        self.close()
+        
+        path = self.output_file
+        if self.max_file_size:
+            root, ext = os.path.splitext(self.output_file)
+            if self.compression and ext == self.COMPRESSION_EXTENSIONS[self.compression]:
+                root, inner_ext = os.path.splitext(root)
+                ext = inner_ext + ext
+            path = f"{root}-{len(self.files):05d}{ext}"
+            
+        self._file = open(path, 'ab' if self.append else 'wb', buffering=WRITE_BUFFER_SIZE)
+        self._file_size = self._file.tell()
+        self.files.append(path)
+        if self.index:
+            self._index = TimestampIndex(path, 'ndjson', self.compression)
+        logger.debug(f"Writing events to {path}")
+
+class StreamTimelineWriter(TimelineWriter):
+    """
+    Streams events as CSV rows or JSON lines to standard output.
+    
+    Output is flushed after every batch, so events can be piped to other
+    tools as they are collected.
+    """
+    
+    def __init__(self, output_format, fields=None, stream=None):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_format (str): 'csv' or 'ndjson'.
+            fields (list, optional): Columns of CSV output. Defaults to the standard fields.
+            stream (file, optional): Text stream to write to. Defaults to standard output.
+            
+        Raises:
+            ValueError: If the format can't be streamed
+        """
+        if output_format not in ('csv', 'ndjson'):
+            raise ValueError(f"Only csv and ndjson output can be written to standard output, not {output_format}")
+        super().__init__('<stdout>')
+        self.output_format = output_format
+        self.stream = stream or sys.stdout
+        self.fields = list(fields) if fields else AWSTimeline().csv_fields
+        if output_format == 'csv':
+            csv.writer(self.stream).writerow(self.fields)
+            self.stream.flush()
+            
+    def write(self, events):
+        if self.output_format == 'csv':
+            for chunk in iter_csv_chunks(events, self.fields):
+                self.stream.write(chunk)
+        else:
+            self.stream.write(''.join(to_ndjson_line(event) for event in events))
+        self.stream.flush()
+
+class PartitionedTimelineWriter(TimelineWriter):
+    """
+    Streams events into a directory tree partitioned by time and optionally by region or account.
+    
+    Each partition is a directory such as date=2024-03-01/region=us-east-1
+    holding part files (part-0000.csv, part-0001.csv, ...) written by the
+    writer of the output format as events arrive. Only max_open partitions
+    are kept open at a time; a partition that receives events again after
+    being closed continues in a new part file. On close, manifest.json in the
+    output directory lists every partition with its files, event count and
+    minimum and maximum event_time.
+    """
+    
+    PARTITION_KEYS = ('region', 'account')
+    FORMAT_EXTENSIONS = {'csv': '.csv', 'json': '.json', 'ndjson': '.ndjson'}
+    
+    def __init__(self, output_dir, output_format, partition_by='day', partition_keys=None,
+                 compression=None, max_file_size=None, max_open=64, index=False, fields=None):
+        """
+        Initialize the writer.
+        
+        Args:
+            output_dir (str): Directory to write the partitions to.
+            output_format (str): 'csv', 'json' or 'ndjson'.
+            partition_by (str, optional): 'day', 'hour' or None to not partition by time.
+            partition_keys (list, optional): Further partition levels, from 'region' and 'account'.
+            compression (str, optional): Compression for NDJSON output.
+            max_file_size (int, optional): Rotation size for NDJSON part files.
+            max_open (int, optional): Maximum number of partitions with an open part file.
+            index (bool, optional): Write a timestamp index sidecar for every part file.
+            fields (list, optional): Columns of CSV part files. Defaults to the standard fields.
+            
+        Raises:
+            ValueError: If the format, time granularity or a partition key is not supported, or
+                compression or rotation is requested for CSV or JSON part files
+        """
+        super().__init__(output_dir)
+        if output_format not in self.FORMAT_EXTENSIONS:
+            raise ValueError(f"Unsupported output format: {output_format}")
+        if (compression or max_file_size) and output_format != 'ndjson':
+            raise ValueError(f"Compression and rotation are only supported for ndjson part files, not {output_format}")
+        if partition_by not in (None, 'day', 'hour'):
+            raise ValueError(f"Unsupported time partitioning: {partition_by}")
+        for key in partition_keys or []:
+            if key not in self.PARTITION_KEYS:
+                raise ValueError(f"Unsupported partition key: {key}")
+                
+        self.output_format = output_format
+        self.partition_by = partition_by
+        self.partition_keys = list(partition_keys or [])
+        self.compression = compression
+        self.max_file_size = max_file_size
+        self.max_open = max_open
+        self.index = index
+        self.fields = fields
+        self.files = []
+        self.partitions = {}
+        self._writers = OrderedDict()
+        self._paths = {}
+        
+        self.extension = self.FORMAT_EXTENSIONS[output_format]
+        if output_format == 'ndjson' and compression:
+            self.extension += NDJSONWriter.COMPRESSION_EXTENSIONS[compression]
+            
+        os.makedirs(output_dir, exist_ok=True)
+        
+    def write(self, events):
+        groups = {}
+        for event in events:
+            path = self._partition_path(event)
+            group = groups.get(path)
+            if group is None:
+                group = groups[path] = []
+            group.append(event)
+            
+        for path, group in groups.items():
+            partition = self.partitions.get(path)
+            if partition is None:
+                partition = self.partitions[path] = {'writers': [], 'events': 0,
+                                                     'min_event_time': None, 'max_event_time': None}
+            self._writer(path, partition).write(group)
+            
+            partition['events'] += len(group)
+            times = [event['event_time'] for event in group if event.get('event_time')]
+            if times:
+                low, high = min(times), max(times)
+                if partition['min_event_time'] is None or low < partition['min_event_time']:
+                    partition['min_event_time'] = low
+                if partition['max_event_time'] is None or high > partition['max_event_time']:
+                    partition['max_event_time'] = high
+                    
+    def close(self):
+        while self._writers:
+            _, writer = self._writers.popitem(last=False)
+            writer.close()
+        self._write_manifest()
+        
+    def _partition_path(self, event):
+        # Events of the same hour share a path, so build each path string only once
+        event_time = event.get('event_time')
+        if self.partition_by and event_time:
+            period = (event_time.year, event_time.month, event_time.day,
+                      event_time.hour if self.partition_by == 'hour' else None)
+        else:
+            period = None
+            
+        values = []
+        for key in self.partition_keys:
+            if key == 'region':
+                values.append(event.get('aws_region'))
+            else:
+                raw_data = event.get('raw_data') or {}
+                values.append(raw_data.get('recipientAccountId') or (raw_data.get('userIdentity') or {}).get('accountId'))
+                
+        cache_key = (period, tuple(values))
+        path = self._paths.get(cache_key)
+        if path is None:
+            parts = []
+            if self.partition_by:
+                if period is None:
+                    parts.append('date=unknown')
+                else:
+                    parts.append(f"date={period[0]:04d}-{period[1]:02d}-{period[2]:02d}")
+                    if self.partition_by == 'hour':
+                        parts.append(f"hour={period[3]:02d}")
+            for key, value in zip(self.partition_keys, values):
+                parts.append(f"{key}={str(value).replace('/', '_') if value else 'unknown'}")
+            path = self._paths[cache_key] = '/'.join(parts)
+        return path
+        
+    def _writer(self, path, partition):
+        writer = self._writers.get(path)
+        if writer is not None:
+            self._writers.move_to_end(path)
+            return writer
+            
+        # Close the least recently written partition to bound the number of open files
+        if len(self._writers) >= self.max_open:
+            _, oldest = self._writers.popitem(last=False)
+            oldest.close()
+            
+        part_file = os.path.join(self.output_file, *path.split('/'), f"part-{len(partition['writers']):04d}{self.extension}")
+        os.makedirs(os.path.dirname(part_file), exist_ok=True)
+        writer = open_timeline_writer(part_file, self.output_format, compression=self.compression,
+                                      max_file_size=self.max_file_size, index=self.index, fields=self.fields)
+        self._writers[path] = writer
+        
+        # Keep the writer rather than its path, since NDJSON rotation may add files later
+        partition['writers'].append(writer)
+        logger.debug(f"Writing partition {path} to {part_file}")
+        return writer
+        
+    def _write_manifest(self):
+        manifest_partitions = []
+        self.files = []
+        for path in sorted(self.partitions):
+            partition = self.partitions[path]
+            files = [file for writer in partition['writers'] for file in writer.files]
+            self.files.extend(files)
+            manifest_partitions.append({
+                'path': path,
+                'values': dict(part.split('=', 1) for part in path.split('/') if part),
+                'files': [os.path.relpath(file, self.output_file) for file in files],
+                'events': partition['events'],
+                'min_event_time': partition['min_event_time'].isoformat() if partition['min_event_time'] else None,
+                'max_event_time': partition['max_event_time'].isoformat() if partition['max_event_time'] else None
+            })
+            
+        manifest_file = os.path.join(self.output_file, 'manifest.json')
+        with open(manifest_file, 'w') as f:
+            json.dump({
+                'format': self.output_format,
+                'compression': self.compression,
+                'partition_by': self.partition_by,
+                'partition_keys': self.partition_keys,
+                'events': sum(partition['events'] for partition in self.partitions.values()),
+                'partitions': manifest_partitions
+            }, f, indent=2)
+        logger.info(f"Wrote manifest of {len(manifest_partitions)} partitions to {manifest_file}")
+
+def open_timeline_writer(output_file, output_format, compression=None, max_file_size=None,
+                         partition_by=None, partition_keys=None, index=False, fields=None, append=False):
+    """
+    Create a streaming writer for the given output format.
+    
+    Args:
+        output_file (str): Path to the output file, the output directory when partitioning,
+            or '-' for standard output (csv or ndjson only).
+        output_format (str): 'csv', 'json' or 'ndjson'.
+        compression (str, optional): Compression for NDJSON output.
+        max_file_size (int, optional): Rotation size for NDJSON output.
+        partition_by (str, optional): 'day' or 'hour' to partition the output by event time.
+        partition_keys (list, optional): Partition the output by 'region' and/or 'account'.
+        index (bool, optional): Write a timestamp index sidecar for every output file.
+        fields (list, optional): Columns of CSV output. Defaults to the standard fields.
+        append (bool, optional): Append to an existing CSV or NDJSON file instead of replacing it.
+        
+    Returns:
+        TimelineWriter: Writer for the format.
+    """
+    if output_file == '-':
+        return StreamTimelineWriter(output_format, fields=fields)
+    if partition_by or partition_keys:
+        return PartitionedTimelineWriter(output_file, output_format, partition_by=partition_by,
+                                         partition_keys=partition_keys, compression=compression,
+                                         max_file_size=max_file_size, index=index, fields=fields)
+    if output_format == 'csv':
+        return CSVTimelineWriter(output_file, index=index, fields=fields, append=append)
+    if output_format == 'json':
+        return JSONTimelineWriter(output_file, index=index)
+    if output_format == 'ndjson':
+        return NDJSONWriter(output_file, compression=compression, max_file_size=max_file_size, index=index,
+                            append=append)
+    raise ValueError(f"Unsupported output format: {output_format}")
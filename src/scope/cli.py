@@ -11,12 +11,159 @@ import configparser
 from datetime import datetime, timedelta
 
 from scope.aws.collector import AWSLogCollector
+from scope.aws.dedup import EventDeduplicator
+from scope.aws.enrich import IPEnricher
+from scope.aws.evidence import EvidenceIndex, EvidenceSearch
 from scope.aws.parser import CloudTrailParser
-from scope.aws.timeline import AWSTimeline
-from scope.common.utils import setup_logging
+from scope.aws.rules import RuleEngine, load_rules
+from scope.aws.sessions import SessionTracker
+from scope.aws.summary import SUMMARY_FIELDS, EventSummarizer, ExactEventSummarizer
+from scope.aws.timeindex import parse_time_bound, slice_timeline
+from scope.aws.timeline import AWSTimeline, open_timeline_writer
+from scope.common.pipeline import ThreadedWriter, prefetch
+from scope.common.utils import setup_logging, parse_size
 
 logger = logging.getLogger(__name__)
 
+# Number of batches that may wait between collection, normalization and writing
+PIPELINE_DEPTH = 2
+
+def size_argument(value):
+    """Argparse type for human-readable sizes such as '512M'."""
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def positive_int(value):
+    """Argparse type for counts that must be at least 1."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {value}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, got {number}")
+    return number
+
+def add_local_arguments(parser):
+    """Add the options selecting local CloudTrail log files."""
+    parser.add_argument('--directory', required=True,
+                        help='Directory containing CloudTrail logs, or a tar or zip archive of them')
+    parser.add_argument('--recursive', action='store_true', help='Recursively search subdirectories')
+    parser.add_argument('--batch-size', type=positive_int, default=1000, help='Number of events per batch')
+    parser.add_argument('--memory-budget', type=size_argument,
+                        help='Approximate memory per batch (e.g. 256M); overrides --batch-size')
+    parser.add_argument('--start-date', help='Only read logs delivered on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='Only read logs delivered on or before this date (YYYY-MM-DD)')
+    parser.add_argument('--regions', nargs='+', help='Only read logs of these regions (space-separated)')
+    parser.add_argument('--discovery-workers', type=int, default=1,
+                        help='Number of threads listing directories (useful on network file systems)')
+
+def add_s3_arguments(parser):
+    """Add the options selecting CloudTrail logs in an S3 bucket."""
+    parser.add_argument('--bucket', required=True, help='S3 bucket name')
+    parser.add_argument('--prefix', default='', help='S3 prefix')
+    parser.add_argument('--start-date', help='Start date (YYYY-MM-DD)')
+    parser.add_argument('--end-date', help='End date (YYYY-MM-DD)')
+    parser.add_argument('--output-dir', help='Directory to save raw logs')
+    parser.add_argument('--regions', nargs='+', help='Specific regions to collect from (space-separated)')
+    accounts = parser.add_mutually_exclusive_group()
+    accounts.add_argument('--all-accounts', action='store_true',
+                          help='Collect logs of every account found in the bucket (organization trails)')
+    accounts.add_argument('--accounts', nargs='+', help='Specific account IDs to collect (space-separated)')
+    parser.add_argument('--max-workers', type=int, default=8, help='Number of concurrent S3 requests')
+    parser.add_argument('--parse-workers', type=int, default=0,
+                        help='Number of processes decompressing and parsing logs (default: parse on download threads)')
+    parser.add_argument('--event-names', nargs='+', help='Only collect events with these event names (space-separated)')
+    parser.add_argument('--event-sources', nargs='+', help='Only collect events from these event sources (space-separated)')
+    parser.add_argument('--s3-select', action='store_true',
+                        help='Filter events server-side with S3 Select instead of downloading whole objects')
+    parser.add_argument('--max-attempts', type=int, default=5,
+                        help='Attempts per S3 request before the object is retried at the end of the run')
+    parser.add_argument('--failed-keys-file', help='File to write the S3 objects that could not be collected')
+    parser.add_argument('--batch-size', type=positive_int, default=1000, help='Number of events per batch')
+    parser.add_argument('--memory-budget', type=size_argument,
+                        help='Approximate memory per batch (e.g. 256M); overrides --batch-size')
+
+def add_sqs_arguments(parser):
+    """Add the options selecting CloudTrail logs announced on an SQS queue."""
+    parser.add_argument('--queue-url', required=True, help='URL of the SQS queue receiving S3 event notifications')
+    parser.add_argument('--endpoint-url', help='Endpoint of an SQS-compatible service, e.g. a local ElasticMQ')
+    parser.add_argument('--wait-time', type=int, default=20, help='Seconds each receive waits for messages (at most 20)')
+    parser.add_argument('--visibility-timeout', type=int,
+                        help="Seconds received messages stay hidden from other consumers (default: the queue's setting)")
+    parser.add_argument('--stop-when-empty', action='store_true',
+                        help='Stop once the queue is empty instead of waiting for messages')
+    parser.add_argument('--output-dir', help='Directory to save raw logs')
+    parser.add_argument('--max-workers', type=int, default=8, help='Number of concurrent S3 downloads')
+    parser.add_argument('--event-names', nargs='+', help='Only collect events with these event names (space-separated)')
+    parser.add_argument('--event-sources', nargs='+', help='Only collect events from these event sources (space-separated)')
+    parser.add_argument('--max-attempts', type=int, default=5, help='Attempts per S3 and SQS request')
+    parser.add_argument('--batch-size', type=positive_int, default=1000, help='Number of events per batch')
+    parser.add_argument('--memory-budget', type=size_argument,
+                        help='Approximate memory per batch (e.g. 256M); overrides --batch-size')
+
+def add_management_arguments(parser):
+    """Add the options selecting CloudTrail management events."""
+    parser.add_argument('--days', type=int, default=7, help='Number of days to look back')
+
+def add_follow_arguments(parser):
+    """Add the options for following logs as they are delivered."""
+    parser.add_argument('--follow', action='store_true',
+                        help='Keep polling for new logs and append them to the output until interrupted')
+    parser.add_argument('--state-file',
+                        help='File recording the logs already processed, so a restarted --follow resumes')
+    parser.add_argument('--poll-interval', type=float, default=10,
+                        help='Seconds between polls while new logs keep arriving')
+    parser.add_argument('--max-poll-interval', type=float, default=60,
+                        help='Longest wait in seconds between polls while no new logs arrive')
+
+def add_output_arguments(parser):
+    """Add the timeline output options shared by the log collection commands."""
+    parser.add_argument('--output-file', required=True,
+                        help='Output file for timeline ("-" writes csv or ndjson to standard output)')
+    parser.add_argument('--format', choices=['csv', 'json', 'ndjson'], default='csv', help='Output format')
+    parser.add_argument('--compress', choices=['gzip', 'zstd'], help='Compress NDJSON output')
+    parser.add_argument('--max-file-size', type=size_argument,
+                        help='Rotate NDJSON output into numbered files of about this size (e.g. 1G)')
+    parser.add_argument('--partition-by', choices=['day', 'hour'],
+                        help='Write the timeline as a directory (--output-file) partitioned by event time')
+    parser.add_argument('--partition-keys', nargs='+', choices=['region', 'account'],
+                        help='Also partition the output directory by these keys (space-separated)')
+    parser.add_argument('--index', action='store_true',
+                        help='Write a timestamp index next to each output file for "scope aws slice"')
+
+def time_bound_argument(value):
+    """Argparse type for the bounds of a time range such as '2024-03-01T10:00'."""
+    try:
+        return parse_time_bound(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def add_processing_arguments(parser):
+    """Add the event processing options shared by the log collection commands."""
+    parser.add_argument('--dedup', action='store_true', help='Drop events with an already seen eventID')
+    parser.add_argument('--dedup-max-keys', type=int, default=1000000,
+                        help='Maximum number of event IDs remembered for deduplication')
+    parser.add_argument('--principals', nargs='+',
+                        help='Only keep events made by these ARNs, principal IDs or user names (space-separated)')
+    parser.add_argument('--access-key-ids', nargs='+',
+                        help='Only keep events signed with these access key IDs (space-separated)')
+    parser.add_argument('--source-ips', nargs='+',
+                        help='Only keep events from these source IP addresses (space-separated)')
+    parser.add_argument('--evidence-index',
+                        help='Evidence index built with "scope aws index", used to skip files that cannot match')
+    parser.add_argument('--rules', nargs='+',
+                        help='Detection rule files or directories (JSON or YAML) to evaluate against the events')
+    parser.add_argument('--alerts-file', help='File to write rule alerts to as JSON lines (default: log them)')
+    parser.add_argument('--geoip-db', nargs='+',
+                        help='MaxMind-format (.mmdb) country, city or ASN databases to enrich source IPs with')
+    parser.add_argument('--aws-ip-ranges',
+                        help='Local copy of AWS ip-ranges.json to tag source IPs with their AWS service and region')
+    parser.add_argument('--sessions-file', help='File to write per-session activity summaries to as JSON lines')
+    parser.add_argument('--session-timeout', type=int, default=30,
+                        help='Minutes without events after which a session ends')
+
 def parse_args():
     """Parse command line arguments."""
     parser = argparse.ArgumentParser(description='Scope - Cloud Forensics Tool')
@@ -43,27 +190,97 @@ def parse_args():
     
     # Process local logs
     local_parser = aws_subparsers.add_parser('local', help='Process CloudTrail logs from local directory')
-    local_parser.add_argument('--directory', required=True, help='Directory containing CloudTrail logs')
-    local_parser.add_argument('--output-file', required=True, help='Output file for timeline')
-    local_parser.add_argument('--format', choices=['csv', 'json'], default='csv', help='Output format')
-    local_parser.add_argument('--recursive', action='store_true', help='Recursively search subdirectories')
+    add_local_arguments(local_parser)
+    add_output_arguments(local_parser)
+    add_processing_arguments(local_parser)
     
     # Collect from S3
     s3_parser = aws_subparsers.add_parser('s3', help='Collect CloudTrail logs from S3')
-    s3_parser.add_argument('--bucket', required=True, help='S3 bucket name')
-    s3_parser.add_argument('--prefix', default='', help='S3 prefix')
-    s3_parser.add_argument('--start-date', help='Start date (YYYY-MM-DD)')
-    s3_parser.add_argument('--end-date', help='End date (YYYY-MM-DD)')
-    s3_parser.add_argument('--output-dir', help='Directory to save raw logs')
-    s3_parser.add_argument('--output-file', required=True, help='Output file for timeline')
-    s3_parser.add_argument('--format', choices=['csv', 'json'], default='csv', help='Output format')
-    s3_parser.add_argument('--regions', nargs='+', help='Specific regions to collect from (space-separated)')
+    add_s3_arguments(s3_parser)
+    add_output_arguments(s3_parser)
+    add_processing_arguments(s3_parser)
+    add_follow_arguments(s3_parser)
+    
+    # Collect the log files announced by S3 event notifications
+    sqs_parser = aws_subparsers.add_parser('sqs', help='Collect CloudTrail logs announced by S3 notifications on an SQS queue')
+    add_sqs_arguments(sqs_parser)
+    add_output_arguments(sqs_parser)
+    add_processing_arguments(sqs_parser)
     
     # Collect management events
     mgmt_parser = aws_subparsers.add_parser('management', help='Collect CloudTrail management events')
-    mgmt_parser.add_argument('--days', type=int, default=7, help='Number of days to look back')
-    mgmt_parser.add_argument('--output-file', required=True, help='Output file for timeline')
-    mgmt_parser.add_argument('--format', choices=['csv', 'json'], default='csv', help='Output format')
+    add_management_arguments(mgmt_parser)
+    add_output_arguments(mgmt_parser)
+    add_processing_arguments(mgmt_parser)
+    add_follow_arguments(mgmt_parser)
+    mgmt_parser.add_argument('--export-workers', type=int, default=1,
+                             help='Number of processes serializing the timeline in parallel '
+                                  '(management only; local and s3 stream batches as they arrive)')
+    mgmt_parser.add_argument('--split-output', action='store_true',
+                             help='Write the timeline as numbered files of contiguous events plus an index')
+    
+    # Summarize events from any of the log sources without writing a timeline
+    summarize_parser = aws_subparsers.add_parser('summarize', help='Print summary statistics of CloudTrail events')
+    summarize_sources = summarize_parser.add_subparsers(dest='source', help='Log source')
+    for source, add_source_arguments, source_help in (
+        ('local', add_local_arguments, 'Summarize CloudTrail logs from a local directory'),
+        ('s3', add_s3_arguments, 'Summarize CloudTrail logs in S3'),
+        ('management', add_management_arguments, 'Summarize CloudTrail management events')
+    ):
+        source_parser = summarize_sources.add_parser(source, help=source_help)
+        add_source_arguments(source_parser)
+        add_processing_arguments(source_parser)
+        source_parser.add_argument('--top', type=int, default=10, help='Number of most frequent values per field')
+        source_parser.add_argument('--output-file', help='Also write the summary to this JSON file')
+        source_parser.add_argument('--exact', action='store_true',
+                                   help='Count exactly, keeping the summarized fields of every event in memory '
+                                        'as NumPy arrays (requires scope-forensics[columnar])')
+    
+    # Index log files so searches can skip files that cannot match
+    index_parser = aws_subparsers.add_parser('index', help='Build or update an evidence index of CloudTrail log files')
+    index_sources = index_parser.add_subparsers(dest='source', help='Log source')
+    for source, add_source_arguments, source_help in (
+        ('local', add_local_arguments, 'Index CloudTrail logs in a local directory'),
+        ('s3', add_s3_arguments, 'Index CloudTrail logs in S3')
+    ):
+        source_parser = index_sources.add_parser(source, help=source_help)
+        add_source_arguments(source_parser)
+        source_parser.add_argument('--index-file', required=True,
+                                   help='Index file to create or update (gzip-compressed if it ends in .gz)')
+    
+    # Validate log files against CloudTrail digest files
+    validate_parser = aws_subparsers.add_parser('validate', help='Validate CloudTrail log files against their digest files')
+    validate_sources = validate_parser.add_subparsers(dest='source', help='Log source')
+    validate_local = validate_sources.add_parser('local', help='Validate a local copy of a CloudTrail bucket')
+    validate_local.add_argument('--directory', required=True,
+                                help='Directory with the layout of the bucket, including CloudTrail-Digest files')
+    validate_s3 = validate_sources.add_parser('s3', help='Validate CloudTrail logs in S3')
+    validate_s3.add_argument('--bucket', required=True, help='S3 bucket name')
+    validate_s3.add_argument('--prefix', default='', help='S3 prefix of the CloudTrail logs')
+    validate_s3.add_argument('--start-date', help='Start date (YYYY-MM-DD)')
+    validate_s3.add_argument('--end-date', help='End date (YYYY-MM-DD)')
+    validate_s3.add_argument('--regions', nargs='+', help='Specific regions to validate (space-separated)')
+    validate_accounts = validate_s3.add_mutually_exclusive_group()
+    validate_accounts.add_argument('--all-accounts', action='store_true',
+                                   help='Validate every account found in the bucket (organization trails)')
+    validate_accounts.add_argument('--accounts', nargs='+', help='Specific account IDs to validate (space-separated)')
+    validate_s3.add_argument('--max-workers', type=int, default=8, help='Number of concurrent S3 requests')
+    validate_s3.add_argument('--max-attempts', type=int, default=5, help='Attempts per S3 request')
+    validate_s3.add_argument('--logs-dir',
+                             help='Raw logs saved by an earlier collection with --output-dir, hashed instead of downloading')
+    for source_parser in (validate_local, validate_s3):
+        source_parser.add_argument('--hash-workers', type=int,
+                                   help='Number of processes hashing log files (default: number of CPUs)')
+        source_parser.add_argument('--report-file', help='File to write the validation report to as JSON')
+    
+    # Slice an exported timeline by time
+    slice_parser = aws_subparsers.add_parser('slice', help='Extract a time range from an exported timeline')
+    slice_parser.add_argument('--input-file', required=True, help='Timeline file exported by Scope')
+    slice_parser.add_argument('--from', dest='start', type=time_bound_argument,
+                              help='Start of the range, inclusive (e.g. 2024-03-01T10:00)')
+    slice_parser.add_argument('--to', dest='end', type=time_bound_argument,
+                              help='End of the range, exclusive (e.g. 2024-03-01T11:00)')
+    slice_parser.add_argument('--output-file', required=True, help='File to write the events in the range to')
     
     # Discover trails
     discover_parser = aws_subparsers.add_parser('discover', help='Discover CloudTrail trails')
@@ -96,7 +313,9 @@ def main():
     
     # Setup logging
     log_level = logging.DEBUG if args.debug else logging.INFO
-    setup_logging(log_level=log_level, log_file=args.log_file)
+    # Keep log messages out of a timeline written to standard output
+    log_stream = sys.stderr if getattr(args, 'output_file', None) == '-' else None
+    setup_logging(log_level=log_level, log_file=args.log_file, stream=log_stream)
     
     if not args.provider:
         logger.error("No cloud provider specified")
@@ -118,6 +337,19 @@ def handle_aws_commands(args):
         configure_aws_credentials(args)
         return
         
+    if args.operation == 'slice':
+        # Slicing only reads a local timeline, so no AWS session is needed
+        with open(args.output_file, 'wb') as output:
+            count = slice_timeline(args.input_file, start=args.start, end=args.end, output=output)
+        logger.info(f"Wrote {count} events to {args.output_file}")
+        return
+
+    if getattr(args, 'compress', None) or getattr(args, 'max_file_size', None):
+        # Only NDJSON files are compressed and rotated, so reject rather than silently ignore the options
+        if args.format != 'ndjson' or args.output_file == '-':
+            logger.error("--compress and --max-file-size only apply to ndjson output written to files")
+            sys.exit(1)
+
     # Initialize AWS collector
     collector = AWSLogCollector(
         aws_access_key=args.access_key,
@@ -125,8 +357,13 @@ def handle_aws_commands(args):
         region=args.region
     )
     
+    source = args.source if args.operation in ('summarize', 'index', 'validate') else args.operation
+    if args.operation in ('summarize', 'index', 'validate') and not source:
+        logger.error("No log source specified")
+        sys.exit(1)
+    
     # For local operation, we don't need to validate AWS credentials
-    if args.operation != 'local':
+    if source != 'local':
         # Validate credentials
         valid, account_id = collector.validate_credentials()
         if not valid:
@@ -135,117 +372,86 @@ def handle_aws_commands(args):
         
         logger.info(f"Using AWS account: {account_id}")
     
-    if args.operation == 'local':
-        # Process local CloudTrail logs
-        # Create timeline object for streaming
-        timeline = AWSTimeline([])
-        
-        # Open output file
-        output_format = args.format
-        output_file = args.output_file
-        
-        # Initialize the file with headers if CSV
-        if output_format == 'csv':
-            timeline.export_csv_header(output_file)
-        elif output_format == 'json':
-            # Initialize JSON file with opening bracket
-            with open(output_file, 'w') as f:
-                f.write('[\n')
-        
-        # Process events in batches
-        first_batch = True
-        for batch in collector.process_local_logs(
-            directory=args.directory,
-            recursive=args.recursive
-        ):
-            # Parse events in this batch
-            normalized_batch = CloudTrailParser.batch_normalize_events(batch)
-            
-            # Update timeline with this batch
-            timeline.events = normalized_batch
-            
-            # Append to output file
-            if output_format == 'csv':
-                timeline.append_csv(output_file)
-            else:  # JSON
-                timeline.append_json(output_file, first_batch)
-                first_batch = False
-        
-        # Finalize JSON file if needed
-        if output_format == 'json':
-            with open(output_file, 'a') as f:
-                f.write('\n]')
-        
-        logger.info(f"Timeline exported to {output_file}")
-    
-    elif args.operation == 's3':
-        # Create timeline object for streaming
-        timeline = AWSTimeline([])
-        
-        # Open output file
-        output_format = args.format
-        output_file = args.output_file
+    if getattr(args, 'follow', False) or args.operation == 'sqs':
+        if args.format == 'json' or args.partition_by or args.partition_keys or args.index:
+            logger.error(f"{'sqs' if args.operation == 'sqs' else '--follow'} appends to a single csv or ndjson "
+                         f"output, without partitioning or --index")
+            sys.exit(1)
+        # Collect new logs as they arrive and append them to the timeline until interrupted. Acknowledged
+        # queue messages are gone, so output of earlier runs is always kept when consuming a queue
+        append = args.operation == 'sqs' or bool(args.state_file) and os.path.exists(args.state_file)
+        write_timeline_stream(follow_batches(collector, args, source), args, follow=True, append=append)
         
-        # Initialize the file with headers if CSV
-        if output_format == 'csv':
-            timeline.export_csv_header(output_file)
-        elif output_format == 'json':
-            # Initialize JSON file with opening bracket
-            with open(output_file, 'w') as f:
-                f.write('[\n')
+    elif args.operation in ('local', 's3'):
+        # Collect CloudTrail logs in batches and stream them to the timeline
+        write_timeline_stream(collect_batches(collector, args, source), args)
         
-        # Process events in batches
-        first_batch = True
-        for batch in collector.collect_from_s3(
-            bucket_name=args.bucket,
-            prefix=args.prefix,
-            start_date=args.start_date,
-            end_date=args.end_date,
-            output_dir=args.output_dir,
-            regions=args.regions
-        ):
-            # Parse events in this batch
-            normalized_batch = CloudTrailParser.batch_normalize_events(batch)
-            
-            # Update timeline with this batch
-            timeline.events = normalized_batch
-            
-            # Append to output file
-            if output_format == 'csv':
-                timeline.append_csv(output_file)
-            else:  # JSON
-                timeline.append_json(output_file, first_batch)
-                first_batch = False
+    elif args.operation == 'summarize':
+        summarize_stream(collect_batches(collector, args, source), args)
         
-        # Finalize JSON file if needed
-        if output_format == 'json':
-            with open(output_file, 'a') as f:
-                f.write('\n]')
+    elif args.operation == 'index':
+        build_evidence_index(collector, args, source)
         
-        logger.info(f"Timeline exported to {output_file}")
+    elif args.operation == 'validate':
+        if source == 'local':
+            report = collector.validate_local_logs(args.directory, hash_workers=args.hash_workers)
+        else:
+            report = collector.validate_s3_logs(
+                bucket_name=args.bucket,
+                prefix=args.prefix,
+                start_date=args.start_date,
+                end_date=args.end_date,
+                regions=args.regions,
+                accounts=args.accounts,
+                all_accounts=args.all_accounts,
+                max_workers=args.max_workers,
+                hash_workers=args.hash_workers,
+                logs_dir=args.logs_dir,
+                max_attempts=args.max_attempts
+            )
+        report.log_summary()
+        if args.report_file:
+            report.export_json(args.report_file)
+        if not report.ok:
+            sys.exit(1)
             
     elif args.operation == 'management':
-        # Calculate start and end times
-        end_time = datetime.now()
-        start_time = end_time - timedelta(days=args.days)
-        
-        # Collect management events
-        events = collector.collect_management_events(
-            start_time=start_time,
-            end_time=end_time
-        )
+        events = collect_management_events(collector, args)
         
         # Parse events
         normalized_events = CloudTrailParser.batch_normalize_events(events)
         
+        # Run the processing stages over the events
+        stages = build_processing_stages(args)
+        for stage in stages:
+            normalized_events = stage.process(normalized_events)
+        for stage in stages:
+            stage.close()
+        fields = timeline_fields(stages)
+        
         # Create timeline
         timeline = AWSTimeline(normalized_events)
         
         # Export timeline
-        if args.format == 'csv':
-            timeline.export_csv(args.output_file)
+        if args.partition_by or args.partition_keys:
+            timeline.sort_events()
+            with open_timeline_writer(args.output_file, args.format, compression=args.compress,
+                                      max_file_size=args.max_file_size, partition_by=args.partition_by,
+                                      partition_keys=args.partition_keys, index=args.index,
+                                      fields=fields) as writer:
+                writer.write(timeline.events)
+            logger.info(f"Timeline exported to {len(writer.files)} files in {args.output_file}")
+        elif (args.export_workers > 1 or args.split_output) and not (args.format == 'ndjson' and args.max_file_size):
+            timeline.export_parallel(args.output_file, args.format, workers=args.export_workers,
+                                     split=args.split_output, compression=args.compress, fields=fields,
+                                     index=args.index)
+        elif args.format == 'csv':
+            timeline.export_csv(args.output_file, fields=fields, index=args.index)
+        elif args.format == 'ndjson':
+            timeline.export_ndjson(args.output_file, compression=args.compress, max_file_size=args.max_file_size,
+                                   index=args.index)
         else:
-            timeline.export_json(args.output_file)
+            timeline.export_json(args.output_file, index=args.index)
             
     elif args.operation == 'discover':
         # Discover CloudTrail trails
@@ -275,6 +481,11 @@ def handle_aws_commands(args):
             for prefix in structure['top_level_prefixes']:
                 logger.info(f"  - {prefix}")
                 
+            if structure.get('accounts'):
+                logger.info(f"\nAccounts with CloudTrail logs ({len(structure['accounts'])}):")
+                for account_id, account in sorted(structure['accounts'].items()):
+                    logger.info(f"  - {account_id}: {', '.join(account['regions']) or 'no regions found'}")
+                    
             if structure['cloudtrail_paths']:
                 logger.info("\nPotential CloudTrail paths:")
                 for path in structure['cloudtrail_paths']:
@@ -317,6 +528,342 @@ def handle_aws_commands(args):
         else:
             logger.error("Failed to retrieve credential report")
 
+def collect_management_events(collector, args):
+    """
+    Collect the management events of the last --days days.
+    
+    Args:
+        collector (AWSLogCollector): Collector to use.
+        args (argparse.Namespace): Parsed arguments with the management options.
+        
+    Returns:
+        list: Raw CloudTrail events.
+    """
+    # Calculate start and end times
+    end_time = datetime.now()
+    start_time = end_time - timedelta(days=args.days)
+    
+    return collector.collect_management_events(
+        start_time=start_time,
+        end_time=end_time
+    )
+
+def collect_batches(collector, args, source):
+    """
+    Collect batches of raw CloudTrail events from a log source.
+    
+    Args:
+        collector (AWSLogCollector): Collector to use.
+        args (argparse.Namespace): Parsed arguments with the options of the source.
+        source (str): 'local', 's3' or 'management'.
+        
+    Returns:
+        iterable: Batches of raw CloudTrail events.
+    """
+    # Skip files the evidence index rules out for the search
+    file_filter = None
+    if args.evidence_index and source in ('local', 's3'):
+        search = EvidenceSearch(
+            principals=args.principals,
+            access_key_ids=args.access_key_ids,
+            source_ips=args.source_ips,
+            event_names=args.event_names if source == 's3' else None,
+            event_sources=args.event_sources if source == 's3' else None
+        )
+        if search.has_indicators() or search.event_names or search.event_sources:
+            file_filter = EvidenceIndex(args.evidence_index).file_filter(search)
+        else:
+            logger.warning("--evidence-index has no effect without indicators to search for")
+    
+    if source == 'local':
+        # Process local CloudTrail logs in batches
+        return collector.process_local_logs(
+            directory=args.directory,
+            recursive=args.recursive,
+            batch_size=args.batch_size,
+            memory_budget=args.memory_budget,
+            file_filter=file_filter,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            regions=args.regions,
+            discovery_workers=args.discovery_workers
+        )
+        
+    if source == 's3':
+        # Collect CloudTrail logs from S3 in batches
+        return collector.collect_from_s3(
+            bucket_name=args.bucket,
+            prefix=args.prefix,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            output_dir=args.output_dir,
+            regions=args.regions,
+            batch_size=args.batch_size,
+            memory_budget=args.memory_budget,
+            accounts=args.accounts,
+            all_accounts=args.all_accounts,
+            max_workers=args.max_workers,
+            event_names=args.event_names,
+            event_sources=args.event_sources,
+            use_s3_select=args.s3_select,
+            parse_workers=args.parse_workers,
+            max_attempts=args.max_attempts,
+            failed_keys_file=args.failed_keys_file,
+            file_filter=file_filter
+        )
+        
+    # Management events are looked up in one go
+    return [collect_management_events(collector, args)]
+
+def follow_batches(collector, args, source):
+    """
+    Follow a log source, collecting batches of raw CloudTrail events as they are delivered.
+    
+    Args:
+        collector (AWSLogCollector): Collector to use.
+        args (argparse.Namespace): Parsed arguments with the options of the source and of following.
+        source (str): 's3', 'management' or 'sqs'.
+        
+    Returns:
+        generator: Batches of raw CloudTrail events, until interrupted.
+    """
+    if source == 'sqs':
+        return collector.consume_sqs(
+            queue_url=args.queue_url,
+            batch_size=args.batch_size,
+            memory_budget=args.memory_budget,
+            max_workers=args.max_workers,
+            output_dir=args.output_dir,
+            event_names=args.event_names,
+            event_sources=args.event_sources,
+            max_attempts=args.max_attempts,
+            wait_time=args.wait_time,
+            visibility_timeout=args.visibility_timeout,
+            endpoint_url=args.endpoint_url,
+            stop_when_empty=args.stop_when_empty
+        )
+        
+    if source == 's3':
+        return collector.follow_s3(
+            bucket_name=args.bucket,
+            prefix=args.prefix,
+            regions=args.regions,
+            accounts=args.accounts,
+            all_accounts=args.all_accounts,
+            start_date=args.start_date,
+            state_file=args.state_file,
+            output_dir=args.output_dir,
+            batch_size=args.batch_size,
+            memory_budget=args.memory_budget,
+            max_workers=args.max_workers,
+            event_names=args.event_names,
+            event_sources=args.event_sources,
+            max_attempts=args.max_attempts,
+            poll_interval=args.poll_interval,
+            max_poll_interval=args.max_poll_interval
+        )
+        
+    # Management events are followed in the collector's region
+    return collector.follow_management_events(
+        regions=[args.region],
+        state_file=args.state_file,
+        poll_interval=args.poll_interval,
+        max_poll_interval=args.max_poll_interval
+    )
+
+def build_evidence_index(collector, args, source):
+    """
+    Index the log files of a local directory or S3 bucket.
+    
+    Files already in an existing index with the same size are not read
+    again, so rerunning the command only indexes new files. Local files are
+    keyed by their path relative to --directory and S3 objects by their key,
+    so searches must use the same directory or bucket.
+    
+    Args:
+        collector (AWSLogCollector): Collector to use.
+        args (argparse.Namespace): Parsed arguments with the options of the source and --index-file.
+        source (str): 'local' or 's3'.
+    """
+    index = EvidenceIndex(args.index_file)
+    known = len(index.files)
+    
+    if source == 'local':
+        batches = collector.process_local_logs(
+            directory=args.directory,
+            recursive=args.recursive,
+            batch_size=args.batch_size,
+            memory_budget=args.memory_budget,
+            file_filter=lambda key, size: not index.is_indexed(key, size),
+            on_file=index.add,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            regions=args.regions,
+            discovery_workers=args.discovery_workers
+        )
+    else:
+        # Records must be indexed unfiltered, so the event filters are not applied
+        batches = collector.collect_from_s3(
+            bucket_name=args.bucket,
+            prefix=args.prefix,
+            start_date=args.start_date,
+            end_date=args.end_date,
+            output_dir=args.output_dir,
+            regions=args.regions,
+            batch_size=args.batch_size,
+            memory_budget=args.memory_budget,
+            accounts=args.accounts,
+            all_accounts=args.all_accounts,
+            max_workers=args.max_workers,
+            parse_workers=args.parse_workers,
+            max_attempts=args.max_attempts,
+            failed_keys_file=args.failed_keys_file,
+            file_filter=lambda key: not index.is_indexed(key),
+            on_file=index.add
+        )
+    
+    # Files are indexed as they are parsed; the batches themselves are not needed
+    for _ in batches:
+        pass
+    
+    logger.info(f"Indexed {len(index.files) - known} new files")
+    index.save()
+
+def summarize_stream(batches, args):
+    """
+    Summarize batches of raw CloudTrail events and print the report.
+    
+    Only the summarized fields are normalized unless processing stages
+    such as deduplication need whole events, and no event is kept once
+    it has been counted.
+    
+    Args:
+        batches (iterable): Batches of raw CloudTrail events.
+        args (argparse.Namespace): Parsed arguments with the summary options.
+    """
+    stages = build_processing_stages(args)
+    summarizer = ExactEventSummarizer() if args.exact else EventSummarizer()
+    fields = ('event_time',) + SUMMARY_FIELDS
+    
+    for batch in prefetch(batches, PIPELINE_DEPTH):
+        if stages:
+            events = CloudTrailParser.batch_normalize_events(batch)
+            for stage in stages:
+                events = stage.process(events)
+            summarizer.process(events)
+        else:
+            summarizer.add_columns(CloudTrailParser.batch_normalize_columns(batch, fields))
+            
+    for stage in stages:
+        stage.close()
+    summarizer.close()
+    
+    print(summarizer.format_report(args.top))
+    if args.output_file:
+        summarizer.export_json(args.output_file, args.top)
+
+def build_processing_stages(args):
+    """
+    Create the processing stages selected on the command line.
+    
+    Each stage has a process(events) method that takes and returns a list of
+    normalized events, and a close() method called once the stream ends.
+    
+    Args:
+        args (argparse.Namespace): Parsed arguments with the processing options.
+        
+    Returns:
+        list: Processing stages in the order they should run.
+    """
+    stages = []
+    # Search first, so later stages only see matching events
+    search = EvidenceSearch(principals=args.principals, access_key_ids=args.access_key_ids,
+                            source_ips=args.source_ips)
+    if search.has_indicators():
+        stages.append(search)
+    if args.dedup:
+        stages.append(EventDeduplicator(max_keys=args.dedup_max_keys))
+    if args.geoip_db or args.aws_ip_ranges:
+        stages.append(IPEnricher(mmdb_files=args.geoip_db, aws_ip_ranges=args.aws_ip_ranges))
+    # Rules run after deduplication, so a duplicated event doesn't raise its alerts twice
+    if args.rules:
+        stages.append(RuleEngine(load_rules(args.rules), alerts_file=args.alerts_file))
+    if args.sessions_file:
+        stages.append(SessionTracker(args.sessions_file, idle_timeout=args.session_timeout * 60))
+    return stages
+
+def timeline_fields(stages):
+    """
+    Get the CSV columns for events that went through the processing stages.
+    
+    Args:
+        stages (list): Processing stages, as returned by build_processing_stages.
+        
+    Returns:
+        list or None: The standard fields followed by the fields added by IP enrichment,
+            or None if no stage adds fields.
+    """
+    extra_fields = [field for stage in stages if isinstance(stage, IPEnricher) for field in stage.fields]
+    return AWSTimeline().csv_fields + extra_fields if extra_fields else None
+
+def write_timeline_stream(batches, args, follow=False, append=False):
+    """
+    Normalize batches of raw CloudTrail events and stream them to the timeline output.
+    
+    Collection, normalization and writing each run on their own thread,
+    connected by queues of at most PIPELINE_DEPTH batches, so that a slow
+    stage holds back the others instead of letting batches pile up in memory.
+    
+    When following, each batch is written before the next one is requested,
+    since that is when the collector records its logs as processed, and the
+    stream runs until interrupted.
+    
+    Args:
+        batches (iterable): Batches of raw CloudTrail events.
+        args (argparse.Namespace): Parsed arguments with the timeline output options.
+        follow (bool, optional): Whether batches come from following a log source.
+        append (bool, optional): Append to an existing csv or ndjson output instead of replacing it.
+    """
+    stages = build_processing_stages(args)
+    
+    writer = open_timeline_writer(
+        args.output_file,
+        args.format,
+        compression=args.compress,
+        max_file_size=args.max_file_size,
+        partition_by=args.partition_by,
+        partition_keys=args.partition_keys,
+        index=args.index,
+        fields=timeline_fields(stages),
+        append=append
+    )
+    if not follow:
+        writer = ThreadedWriter(writer, max_pending=PIPELINE_DEPTH)
+        batches = prefetch(batches, PIPELINE_DEPTH)
+        
+    with writer:
+        try:
+            for batch in batches:
+                # Parse events in this batch, run them through the stages and append them to the output
+                events = CloudTrailParser.batch_normalize_events(batch)
+                for stage in stages:
+                    events = stage.process(events)
+                writer.write(events)
+        except KeyboardInterrupt:
+            if not follow:
+                raise
+            # Closing the collector saves its state up to the last batch written
+            batches.close()
+            logger.info("Stopped following")
+    
+    for stage in stages:
+        stage.close()
+    
+    if args.partition_by or args.partition_keys:
+        logger.info(f"Timeline exported to {len(writer.files)} files in {args.output_file}")
+    else:
+        logger.info(f"Timeline exported to {', '.join(writer.files)}")
+
 def configure_aws_credentials(args):
     """
     Configure AWS credentials by prompting the user for input
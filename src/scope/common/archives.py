@@ -0,0 +1,66 @@
+"""
+Streaming access to the members of tar and zip archives.
+"""
+
+import gzip
+import logging
+import tarfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Extensions of the archives whose members are read in place
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+ZIP_EXTENSIONS = ('.zip',)
+
+def is_archive(path):
+    """
+    Check whether a file is a tar or zip archive, judging by its extension.
+
+    Args:
+        path (str): Path to the file.
+
+    Returns:
+        bool: True for tar archives (optionally compressed) and zip archives.
+    """
+    return path.lower().endswith(TAR_EXTENSIONS + ZIP_EXTENSIONS)
+
+def _read_member(read, name):
+    # Members such as CloudTrail's .json.gz files are decompressed as they are read
+    data = read()
+    if name.endswith('.gz'):
+        data = gzip.decompress(data)
+    return data
+
+def iter_archive_members(path, extensions=('.json', '.gz')):
+    """
+    Iterate over the files in an archive without extracting it.
+
+    Tar archives are read as a stream, one member after the other, so the
+    archive is read sequentially exactly once. Every member must be read (or
+    skipped) before the next one is requested.
+
+    Args:
+        path (str): Path to a tar or zip archive.
+        extensions (tuple, optional): Only members whose names end with one of these are returned.
+
+    Yields:
+        tuple: (member name, member size, read) where read() returns the member's content,
+            decompressed if the member name ends in .gz.
+    """
+    if path.lower().endswith(ZIP_EXTENSIONS):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.endswith(extensions):
+                    continue
+                yield info.filename, info.file_size, \
+                    lambda info=info: _read_member(lambda: archive.read(info), info.filename)
+        return
+
+    # 'r|*' reads the tar as a non-seekable stream, with any compression detected automatically
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            if not member.isfile() or not member.name.endswith(extensions):
+                continue
+            yield member.name, member.size, \
+                lambda member=member: _read_member(lambda: archive.extractfile(member).read(), member.name)
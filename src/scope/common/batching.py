@@ -0,0 +1,109 @@
+"""
+Batching helpers for streaming log records through the processing pipeline.
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Parsed JSON held as Python dicts/strings takes several times the space of
+# the serialized text it came from. This factor turns serialized byte counts
+# into a rough in-memory estimate.
+MEMORY_OVERHEAD_FACTOR = 3
+
+
+class RecordBatcher:
+    """
+    Groups records into batches bounded either by record count or by an
+    estimated memory budget.
+
+    Records are added one source (file, S3 object, API page) at a time. A
+    source that does not fit in the current batch is split across as many
+    batches as needed, so no batch grows past its limit because of one
+    large file.
+    """
+
+    def __init__(self, batch_size=1000, memory_budget=None):
+        """
+        Initialize the batcher.
+
+        Args:
+            batch_size (int, optional): Maximum number of records per batch. Used when
+                no memory budget is given.
+            memory_budget (int, optional): Maximum estimated size of a batch in bytes.
+                When set, batches are cut by size rather than by count.
+
+        Raises:
+            ValueError: If batch_size or memory_budget is not positive
+        """
+        if batch_size is None or batch_size <= 0:
+            raise ValueError(f"batch_size must be positive, got {batch_size}")
+        if memory_budget is not None and memory_budget <= 0:
+            raise ValueError(f"memory_budget must be positive, got {memory_budget}")
+        self.batch_size = batch_size
+        self.memory_budget = memory_budget
+        self.current_batch = []
+        self.current_bytes = 0
+
+    def add(self, records, source_bytes=None):
+        """
+        Add the records of one source and yield every batch that fills up.
+
+        Args:
+            records (list): Records to add.
+            source_bytes (int, optional): Serialized size of the source the records were
+                parsed from. Used to estimate the size of each record when batching by
+                memory budget.
+
+        Returns:
+            generator: Yields full batches of records.
+        """
+        if not records:
+            return
+
+        if not self.memory_budget:
+            start = 0
+            while start < len(records):
+                room = self.batch_size - len(self.current_batch)
+                self.current_batch.extend(records[start:start + room])
+                start += room
+                if len(self.current_batch) >= self.batch_size:
+                    yield self._take()
+            return
+
+        if source_bytes is None:
+            source_bytes = sum(len(str(record)) for record in records)
+        record_bytes = max(1, (source_bytes * MEMORY_OVERHEAD_FACTOR) // len(records))
+
+        start = 0
+        while start < len(records):
+            room = (self.memory_budget - self.current_bytes) // record_bytes
+            if room <= 0:
+                if self.current_batch:
+                    yield self._take()
+                    continue
+                # A single record larger than the whole budget still has to go somewhere
+                room = 1
+            chunk = records[start:start + room]
+            self.current_batch.extend(chunk)
+            self.current_bytes += len(chunk) * record_bytes
+            start += len(chunk)
+            if self.current_bytes + record_bytes > self.memory_budget:
+                yield self._take()
+
+    def flush(self):
+        """
+        Yield the final, partially filled batch if there is one.
+
+        Returns:
+            generator: Yields the remaining batch of records.
+        """
+        if self.current_batch:
+            yield self._take()
+
+    def _take(self):
+        batch = self.current_batch
+        logger.debug(f"Yielding batch of {len(batch)} events (~{self.current_bytes} bytes)")
+        self.current_batch = []
+        self.current_bytes = 0
+        return batch
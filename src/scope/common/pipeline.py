@@ -0,0 +1,168 @@
+"""
+Helpers for running collection work concurrently with bounded memory.
+"""
+
+import queue
+import threading
+from collections import deque
+
+# Markers passed through queues alongside items
+_ITEM = object()
+_DONE = object()
+_ERROR = object()
+
+
+def bounded_map(executor, func, iterable, max_pending):
+    """
+    Apply func to each item on an executor, yielding results in input order.
+
+    Unlike Executor.map, items are only pulled from the iterable as results are
+    consumed, so at most max_pending calls are queued or running at a time and
+    a slow consumer holds back the producer instead of buffering everything.
+
+    Args:
+        executor (concurrent.futures.Executor): Executor to run func on.
+        func (callable): Function applied to each item.
+        iterable (iterable): Items to process; may be a lazy generator.
+        max_pending (int): Maximum number of submitted but unconsumed calls.
+
+    Returns:
+        generator: Yields func(item) for each item, in input order.
+    """
+    pending = deque()
+    items = iter(iterable)
+
+    try:
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Don't leave queued work behind if the consumer stops early
+        for future in pending:
+            future.cancel()
+
+
+def prefetch(iterable, max_pending):
+    """
+    Iterate over an iterable on a background thread, buffering a bounded number of items.
+
+    This lets a producer (e.g. a log collector yielding batches) run ahead of
+    its consumer by up to max_pending items, so the two overlap instead of
+    taking turns.
+
+    Args:
+        iterable (iterable): Items to produce.
+        max_pending (int): Maximum number of produced but unconsumed items.
+
+    Returns:
+        generator: Yields the items of the iterable, in order.
+    """
+    items = queue.Queue(maxsize=max_pending)
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for item in iterable:
+                while not stop.is_set():
+                    try:
+                        items.put((_ITEM, item), timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            items.put((_DONE, None))
+        except BaseException as e:
+            items.put((_ERROR, e))
+
+    producer = threading.Thread(target=produce, name='scope-prefetch', daemon=True)
+    producer.start()
+
+    try:
+        while True:
+            kind, value = items.get()
+            if kind is _DONE:
+                break
+            if kind is _ERROR:
+                raise value
+            yield value
+    finally:
+        stop.set()
+
+
+class ThreadedWriter:
+    """
+    Runs a writer's write calls on a background thread behind a bounded queue.
+
+    write() returns as soon as the batch is queued, so serialization and disk
+    I/O overlap with the work that produces the next batch. Once max_pending
+    batches are waiting, write() blocks until the writer catches up.
+    """
+
+    def __init__(self, writer, max_pending=2):
+        """
+        Initialize the threaded writer.
+
+        Args:
+            writer: Object with write(events) and close() methods, e.g. a TimelineWriter.
+            max_pending (int, optional): Maximum number of queued batches.
+        """
+        self.writer = writer
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='scope-writer', daemon=True)
+        self._thread.start()
+
+    @property
+    def files(self):
+        return self.writer.files
+
+    def write(self, events):
+        """
+        Queue a batch of events for writing.
+
+        Args:
+            events (list): Batch to write.
+
+        Raises:
+            Exception: Any error raised by an earlier write.
+        """
+        if self._error:
+            raise self._error
+        self._queue.put(events)
+
+    def close(self):
+        """
+        Wait for queued batches to be written and close the writer.
+
+        Raises:
+            Exception: Any error raised while writing.
+        """
+        self._queue.put(_DONE)
+        self._thread.join()
+        self.writer.close()
+        if self._error:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run(self):
+        while True:
+            events = self._queue.get()
+            if events is _DONE:
+                return
+            if self._error:
+                # Keep draining so producers never block on a failed writer
+                continue
+            try:
+                self.writer.write(events)
+            except Exception as e:
+                self._error = e
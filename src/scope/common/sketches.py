@@ -0,0 +1,266 @@
+"""
+Bounded-memory sketches for summarizing and indexing event streams.
+"""
+
+import base64
+import hashlib
+import heapq
+import math
+from collections import Counter
+
+def hash64(value):
+    """
+    Hash a value to a stable 64-bit integer.
+
+    Unlike the built-in hash(), the result does not change between runs, so
+    sketches built in different processes can be merged.
+
+    Args:
+        value: Value to hash; converted with str() unless it is already str or bytes.
+
+    Returns:
+        int: 64-bit hash.
+    """
+    if not isinstance(value, bytes):
+        value = str(value).encode('utf-8')
+    return int.from_bytes(hashlib.blake2b(value, digest_size=8).digest(), 'big')
+
+class SpaceSaving:
+    """
+    Space-Saving sketch of the most frequent items in a stream.
+
+    At most capacity items are tracked. When a new item arrives and the sketch
+    is full, it replaces the item with the lowest count and inherits that
+    count as its possible overcount (error). Every item whose true count
+    exceeds the stream length divided by capacity is guaranteed to be
+    tracked, and while fewer than capacity distinct items have been seen the
+    counts are exact.
+    """
+
+    def __init__(self, capacity=1000):
+        """
+        Initialize the sketch.
+
+        Args:
+            capacity (int, optional): Maximum number of tracked items.
+        """
+        self.capacity = capacity
+        self.total = 0
+        self.counts = {}
+        self.errors = {}
+        self._heap = []
+
+    def update(self, items):
+        """
+        Add a batch of items to the sketch.
+
+        Items are first counted per batch, so repeated items cost one update.
+
+        Args:
+            items (iterable): Items to count; None values are skipped.
+        """
+        batch = Counter(items)
+        batch.pop(None, None)
+        counts = self.counts
+
+        for item, count in batch.items():
+            self.total += count
+            current = counts.get(item)
+            if current is not None:
+                counts[item] = current + count
+            elif len(counts) < self.capacity:
+                counts[item] = count
+                self.errors[item] = 0
+            else:
+                # Replace the item with the lowest count, which becomes the newcomer's error bound
+                evicted, minimum = self._pop_min()
+                del counts[evicted]
+                del self.errors[evicted]
+                counts[item] = minimum + count
+                self.errors[item] = minimum
+            heapq.heappush(self._heap, (counts[item], item))
+
+        # Drop outdated heap entries once they outnumber the live ones
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, item) for item, count in counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, n=10):
+        """
+        Get the most frequent items.
+
+        Args:
+            n (int, optional): Number of items to return.
+
+        Returns:
+            list: (item, count, error) tuples, highest count first. The true count lies
+                between count - error and count.
+        """
+        ranked = heapq.nlargest(n, self.counts.items(), key=lambda entry: entry[1])
+        return [(item, count, self.errors[item]) for item, count in ranked]
+
+    def _pop_min(self):
+        while True:
+            count, item = heapq.heappop(self._heap)
+            # Heap entries go stale when an item's count grows; skip them
+            if self.counts.get(item) == count:
+                return item, count
+
+class HyperLogLog:
+    """
+    HyperLogLog estimate of the number of distinct items in a stream.
+
+    Uses 2**precision one-byte registers (16 KB at the default precision of
+    14) for a typical relative error of about 1%, however many items are
+    added.
+    """
+
+    def __init__(self, precision=14):
+        """
+        Initialize the sketch.
+
+        Args:
+            precision (int, optional): Number of hash bits selecting a register, between 4 and 18.
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, got {precision}")
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+        self._rank_bits = 64 - precision
+        self._rank_mask = (1 << self._rank_bits) - 1
+
+    def update(self, items):
+        """
+        Add a batch of items to the sketch.
+
+        Args:
+            items (iterable): Items to add; None values are skipped.
+        """
+        registers = self.registers
+        rank_bits = self._rank_bits
+        rank_mask = self._rank_mask
+
+        # Duplicates within a batch can't change the estimate, so hash each value once
+        for item in set(items):
+            if item is None:
+                continue
+            value = hash64(item)
+            index = value >> rank_bits
+            rank = rank_bits - (value & rank_mask).bit_length() + 1
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def merge(self, other):
+        """
+        Merge another sketch of the same precision into this one.
+
+        Args:
+            other (HyperLogLog): Sketch to merge.
+        """
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge HyperLogLog sketches of different precision")
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+    def count(self):
+        """
+        Estimate the number of distinct items.
+
+        Returns:
+            int: Estimated distinct count.
+        """
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+
+        # Small cardinalities are estimated more accurately from the number of empty registers
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class BloomFilter:
+    """
+    Compact set membership test with false positives but no false negatives.
+
+    Sized for an expected number of items and false positive rate. The k bit
+    positions of an item are derived from one 128-bit hash by double hashing.
+    """
+
+    def __init__(self, capacity, error_rate=0.01):
+        """
+        Initialize an empty filter.
+
+        Args:
+            capacity (int): Expected number of distinct items.
+            error_rate (float, optional): Target false positive rate at capacity.
+        """
+        capacity = max(capacity, 1)
+        bits = max(64, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.size = (bits + 7) // 8 * 8
+        self.hashes = min(16, max(1, int(round(self.size / capacity * math.log(2)))))
+        self.bits = bytearray(self.size // 8)
+
+    @classmethod
+    def from_items(cls, items, error_rate=0.01):
+        """
+        Build a filter sized for exactly the given items.
+
+        Args:
+            items (iterable): Items to add; None values are skipped.
+            error_rate (float, optional): Target false positive rate.
+
+        Returns:
+            BloomFilter: Filter containing the items.
+        """
+        items = {item for item in items if item is not None}
+        bloom = cls(len(items), error_rate)
+        for item in items:
+            bloom.add(item)
+        return bloom
+
+    def add(self, item):
+        """
+        Add an item to the filter.
+
+        Args:
+            item: Item to add; converted with str() unless it is str or bytes.
+        """
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def to_dict(self):
+        """
+        Serialize the filter for storage in JSON.
+
+        Returns:
+            dict: Number of hashes and the base64-encoded bit array.
+        """
+        return {'hashes': self.hashes, 'bits': base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Restore a filter serialized with to_dict.
+
+        Args:
+            data (dict): Serialized filter.
+
+        Returns:
+            BloomFilter: The restored filter.
+        """
+        bloom = cls.__new__(cls)
+        bloom.bits = bytearray(base64.b64decode(data['bits']))
+        bloom.size = len(bloom.bits) * 8
+        bloom.hashes = data['hashes']
+        return bloom
+
+    def _positions(self, item):
+        if not isinstance(item, bytes):
+            item = str(item).encode('utf-8')
+        digest = hashlib.blake2b(item, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.size for i in range(self.hashes)]
@@ -7,13 +7,14 @@ import os
 import sys
 from datetime import datetime
 
-def setup_logging(log_level=logging.INFO, log_file=None):
+def setup_logging(log_level=logging.INFO, log_file=None, stream=None):
     """
     Set up logging configuration.
     
     Args:
         log_level (int): Logging level (default: INFO)
         log_file (str, optional): Path to log file. If None, logs to console only.
+        stream (file, optional): Console stream to log to (default: standard output)
     """
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     
@@ -26,7 +27,7 @@ def setup_logging(log_level=logging.INFO, log_file=None):
         root_logger.removeHandler(handler)
     
     # Add console handler
-    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler = logging.StreamHandler(stream or sys.stdout)
     console_handler.setFormatter(logging.Formatter(log_format))
     root_logger.addHandler(console_handler)
     
@@ -57,4 +58,39 @@ def format_timestamp(timestamp, format_str='%Y-%m-%d %H:%M:%S'):
         except ValueError:
             return timestamp
             
-    return timestamp.strftime(format_str) 
\ No newline at end of file
+    return timestamp.strftime(format_str)
+
+def parse_size(size_str):
+    """
+    Parse a human-readable size such as '512M' or '2G' into bytes.
+    
+    Args:
+        size_str (str): Size as a plain number of bytes or with a K, M, G or T suffix
+            (optionally followed by 'B', e.g. '256MB').
+        
+    Returns:
+        int: Size in bytes
+        
+    Raises:
+        ValueError: If the size cannot be parsed
+    """
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    
+    value = str(size_str).strip().upper()
+    if value.endswith('B'):
+        value = value[:-1]
+        
+    multiplier = 1
+    if value and value[-1] in units:
+        multiplier = units[value[-1]]
+        value = value[:-1]
+        
+    try:
+        size = int(float(value) * multiplier)
+    except ValueError:
+        raise ValueError(f"Invalid size: {size_str}")
+        
+    if size <= 0:
+        raise ValueError(f"Size must be positive: {size_str}")
+        
+    return size
@@ -0,0 +1,84 @@
+"""
+Tests for reading CloudTrail logs from tar and zip archives.
+"""
+
+import gzip
+import io
+import json
+import tarfile
+import zipfile
+
+import pytest
+
+from scope.aws.collector import AWSLogCollector
+from scope.common.archives import is_archive, iter_archive_members
+
+PREFIX = 'AWSLogs/111111111111/CloudTrail/us-east-1/2024/03/01/'
+
+
+def log(event_id):
+    return json.dumps({'Records': [{'eventID': event_id, 'eventName': 'GetObject',
+                                    'eventTime': '2024-03-01T10:00:00Z', 'awsRegion': 'us-east-1'}]}).encode()
+
+
+MEMBERS = {
+    f"{PREFIX}111111111111_CloudTrail_us-east-1_20240301T1000Z_a.json.gz": gzip.compress(log('a')),
+    f"{PREFIX}111111111111_CloudTrail_us-east-1_20240301T1005Z_b.json.gz": gzip.compress(log('b')),
+    'exported/c.json': log('c'),
+    'README.txt': b'not a log',
+}
+
+
+def write_tar(path, mode):
+    with tarfile.open(str(path), mode) as archive:
+        directory = tarfile.TarInfo('AWSLogs')
+        directory.type = tarfile.DIRTYPE
+        archive.addfile(directory)
+        for name, data in MEMBERS.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+
+def write_zip(path):
+    with zipfile.ZipFile(str(path), 'w') as archive:
+        archive.writestr('AWSLogs/', b'')
+        for name, data in MEMBERS.items():
+            archive.writestr(name, data)
+
+
+@pytest.fixture(params=['evidence.tar.gz', 'evidence.tar', 'evidence.tar.xz', 'evidence.zip'])
+def archive(request, tmp_path):
+    path = tmp_path / request.param
+    if request.param.endswith('.zip'):
+        write_zip(path)
+    else:
+        write_tar(path, 'w:' + {'gz': 'gz', 'tar': '', 'xz': 'xz'}[request.param.rsplit('.', 1)[1]])
+    return path
+
+
+def test_members_are_read_and_decompressed(archive):
+    assert is_archive(str(archive))
+    members = {name: read() for name, _, read in iter_archive_members(str(archive))}
+
+    assert sorted(members) == sorted(name for name in MEMBERS if name != 'README.txt')
+    for name, data in members.items():
+        expected = MEMBERS[name]
+        assert data == (gzip.decompress(expected) if name.endswith('.gz') else expected)
+
+
+def test_archive_in_directory_and_single_archive_are_collected(archive):
+    collector = AWSLogCollector(region='us-east-1')
+    keys = []
+    for path in (archive.parent, archive):
+        events = [event for batch in collector.process_local_logs(
+            str(path), on_file=lambda key, records, size: keys.append(key)) for event in batch]
+        assert sorted(event['eventID'] for event in events) == ['a', 'b', 'c']
+    assert f"{archive.name}/exported/c.json" in keys
+
+
+def test_date_and_region_selection_applies_to_members(archive):
+    collector = AWSLogCollector(region='us-east-1')
+    events = [event for batch in collector.process_local_logs(str(archive), regions=['eu-west-1']) for event in batch]
+    # Only the member without a CloudTrail file name is read
+    assert [event['eventID'] for event in events] == ['c']
@@ -0,0 +1,106 @@
+"""
+Tests for the asynchronous collector.
+"""
+
+import asyncio
+import gzip
+import json
+import socket
+
+import boto3
+import pytest
+
+pytest.importorskip('aiobotocore')
+
+from aiobotocore.paginate import AioPaginator
+
+from scope.aws.async_collector import AsyncAWSLogCollector
+
+ACCOUNT = '111111111111'
+PREFIX = f"AWSLogs/{ACCOUNT}/CloudTrail/"
+
+
+def test_management_events_reject_zero_time_slices():
+    collector = AsyncAWSLogCollector()
+
+    async def collect():
+        return [page async for page in collector.iter_management_events(time_slices=0)]
+
+    with pytest.raises(ValueError):
+        asyncio.run(collect())
+
+
+@pytest.fixture
+def s3_endpoint(monkeypatch):
+    """S3 endpoint of a local moto server holding 4 files per region-day in two regions over two days."""
+    server_module = pytest.importorskip('moto.server')
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = server_module.ThreadedMotoServer(port=port)
+    server.start()
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    endpoint = f"http://127.0.0.1:{port}"
+    s3 = boto3.client('s3', region_name='us-east-1', endpoint_url=endpoint)
+    s3.create_bucket(Bucket='trail-bucket')
+    for region in ('us-east-1', 'eu-west-1'):
+        for day in ('01', '02'):
+            for i in range(4):
+                key = (f"{PREFIX}{region}/2024/03/{day}/"
+                       f"{ACCOUNT}_CloudTrail_{region}_202403{day}T10{i}0Z_x.json.gz")
+                records = {'Records': [{'eventID': key, 'eventName': 'GetObject', 'awsRegion': region}]}
+                s3.put_object(Bucket='trail-bucket', Key=key, Body=gzip.compress(json.dumps(records).encode()))
+    yield endpoint, s3
+    server.stop()
+
+
+def collect(endpoint, **kwargs):
+    collector = AsyncAWSLogCollector(endpoint_url=endpoint, max_concurrency=1)
+    events = []
+
+    async def run():
+        async for batch in collector.iter_s3_batches('trail-bucket', prefix=PREFIX, start_date='2024-03-01',
+                                                     end_date='2024-03-02', batch_size=2, **kwargs):
+            events.extend(batch)
+
+    try:
+        asyncio.run(run())
+        return events, None
+    except Exception as e:
+        return events, e
+
+
+def test_failed_listing_still_collects_other_listers(s3_endpoint, monkeypatch):
+    endpoint, _ = s3_endpoint
+    paginate = AioPaginator.paginate
+
+    def failing_paginate(self, **params):
+        if params.get('Prefix', '').endswith('eu-west-1/2024/03/01/'):
+            async def fail():
+                raise RuntimeError('listing failed')
+                yield
+            return fail()
+        return paginate(self, **params)
+    monkeypatch.setattr(AioPaginator, 'paginate', failing_paginate)
+
+    # With one worker the key queue holds two keys, so the other listers are blocked on it when the failure comes
+    events, error = collect(endpoint)
+
+    assert isinstance(error, RuntimeError)
+    assert len(events) == 12
+    assert not any('eu-west-1/2024/03/01/' in event['eventID'] for event in events)
+
+
+def test_failed_files_are_reported(s3_endpoint, tmp_path):
+    endpoint, s3 = s3_endpoint
+    broken = f"{PREFIX}us-east-1/2024/03/01/{ACCOUNT}_CloudTrail_us-east-1_20240301T1100Z_x.json.gz"
+    s3.put_object(Bucket='trail-bucket', Key=broken, Body=b'not gzip')
+    failed_keys_file = tmp_path / 'failed.txt'
+
+    events, error = collect(endpoint, failed_keys_file=str(failed_keys_file))
+
+    assert error is None
+    assert len(events) == 16
+    assert failed_keys_file.read_text().splitlines() == [f"s3://trail-bucket/{broken}"]
@@ -0,0 +1,52 @@
+"""
+Tests for RecordBatcher.
+"""
+
+import pytest
+
+from scope.common.batching import MEMORY_OVERHEAD_FACTOR, RecordBatcher
+
+
+def collect(batcher, sources):
+    batches = []
+    for records, source_bytes in sources:
+        batches.extend(batcher.add(records, source_bytes))
+    batches.extend(batcher.flush())
+    return batches
+
+
+def test_count_mode_splits_sources_across_batches():
+    batcher = RecordBatcher(batch_size=4)
+    batches = collect(batcher, [(list(range(3)), None), (list(range(3, 10)), None)])
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [record for batch in batches for record in batch] == list(range(10))
+
+
+def test_empty_sources_yield_nothing():
+    batcher = RecordBatcher(batch_size=2)
+    assert collect(batcher, [([], None), ([], 100)]) == []
+
+
+def test_memory_budget_bounds_estimated_batch_size():
+    # Each record is estimated at 10 * MEMORY_OVERHEAD_FACTOR bytes
+    budget = 10 * MEMORY_OVERHEAD_FACTOR * 5
+    batcher = RecordBatcher(memory_budget=budget)
+    batches = collect(batcher, [(list(range(12)), 120)])
+    assert [len(batch) for batch in batches] == [5, 5, 2]
+
+
+def test_record_larger_than_budget_gets_its_own_batch():
+    batcher = RecordBatcher(memory_budget=10)
+    batches = collect(batcher, [(['big', 'bigger'], 1000)])
+    assert batches == [['big'], ['bigger']]
+
+
+@pytest.mark.parametrize('batch_size', [0, -1, None])
+def test_non_positive_batch_size_is_rejected(batch_size):
+    with pytest.raises(ValueError):
+        RecordBatcher(batch_size=batch_size)
+
+
+def test_non_positive_memory_budget_is_rejected():
+    with pytest.raises(ValueError):
+        RecordBatcher(memory_budget=0)
@@ -0,0 +1,32 @@
+"""
+Tests for the validation of command line options.
+"""
+
+import pytest
+
+from scope import cli
+
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr('sys.argv', ['scope', 'aws'] + list(argv))
+    cli.main()
+
+
+@pytest.mark.parametrize('options', [
+    ['--format', 'csv', '--compress', 'gzip'],
+    ['--format', 'json', '--max-file-size', '1M'],
+    ['--format', 'ndjson', '--compress', 'gzip', '--output-file', '-'],
+])
+def test_ndjson_file_options_are_rejected_for_other_outputs(monkeypatch, tmp_path, options):
+    output = ['--output-file', str(tmp_path / 'timeline')] if '--output-file' not in options else []
+    with pytest.raises(SystemExit) as exc:
+        run(monkeypatch, 'local', '--directory', str(tmp_path), *output, *options)
+    assert exc.value.code == 1
+    assert not (tmp_path / 'timeline').exists()
+
+
+def test_compressed_ndjson_file_is_accepted(monkeypatch, tmp_path):
+    output = tmp_path / 'timeline.ndjson.gz'
+    run(monkeypatch, 'local', '--directory', str(tmp_path), '--output-file', str(output),
+        '--format', 'ndjson', '--compress', 'gzip')
+    assert output.exists()
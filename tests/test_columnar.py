@@ -0,0 +1,53 @@
+"""
+Tests for ColumnarTimeline.
+"""
+
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from scope.aws.columnar import ColumnarTimeline
+
+
+def event(event_id, event_name, minute):
+    return {'event_id': event_id, 'event_name': event_name, 'event_time': datetime(2024, 3, 1, 10, minute)}
+
+
+def test_filter_does_not_share_category_tables():
+    parent = ColumnarTimeline.from_events([event('a', 'GetObject', 0), event('b', 'PutObject', 1)])
+    child = parent.filter(parent.field_mask('event_name', ['GetObject']))
+    child.add_events([event('c', 'DeleteBucket', 2)])
+
+    assert 'DeleteBucket' not in parent.categories['event_name']
+    assert 'DeleteBucket' not in parent._category_codes['event_name']
+    assert [e['event_name'] for e in child.to_events()] == ['GetObject', 'DeleteBucket']
+    assert [e['event_name'] for e in parent.to_events()] == ['GetObject', 'PutObject']
+
+
+def test_exact_summary_matches_sketches_on_few_values():
+    from scope.aws.summary import EventSummarizer, ExactEventSummarizer
+
+    events = [dict(event(str(i), name, i), username=user, aws_region='us-east-1')
+              for i, (name, user) in enumerate([('GetObject', 'alice'), ('PutObject', 'bob'), ('GetObject', 'bob'),
+                                                ('GetObject', None)])]
+    approximate, exact = EventSummarizer(), ExactEventSummarizer()
+    approximate.process(events)
+    exact.process(events)
+
+    report = exact.report()
+    assert report == approximate.report()
+    assert report['events'] == 4
+    assert report['fields']['event_name']['top'] == [{'value': 'GetObject', 'count': 3, 'error': 0},
+                                                    {'value': 'PutObject', 'count': 1, 'error': 0}]
+    assert report['fields']['username']['distinct'] == 2
+    assert report['last_event_time'] == '2024-03-01T10:03:00'
+
+
+def test_sort_and_time_mask():
+    timeline = ColumnarTimeline.from_events([event('b', 'GetObject', 5), dict(event('c', 'GetObject', 0), event_time=None),
+                                             event('a', 'PutObject', 1)])
+    timeline.sort()
+    assert [e['event_id'] for e in timeline.to_events()] == ['a', 'b', 'c']
+    assert timeline.time_mask(datetime(2024, 3, 1, 10, 2)).tolist() == [False, True, False]
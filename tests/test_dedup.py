@@ -0,0 +1,51 @@
+"""
+Tests for streaming eventID deduplication.
+"""
+
+from datetime import datetime, timedelta
+
+from scope.aws.dedup import EventDeduplicator
+
+START = datetime(2024, 3, 1, 10, 0)
+
+
+def event(event_id, minutes=0):
+    return {'event_id': event_id, 'event_time': START + timedelta(minutes=minutes)}
+
+
+def test_duplicates_are_dropped_across_batches():
+    dedup = EventDeduplicator()
+    assert [e['event_id'] for e in dedup.process([event('a'), event('b'), event('a')])] == ['a', 'b']
+    assert [e['event_id'] for e in dedup.process([event('b'), event('c')])] == ['c']
+    assert dedup.duplicates == 2
+
+
+def test_events_without_id_are_kept():
+    dedup = EventDeduplicator()
+    events = [{'event_time': START}, {'event_id': None, 'event_time': START}]
+    assert dedup.process(events + events) == events + events
+
+
+def test_events_without_time_are_deduplicated():
+    dedup = EventDeduplicator()
+    assert len(dedup.process([{'event_id': 'a'}, {'event_id': 'a'}])) == 1
+
+
+def test_least_recently_used_windows_are_evicted():
+    dedup = EventDeduplicator(window_minutes=60, max_keys=2)
+    dedup.process([event('a', 0), event('b', 120)])
+    # A third window pushes the state over max_keys, and the oldest window goes first
+    dedup.process([event('c', 240)])
+    assert dedup.evicted_windows == 1
+    assert dedup.key_count == 2
+
+    # The forgotten window no longer catches its duplicate; the remembered ones still do
+    assert [e['event_id'] for e in dedup.process([event('a', 0), event('b', 120), event('c', 240)])] == ['a']
+
+
+def test_recently_used_window_is_kept():
+    dedup = EventDeduplicator(window_minutes=60, max_keys=2)
+    dedup.process([event('a', 0), event('b', 120)])
+    dedup.process([event('a', 0)])
+    dedup.process([event('c', 240)])
+    assert dedup.process([event('a', 0)]) == []
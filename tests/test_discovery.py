@@ -0,0 +1,87 @@
+"""
+Tests for discovering the CloudTrail layout of a bucket.
+"""
+
+import boto3
+import pytest
+
+from scope.aws.collector import crawl_step
+
+ACCOUNT = '111111111111'
+OTHER_ACCOUNT = '222222222222'
+
+
+def crawl(keys, max_depth=3):
+    """Run crawl_step breadth-first over the prefixes of some keys, as discover_bucket_structure does."""
+    children = {}
+    for key in keys:
+        parts = key.split('/')[:-1]
+        for depth in range(len(parts)):
+            parent = ''.join(f"{part}/" for part in parts[:depth])
+            child = f"{parent}{parts[depth]}/"
+            children.setdefault(parent, [])
+            if child not in children[parent]:
+                children[parent].append(child)
+
+    accounts = {}
+    listed = []
+    frontier = [(prefix, 1) for prefix in children.get('', [])]
+    while frontier:
+        next_frontier = []
+        for prefix, depth in frontier:
+            listed.append(prefix)
+            next_frontier.extend(crawl_step(prefix, depth, children.get(prefix, []), accounts, max_depth))
+        frontier = next_frontier
+    return accounts, listed
+
+
+def log_key(account, region, logs='AWSLogs/'):
+    return (f"{logs}{account}/CloudTrail/{region}/2024/03/01/"
+            f"{account}_CloudTrail_{region}_20240301T1000Z_a.json.gz")
+
+
+def test_single_account_layout():
+    keys = [log_key(ACCOUNT, region) for region in ('us-east-1', 'eu-west-1')]
+    keys.append(f"AWSLogs/{ACCOUNT}/CloudTrail-Digest/us-east-1/2024/03/01/digest.json.gz")
+    keys.append(f"AWSLogs/{ACCOUNT}/Config/us-east-1/2024/03/01/config.json.gz")
+    accounts, listed = crawl(keys)
+
+    assert accounts == {ACCOUNT: {'prefix': f"AWSLogs/{ACCOUNT}/CloudTrail/", 'regions': ['eu-west-1', 'us-east-1']}}
+    # Neither the other services nor the region directories are listed
+    assert listed == ['AWSLogs/', f"AWSLogs/{ACCOUNT}/", f"AWSLogs/{ACCOUNT}/CloudTrail/"]
+
+
+def test_organization_layout_below_a_trail_prefix():
+    keys = [log_key(account, 'us-east-1', logs='trails/org/AWSLogs/o-abc123def4/')
+            for account in (ACCOUNT, OTHER_ACCOUNT)]
+    keys.append('trails/readme/notes.txt')
+    accounts, _ = crawl(keys)
+
+    assert accounts == {
+        account: {'prefix': f"trails/org/AWSLogs/o-abc123def4/{account}/CloudTrail/", 'regions': ['us-east-1']}
+        for account in (ACCOUNT, OTHER_ACCOUNT)
+    }
+
+
+def test_crawl_stops_at_max_depth_outside_awslogs():
+    accounts, listed = crawl([log_key(ACCOUNT, 'us-east-1', logs='a/b/c/AWSLogs/')], max_depth=2)
+    assert not accounts
+    assert listed == ['a/', 'a/b/']
+
+
+def test_discover_bucket_structure_finds_every_account():
+    moto = pytest.importorskip('moto')
+    from scope.aws.collector import AWSLogCollector
+
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='org-trail')
+        for account in (ACCOUNT, OTHER_ACCOUNT):
+            for region in ('us-east-1', 'eu-west-1'):
+                s3.put_object(Bucket='org-trail', Key=log_key(account, region, logs='AWSLogs/o-abc123def4/'),
+                              Body=b'')
+        layout = AWSLogCollector(region='us-east-1').discover_bucket_structure('org-trail')
+
+    assert sorted(layout['accounts']) == [ACCOUNT, OTHER_ACCOUNT]
+    assert layout['accounts'][ACCOUNT]['regions'] == ['eu-west-1', 'us-east-1']
+    assert f"AWSLogs/o-abc123def4/{OTHER_ACCOUNT}/CloudTrail/us-east-1/" in layout['cloudtrail_paths']
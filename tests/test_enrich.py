@@ -0,0 +1,78 @@
+"""
+Tests for offline enrichment of source IPs.
+"""
+
+import ipaddress
+import json
+import random
+
+from scope.aws.enrich import IPEnricher, IPRangeTable
+
+
+def brute_force(ranges, address):
+    containing = [(network.prefixlen, tags) for network, tags in ranges if address in network]
+    return max(containing, key=lambda entry: entry[0])[1] if containing else None
+
+
+def test_lookup_returns_the_most_specific_range():
+    table = IPRangeTable([
+        ('10.0.0.0/8', {'name': 'a'}),
+        ('10.1.0.0/16', {'name': 'b'}),
+        ('10.1.2.0/24', {'name': 'c'}),
+        ('10.1.2.128/25', {'name': 'd'}),
+        ('10.200.0.0/16', {'name': 'e'}),
+        ('2001:db8::/32', {'name': 'f'}),
+        ('2001:db8:1::/48', {'name': 'g'}),
+    ])
+
+    def name(address):
+        tags = table.lookup(ipaddress.ip_address(address))
+        return tags and tags['name']
+
+    assert [name(address) for address in (
+        '10.0.0.1', '10.1.0.1', '10.1.2.1', '10.1.2.200', '10.1.3.0', '10.199.255.255', '10.200.0.0',
+        '10.255.255.255', '11.0.0.0', '9.255.255.255', '2001:db8::1', '2001:db8:1::1', '2001:db9::',
+    )] == ['a', 'b', 'c', 'd', 'b', 'a', 'e', 'a', None, None, 'f', 'g', None]
+
+
+def test_lookup_matches_brute_force_on_random_nested_ranges():
+    rng = random.Random(11)
+    ranges = []
+    for i in range(300):
+        prefix = rng.randrange(8, 29)
+        address = ipaddress.ip_address(rng.choice([10, 172, 192]) << 24 | rng.getrandbits(24))
+        ranges.append((ipaddress.ip_network(f"{address}/{prefix}", strict=False), {'name': str(i)}))
+    # Identical ranges are merged, so keep the first tags of each for the reference
+    unique = {}
+    for network, tags in ranges:
+        unique.setdefault(network, tags)
+    table = IPRangeTable((str(network), tags) for network, tags in unique.items())
+
+    for _ in range(2000):
+        network = rng.choice(list(unique))
+        address = network.network_address + rng.randrange(network.num_addresses)
+        assert table.lookup(address) == brute_force(unique.items(), address)
+        outside = ipaddress.ip_address(rng.getrandbits(32))
+        assert table.lookup(outside) == brute_force(unique.items(), outside)
+
+
+def test_tags_of_identical_ranges_are_merged():
+    table = IPRangeTable([('52.94.0.0/22', {'service': 'AMAZON', 'region': 'us-east-1'}),
+                          ('52.94.0.0/22', {'service': 'EC2', 'region': 'us-east-1'})])
+    assert table.size == 1
+    assert table.lookup(ipaddress.ip_address('52.94.1.1')) == {'service': 'AMAZON,EC2', 'region': 'us-east-1'}
+
+
+def test_enricher_tags_events_with_aws_ranges(tmp_path):
+    path = tmp_path / 'ip-ranges.json'
+    path.write_text(json.dumps({
+        'prefixes': [{'ip_prefix': '52.94.0.0/16', 'region': 'us-east-1', 'service': 'AMAZON'},
+                     {'ip_prefix': '52.94.8.0/24', 'region': 'us-east-1', 'service': 'S3'}],
+        'ipv6_prefixes': [{'ipv6_prefix': '2600:1f18::/33', 'region': 'us-east-1', 'service': 'EC2'}],
+    }))
+    enricher = IPEnricher(aws_ip_ranges=str(path))
+    events = enricher.process([{'source_ip': '52.94.8.10'}, {'source_ip': '2600:1f18::1'},
+                               {'source_ip': '198.51.100.1'}, {'source_ip': 'AWS Internal'}])
+
+    assert [(event['source_aws_service'], event['source_aws_region']) for event in events] == [
+        ('S3', 'us-east-1'), ('EC2', 'us-east-1'), (None, None), (None, None)]
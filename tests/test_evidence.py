@@ -0,0 +1,66 @@
+"""
+Tests for skipping log files with the evidence index.
+"""
+
+import random
+
+from scope.aws.evidence import EvidenceIndex, EvidenceSearch
+
+
+def random_files(count=200, records=40, seed=3):
+    rng = random.Random(seed)
+    files = {}
+    for i in range(count):
+        files[f"logs/file-{i}.json.gz"] = [{
+            'eventTime': f"2024-03-01T10:{rng.randrange(60):02d}:00Z",
+            'eventSource': rng.choice(['s3.amazonaws.com', 'iam.amazonaws.com', 'sts.amazonaws.com']),
+            'eventName': rng.choice(['GetObject', 'CreateUser', 'AssumeRole', 'ListBuckets']),
+            'sourceIPAddress': f"198.51.{rng.randrange(8)}.{rng.randrange(256)}",
+            'userIdentity': {'type': 'IAMUser', 'userName': f"user-{rng.randrange(2000)}",
+                             'accessKeyId': f"AKIA{rng.randrange(5000):016d}"},
+        } for _ in range(records)]
+    return files
+
+
+def searches(files, seed=5):
+    rng = random.Random(seed)
+    records = [record for file_records in files.values() for record in file_records]
+    for _ in range(30):
+        record = rng.choice(records)
+        yield EvidenceSearch(source_ips=[record['sourceIPAddress'], '203.0.113.9'])
+        yield EvidenceSearch(principals=[record['userIdentity']['userName']], event_names=['CreateUser'])
+        yield EvidenceSearch(access_key_ids=[record['userIdentity']['accessKeyId']],
+                             event_sources=['sts.amazonaws.com'])
+
+
+def test_index_never_skips_a_matching_file_and_skips_most_others(tmp_path):
+    files = random_files()
+    index = EvidenceIndex()
+    for key, records in files.items():
+        index.add(key, records, size=len(records))
+    path = index.save(str(tmp_path / 'index.json.gz'))
+    index = EvidenceIndex(path)
+
+    skipped = candidates = 0
+    for search in searches(files):
+        may_match = index.file_filter(search)
+        for key, records in files.items():
+            if any(search.matches(record) for record in records):
+                assert may_match(key, len(records))
+            else:
+                candidates += 1
+                skipped += not may_match(key, len(records))
+    assert skipped > 0.9 * candidates
+
+
+def test_unindexed_and_changed_files_are_always_read():
+    index = EvidenceIndex()
+    index.add('a.json.gz', [{'eventName': 'GetObject', 'sourceIPAddress': '198.51.100.1'}], size=100)
+    may_match = index.file_filter(EvidenceSearch(source_ips=['203.0.113.9']))
+
+    assert not may_match('a.json.gz', 100)
+    assert may_match('a.json.gz', 101)
+    assert may_match('b.json.gz', 100)
+    # Without indicators, only the event name and source filters can rule a file out
+    assert index.file_filter(EvidenceSearch(event_names=['GetObject']))('a.json.gz')
+    assert not index.file_filter(EvidenceSearch(event_names=['PutObject']))('a.json.gz')
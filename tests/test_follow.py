@@ -0,0 +1,114 @@
+"""
+Tests for following CloudTrail logs as they are delivered.
+"""
+
+import gzip
+import json
+from datetime import timedelta
+
+import boto3
+import pytest
+
+from scope.aws.follow import FollowState, utc_now
+
+ACCOUNT = '111111111111'
+
+
+def test_state_round_trip(tmp_path):
+    path = str(tmp_path / 'state.json')
+    state = FollowState(path)
+    now = utc_now().replace(microsecond=0)
+    state.add('stream', 'a', now - timedelta(minutes=5))
+    state.add('stream', 'b', now)
+    state.save()
+
+    resumed = FollowState(path)
+    assert resumed.position('stream') == now
+    assert resumed.seen('stream', 'a') and resumed.seen('stream', 'b')
+
+    resumed.prune('stream', now - timedelta(minutes=1))
+    assert not resumed.seen('stream', 'a') and resumed.seen('stream', 'b')
+
+
+def test_failures_are_counted_until_the_item_is_processed():
+    state = FollowState()
+    now = utc_now()
+    assert state.fail('stream', 'a', now) == 1
+    assert state.fail('stream', 'a', now) == 2
+    state.add('stream', 'a', now)
+    assert state.fail('stream', 'a', now) == 1
+
+
+def test_pruning_a_failed_item_gives_up_on_it():
+    state = FollowState()
+    now = utc_now().replace(microsecond=0)
+    state.fail('stream', 'a', now - timedelta(minutes=10))
+    state.fail('stream', 'b', now)
+    assert state.oldest_failure('stream') == now - timedelta(minutes=10)
+
+    assert state.prune('stream', now - timedelta(minutes=1)) == ['a']
+    assert state.oldest_failure('stream') == now
+
+
+def put_log(s3, file_time, suffix, body):
+    key = (f"AWSLogs/{ACCOUNT}/CloudTrail/us-east-1/{file_time:%Y/%m/%d}/"
+           f"{ACCOUNT}_CloudTrail_us-east-1_{file_time:%Y%m%dT%H%MZ}_{suffix}.json.gz")
+    s3.put_object(Bucket='trail-bucket', Key=key, Body=body)
+    return key
+
+
+def test_file_that_keeps_failing_is_skipped(tmp_path):
+    moto = pytest.importorskip('moto')
+    from scope.aws.collector import AWSLogCollector
+
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='trail-bucket')
+        now = utc_now()
+        records = {'Records': [{'eventID': '1', 'eventName': 'GetObject', 'eventTime': f"{now:%Y-%m-%dT%H:%M:%SZ}"}]}
+        put_log(s3, now - timedelta(minutes=2), 'good', gzip.compress(json.dumps(records).encode()))
+        broken = put_log(s3, now - timedelta(minutes=1), 'broken', gzip.compress(b'not json'))
+
+        path = str(tmp_path / 'state.json')
+        collector = AWSLogCollector(region='us-east-1')
+        batches = collector.follow_s3('trail-bucket', prefix=f"AWSLogs/{ACCOUNT}/CloudTrail/", regions=['us-east-1'],
+                                      state_file=path, poll_interval=0, max_poll_interval=0, max_polls=3,
+                                      max_failures=2)
+        events = [event for batch in batches for event in batch]
+
+    assert [event['eventID'] for event in events] == ['1']
+    assert FollowState(path).seen(f"s3://trail-bucket/AWSLogs/{ACCOUNT}/CloudTrail/us-east-1/", broken)
+
+
+def test_failed_file_older_than_the_lookback_is_retried(tmp_path, monkeypatch):
+    moto = pytest.importorskip('moto')
+    from scope.aws.collector import AWSLogCollector
+
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='trail-bucket')
+        now = utc_now()
+        for suffix, minutes in (('late', 10), ('new', 1)):
+            records = {'Records': [{'eventID': suffix, 'eventName': 'GetObject',
+                                    'eventTime': f"{now:%Y-%m-%dT%H:%M:%SZ}"}]}
+            put_log(s3, now - timedelta(minutes=minutes), suffix, gzip.compress(json.dumps(records).encode()))
+
+        # The older file fails once; by the next poll it is before the lookback window of the position
+        download = AWSLogCollector._download_s3_object
+        failures = []
+
+        def flaky_download(self, s3_client, bucket, key, policy):
+            if 'late' in key and not failures:
+                failures.append(key)
+                return None
+            return download(self, s3_client, bucket, key, policy)
+
+        monkeypatch.setattr(AWSLogCollector, '_download_s3_object', flaky_download)
+        collector = AWSLogCollector(region='us-east-1')
+        batches = collector.follow_s3('trail-bucket', prefix=f"AWSLogs/{ACCOUNT}/CloudTrail/", regions=['us-east-1'],
+                                      start_date=f"{now - timedelta(days=1):%Y-%m-%d}", lookback=60,
+                                      poll_interval=0, max_poll_interval=0, max_polls=2)
+        events = [event for batch in batches for event in batch]
+
+    assert failures
+    assert sorted(event['eventID'] for event in events) == ['late', 'new']
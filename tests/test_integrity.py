@@ -0,0 +1,180 @@
+"""
+Tests for CloudTrail digest validation.
+"""
+
+import gzip
+import hashlib
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+from scope.aws.integrity import DigestValidator, hash_log_object
+
+LOG = b'{"Records": []}'
+LOG_HASH = hashlib.sha256(LOG).hexdigest()
+
+
+def digest(key, log_files, previous=None, end_time='2024-03-01T01:00:00Z'):
+    content = {'digestS3Object': key, 'digestEndTime': end_time, 'logFiles': [
+        {'s3Bucket': bucket, 's3Object': log_key, 'hashValue': hash_value}
+        for bucket, log_key, hash_value in log_files]}
+    if previous:
+        content['previousDigestS3Object'] = previous[0]
+        content['previousDigestHashValue'] = previous[1]
+    return json.dumps(content).encode()
+
+
+def digest_key(hour):
+    return (f"AWSLogs/111111111111/CloudTrail-Digest/us-east-1/2024/03/01/"
+            f"111111111111_CloudTrail-Digest_us-east-1_trail_us-east-1_20240301T{hour:02d}0000Z.json.gz")
+
+
+def test_hash_log_object_hashes_uncompressed_content(tmp_path):
+    compressed = tmp_path / 'log.json.gz'
+    compressed.write_bytes(gzip.compress(LOG))
+    plain = tmp_path / 'log.json'
+    plain.write_bytes(LOG)
+
+    assert hash_log_object(('a', str(compressed), None)) == ('a', LOG_HASH)
+    assert hash_log_object(('b', str(plain), None)) == ('b', LOG_HASH)
+    assert hash_log_object(('c', None, gzip.compress(LOG))) == ('c', LOG_HASH)
+
+
+def test_hash_log_object_reports_missing_and_unreadable_files(tmp_path):
+    corrupt = tmp_path / 'log.json.gz'
+    corrupt.write_bytes(b'\x1f\x8b not gzip')
+
+    assert hash_log_object(('a', None, None)) == ('a', None)
+    assert hash_log_object(('b', str(corrupt), None)) == ('b', '')
+
+
+def test_chain_detects_modified_digest():
+    validator = DigestValidator()
+    first = digest(digest_key(1), [])
+    validator.add_digest(digest_key(1), gzip.compress(first))
+    validator.add_digest(digest_key(2), digest(digest_key(2), [], previous=(digest_key(1), 'tampered'),
+                                               end_time='2024-03-01T02:00:00Z'))
+    validator.check_chain()
+    assert validator.report.broken_links == [digest_key(1)]
+
+    validator = DigestValidator()
+    validator.add_digest(digest_key(1), first)
+    validator.add_digest(digest_key(2), digest(digest_key(2), [], previous=(digest_key(1), hashlib.sha256(first).hexdigest()),
+                                               end_time='2024-03-01T02:00:00Z'))
+    validator.check_chain()
+    assert validator.report.ok
+
+
+def test_chain_reports_gap_but_not_link_before_range():
+    validator = DigestValidator()
+    validator.add_digest(digest_key(2), digest(digest_key(2), [], previous=(digest_key(1), 'x'),
+                                               end_time='2024-03-01T02:00:00Z'))
+    validator.add_digest(digest_key(4), digest(digest_key(4), [], previous=(digest_key(3), 'x'),
+                                               end_time='2024-03-01T04:00:00Z'))
+    validator.check_chain()
+    assert validator.report.missing_digests == [digest_key(3)]
+
+
+def test_log_hashes_are_matched_per_bucket():
+    validator = DigestValidator()
+    validator.add_digest(digest_key(1), digest(digest_key(1), [('bucket-a', 'log.json.gz', LOG_HASH),
+                                                               ('bucket-b', 'log.json.gz', 'other')]))
+    expected = validator.expected_hashes()
+    assert len(expected) == 2
+
+    validator.check_log_hashes(expected, [(('bucket-a', 'log.json.gz'), LOG_HASH),
+                                          (('bucket-b', 'log.json.gz'), 'other')])
+    assert validator.report.verified == 2
+    assert validator.report.ok
+
+
+def test_log_hash_outcomes_are_reported_separately():
+    validator = DigestValidator()
+    validator.add_digest(digest_key(1), digest(digest_key(1), [('bkt', key, LOG_HASH) for key in 'abcd']))
+    expected = validator.expected_hashes()
+    validator.check_log_hashes(expected, [(('bkt', 'a'), LOG_HASH), (('bkt', 'b'), None),
+                                          (('bkt', 'c'), ''), (('bkt', 'd'), 'changed')])
+
+    report = validator.report
+    assert (report.verified, report.missing, report.unreadable, report.modified) == (1, ['b'], ['c'], ['d'])
+    assert not report.ok
+    assert report.to_dict()['unreadable'] == ['c']
+
+
+LOG_KEYS = [f"AWSLogs/111111111111/CloudTrail/us-east-1/2024/03/01/"
+            f"111111111111_CloudTrail_us-east-1_20240301T0{i}00Z_x.json.gz" for i in range(3)]
+
+
+def fail_s3_calls(monkeypatch, operation, should_fail):
+    """Make an S3 operation of every client created from now on fail with AccessDenied."""
+    original_client = boto3.session.Session.client
+
+    def client(self, *args, **kwargs):
+        s3_client = original_client(self, *args, **kwargs)
+        call = getattr(s3_client, operation)
+
+        def failing_call(**params):
+            if should_fail(params):
+                raise ClientError({'Error': {'Code': 'AccessDenied'}}, operation)
+            return call(**params)
+        setattr(s3_client, operation, failing_call)
+        return s3_client
+    monkeypatch.setattr(boto3.session.Session, 'client', client)
+
+
+@pytest.fixture
+def trail_bucket():
+    """Bucket with one digest naming three log files, the last of which was never delivered."""
+    moto = pytest.importorskip('moto')
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='trail-bucket')
+        for key in LOG_KEYS[:2]:
+            s3.put_object(Bucket='trail-bucket', Key=key, Body=gzip.compress(LOG))
+        s3.put_object(Bucket='trail-bucket', Key=digest_key(1), Body=gzip.compress(
+            digest(digest_key(1), [('trail-bucket', key, LOG_HASH) for key in LOG_KEYS])))
+        yield s3
+
+
+def validate(**kwargs):
+    from scope.aws.collector import AWSLogCollector
+    return AWSLogCollector(region='us-east-1').validate_s3_logs(
+        'trail-bucket', prefix='AWSLogs/111111111111/CloudTrail/', start_date='2024-03-01', end_date='2024-03-01',
+        regions=['us-east-1'], max_workers=2, hash_workers=1, **kwargs)
+
+
+def test_s3_validation_separates_missing_from_failed_downloads(trail_bucket, monkeypatch):
+    # The second log file exists but can't be downloaded
+    fail_s3_calls(monkeypatch, 'get_object', lambda params: params['Key'] == LOG_KEYS[1])
+    report = validate()
+
+    assert report.verified == 1
+    assert report.unreadable == [LOG_KEYS[1]]
+    assert report.missing == [LOG_KEYS[2]]
+    assert not report.modified
+
+
+def test_s3_validation_fails_when_digests_cannot_be_listed(trail_bucket, monkeypatch):
+    fail_s3_calls(monkeypatch, 'list_objects_v2', lambda params: 'CloudTrail-Digest/' in params.get('Prefix', ''))
+    report = validate()
+
+    assert report.unlisted_prefixes == ['AWSLogs/111111111111/CloudTrail-Digest/us-east-1/2024/03/01/']
+    assert report.digests == 0
+    assert not report.ok
+
+
+def test_s3_validation_verifies_logs_saved_by_collection(trail_bucket, tmp_path):
+    from scope.aws.collector import AWSLogCollector
+    collected = AWSLogCollector(region='us-east-1').collect_from_s3(
+        'trail-bucket', prefix='AWSLogs/111111111111/CloudTrail/', start_date='2024-03-01', end_date='2024-03-01',
+        regions=['us-east-1'], output_dir=str(tmp_path))
+    list(collected)
+    # Make the bucket copy unreadable, so only the saved copies can be verified
+    for key in LOG_KEYS[:2]:
+        trail_bucket.put_object(Bucket='trail-bucket', Key=key, Body=b'unreadable')
+
+    report = validate(logs_dir=str(tmp_path))
+    assert report.verified == 2
+    assert not report.modified
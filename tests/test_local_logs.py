@@ -0,0 +1,20 @@
+"""
+Tests for processing CloudTrail logs from a local directory.
+"""
+
+import gzip
+import json
+
+from scope.aws.collector import AWSLogCollector
+
+
+def test_region_is_taken_from_file_name_when_records_lack_it(tmp_path):
+    records = [{'eventID': '1', 'eventName': 'GetObject', 'eventTime': '2024-03-01T10:00:00Z'}]
+    for region in ('me-south-1', 'il-central-1'):
+        path = tmp_path / f"111111111111_CloudTrail_{region}_20240301T1000Z_abc.json.gz"
+        path.write_bytes(gzip.compress(json.dumps({'Records': records}).encode()))
+
+    collector = AWSLogCollector(region='us-east-1')
+    events = [event for batch in collector.process_local_logs(str(tmp_path)) for event in batch]
+
+    assert sorted(event['awsRegion'] for event in events) == ['il-central-1', 'me-south-1']
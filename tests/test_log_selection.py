@@ -0,0 +1,81 @@
+"""
+Tests for selecting local CloudTrail logs by delivery date and region.
+"""
+
+import gzip
+import json
+import os
+from datetime import date
+
+import pytest
+
+from scope.aws.collector import AWSLogCollector, log_dir_in_range
+
+ACCOUNT = '111111111111'
+DAYS = [date(2023, 12, 31), date(2024, 2, 28), date(2024, 2, 29), date(2024, 3, 1), date(2024, 3, 2)]
+REGIONS = ['us-east-1', 'eu-west-1']
+
+
+def log_name(region, day):
+    return f"{ACCOUNT}_CloudTrail_{region}_{day:%Y%m%d}T1000Z_x.json.gz"
+
+
+def write_log(path, event_id):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(gzip.compress(json.dumps({'Records': [{'eventID': event_id, 'eventName': 'GetObject'}]}).encode()))
+
+
+@pytest.fixture
+def logs(tmp_path):
+    for region in REGIONS:
+        for day in DAYS:
+            event_id = f"{region}/{day}"
+            write_log(tmp_path / 'AWSLogs' / ACCOUNT / 'CloudTrail' / region / f"{day:%Y/%m/%d}" /
+                      log_name(region, day), event_id)
+            # The same logs copied flat, where only their file names tell them apart
+            write_log(tmp_path / 'flat' / log_name(region, day), f"flat:{event_id}")
+    write_log(tmp_path / 'flat' / 'exported.json.gz', 'unnamed')
+    return tmp_path
+
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_files_and_directories_outside_the_selection_are_skipped(logs, monkeypatch, workers):
+    listed = []
+    scandir = os.scandir
+
+    def recording_scandir(path):
+        listed.append(os.path.relpath(path, str(logs)).split(os.sep))
+        return scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', recording_scandir)
+    collector = AWSLogCollector(region='us-east-1')
+    batches = collector.process_local_logs(str(logs), recursive=True, start_date='2024-02-29', end_date='2024-03-01',
+                                           regions=['us-east-1'], discovery_workers=workers)
+    events = sorted(event['eventID'] for batch in batches for event in batch)
+
+    assert events == ['flat:us-east-1/2024-02-29', 'flat:us-east-1/2024-03-01', 'unnamed',
+                      'us-east-1/2024-02-29', 'us-east-1/2024-03-01']
+    assert not any('eu-west-1' in parts or '2023' in parts for parts in listed)
+    assert ['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2024', '02'] in listed
+    assert ['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2024', '02', '28'] not in listed
+    assert ['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2024', '03', '02'] not in listed
+
+
+def test_without_selection_every_log_is_read(logs):
+    collector = AWSLogCollector(region='us-east-1')
+    events = [event for batch in collector.process_local_logs(str(logs), recursive=True) for event in batch]
+    assert len(events) == 2 * len(REGIONS) * len(DAYS) + 1
+
+
+@pytest.mark.parametrize('parts, expected', [
+    (['AWSLogs', ACCOUNT, 'CloudTrail'], True),
+    (['AWSLogs', ACCOUNT, 'CloudTrail', 'eu-west-1'], False),
+    (['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1'], True),
+    (['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2023'], False),
+    (['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2024', '02'], True),
+    (['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2024', '01'], False),
+    (['AWSLogs', ACCOUNT, 'CloudTrail', 'us-east-1', '2024', '03', '02'], False),
+    (['backups', '2023'], True),
+])
+def test_log_dir_in_range(parts, expected):
+    assert log_dir_in_range(parts, date(2024, 2, 29), date(2024, 3, 1), {'us-east-1'}) is expected
@@ -0,0 +1,40 @@
+"""
+Tests for parsing S3 object-created notifications.
+"""
+
+import json
+
+import pytest
+
+from scope.aws.notifications import parse_s3_notification
+
+
+def s3_event(key, event_name='ObjectCreated:Put', bucket='trail-bucket'):
+    return {'Records': [{'eventName': event_name, 's3': {'bucket': {'name': bucket}, 'object': {'key': key}}}]}
+
+
+def test_direct_notification_keys_are_url_decoded():
+    body = json.dumps(s3_event('AWSLogs/111111111111/CloudTrail/my+logs/a%3Ab.json.gz'))
+    assert parse_s3_notification(body) == [('trail-bucket', 'AWSLogs/111111111111/CloudTrail/my logs/a:b.json.gz')]
+
+
+def test_sns_envelope_is_unwrapped():
+    body = json.dumps({'Type': 'Notification', 'Message': json.dumps(s3_event('log.json.gz'))})
+    assert parse_s3_notification(body) == [('trail-bucket', 'log.json.gz')]
+
+
+def test_eventbridge_object_created():
+    body = json.dumps({'detail-type': 'Object Created',
+                       'detail': {'bucket': {'name': 'trail-bucket'}, 'object': {'key': 'log.json.gz'}}})
+    assert parse_s3_notification(body) == [('trail-bucket', 'log.json.gz')]
+
+
+def test_other_events_announce_nothing():
+    assert parse_s3_notification(json.dumps(s3_event('log.json.gz', 'ObjectRemoved:Delete'))) == []
+    assert parse_s3_notification(json.dumps({'Event': 's3:TestEvent', 'Bucket': 'trail-bucket'})) == []
+    assert parse_s3_notification(json.dumps(['not', 'a', 'notification'])) == []
+
+
+def test_non_json_body_is_rejected():
+    with pytest.raises(ValueError):
+        parse_s3_notification('not json')
@@ -0,0 +1,52 @@
+"""
+Tests for normalizing CloudTrail events.
+"""
+
+from datetime import datetime
+
+import pytest
+
+from scope.aws.parser import NORMALIZED_FIELDS, CloudTrailParser, _parse_cloudtrail_time
+
+
+def strptime(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ')
+    except ValueError:
+        return None
+
+
+@pytest.mark.parametrize('value', [
+    '2024-03-01T10:05:09Z', '1999-12-31T23:59:59Z', '2024-02-29T00:00:00Z',
+    '2023-02-29T00:00:00Z', '2024-03-01T10:00:60Z', '2024-13-01T10:00:00Z',
+    '2024-03-01T10:05:09.123Z', '2024-03-01T10:05:09+00:00', '2024-03-01 10:05:09Z',
+    '2024-+3-01T10:00:00Z', '2024-03-01T 1:00:00Z', '2024-03-01T10:00:0 Z', '2024-03-01T10:05',
+])
+def test_fast_time_parsing_agrees_with_strptime(value):
+    assert CloudTrailParser.parse_datetime(value) == strptime(value)
+    if len(value) == 20:
+        assert _parse_cloudtrail_time(value) == strptime(value)
+
+
+def test_columns_hold_the_values_of_normalized_events():
+    events = [
+        {'eventID': '1', 'eventTime': '2024-03-01T10:00:00Z', 'eventSource': 's3.amazonaws.com',
+         'eventName': 'GetObject', 'awsRegion': 'us-east-1', 'sourceIPAddress': '10.0.0.1',
+         'userIdentity': {'type': 'IAMUser', 'userName': 'alice'},
+         'requestParameters': {'bucketName': 'b'}},
+        {'eventID': '2', 'eventTime': '2024-03-01T10:00:00.5Z', 'sourceIPAddress': 'AWS Internal',
+         'userIdentity': {'type': 'AssumedRole',
+                          'sessionContext': {'sessionIssuer': {'userName': 'role'}}},
+         'resources': [{'ARN': 'arn:aws:s3:::b'}]},
+        {'eventID': '3', 'userIdentity': {}},
+        {'CloudTrailEvent': '{"eventID": "4", "eventName": "ConsoleLogin"}', 'EventId': '4'},
+    ]
+    normalized = CloudTrailParser.batch_normalize_events(events)
+    columns = CloudTrailParser.batch_normalize_columns(events)
+
+    assert list(columns) == list(NORMALIZED_FIELDS)
+    for field in NORMALIZED_FIELDS:
+        assert columns[field] == [event[field] for event in normalized]
+
+    subset = CloudTrailParser.batch_normalize_columns(events, fields=['event_name', 'event_time'])
+    assert subset == {'event_name': columns['event_name'], 'event_time': columns['event_time']}
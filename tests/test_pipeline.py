@@ -0,0 +1,87 @@
+"""
+Tests for the bounded pipeline stages.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from scope.common.pipeline import bounded_map, prefetch
+
+
+def slow_square(value):
+    time.sleep(random.uniform(0, 0.005))
+    return value * value
+
+
+def test_bounded_map_keeps_input_order():
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert list(bounded_map(executor, slow_square, range(100), 8)) == [value * value for value in range(100)]
+
+
+def test_bounded_map_pulls_items_as_results_are_consumed():
+    pulled = []
+
+    def items():
+        for value in range(50):
+            pulled.append(value)
+            yield value
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = bounded_map(executor, slow_square, items(), 4)
+        for consumed in range(1, 11):
+            next(results)
+            assert len(pulled) <= consumed + 4
+        results.close()
+    assert len(pulled) < 50
+
+
+def test_bounded_map_cancels_queued_calls_when_stopped_early():
+    started = []
+    release = threading.Event()
+
+    def blocked(value):
+        started.append(value)
+        if value:
+            release.wait()
+        return value
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = bounded_map(executor, blocked, range(10), 5)
+        assert next(results) == 0
+        while len(started) < 2:
+            time.sleep(0.001)
+        # 1 is running and 2-4 are queued behind it
+        results.close()
+        release.set()
+    assert started == [0, 1]
+
+
+def test_prefetch_runs_ahead_by_a_bounded_number_of_items():
+    produced = []
+
+    def items():
+        for value in range(20):
+            produced.append(value)
+            yield value
+
+    results = prefetch(items(), 3)
+    assert next(results) == 0
+    time.sleep(0.05)
+    # One item consumed, three queued and one waiting to be queued
+    assert len(produced) <= 5
+    assert list(results) == list(range(1, 20))
+
+
+def test_prefetch_raises_producer_errors():
+    def items():
+        yield 1
+        raise RuntimeError('listing failed')
+
+    results = prefetch(items(), 2)
+    assert next(results) == 1
+    with pytest.raises(RuntimeError):
+        next(results)
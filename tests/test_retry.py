@@ -0,0 +1,104 @@
+"""
+Tests for retrying AWS calls and adapting their concurrency.
+"""
+
+import asyncio
+
+import pytest
+from botocore.exceptions import ClientError
+
+from scope.aws.retry import AdaptiveConcurrencyLimiter, RetryPolicy
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'GetObject')
+
+
+class Flaky:
+    """Callable failing with the given errors before returning 'ok'."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def policy(**kwargs):
+    return RetryPolicy(base_delay=0, **kwargs)
+
+
+def test_throttling_and_transient_errors_are_retried():
+    func = Flaky(client_error('SlowDown'), client_error('ThrottlingException'), client_error('503'))
+    assert policy(max_attempts=4).call(func) == 'ok'
+    assert func.calls == 4
+
+
+@pytest.mark.parametrize('code', ['AccessDenied', 'NoSuchKey', '403', 'InvalidRequest'])
+def test_client_errors_are_not_retried(code):
+    func = Flaky(client_error(code))
+    with pytest.raises(ClientError):
+        policy().call(func)
+    assert func.calls == 1
+
+
+def test_last_error_is_raised_once_attempts_run_out():
+    func = Flaky(*[client_error('SlowDown')] * 5)
+    with pytest.raises(ClientError):
+        policy(max_attempts=3).call(func)
+    assert func.calls == 3
+
+
+def test_async_calls_retry_like_sync_calls():
+    func = Flaky(client_error('SlowDown'), client_error('AccessDenied'))
+
+    async def call():
+        return func()
+
+    with pytest.raises(ClientError) as exc:
+        asyncio.run(policy().call_async(call))
+    assert exc.value.response['Error']['Code'] == 'AccessDenied'
+    assert func.calls == 2
+
+
+def test_backoff_is_capped():
+    retry = RetryPolicy(base_delay=1, max_delay=4)
+    assert all(0 <= retry.backoff(attempt) <= min(4, 2 ** (attempt - 1)) for attempt in range(1, 10) for _ in range(20))
+
+
+def test_limiter_halves_on_throttling_and_recovers():
+    limiter = AdaptiveConcurrencyLimiter(8, increase_after=3, cooldown=0)
+    retry = policy(max_attempts=3, limiter=limiter)
+    retry.call(Flaky(client_error('SlowDown')))
+    assert limiter.limit == 4 and limiter.throttles == 1
+
+    for _ in range(3):
+        retry.call(Flaky())
+    assert limiter.limit == 5
+    for _ in range(30):
+        retry.call(Flaky())
+    assert limiter.limit == 8
+    assert limiter.active == 0
+
+
+def test_limiter_counts_a_burst_of_throttles_once():
+    limiter = AdaptiveConcurrencyLimiter(8, min_concurrency=2, cooldown=60)
+    for _ in range(5):
+        limiter.on_throttle()
+    assert limiter.limit == 4 and limiter.throttles == 5
+
+    limiter = AdaptiveConcurrencyLimiter(8, min_concurrency=2, cooldown=0)
+    for _ in range(5):
+        limiter.on_throttle()
+    assert limiter.limit == 2
+
+
+def test_limiter_ignores_other_errors():
+    limiter = AdaptiveConcurrencyLimiter(4, cooldown=0)
+    with pytest.raises(ClientError):
+        policy(limiter=limiter).call(Flaky(client_error('AccessDenied')))
+    assert limiter.limit == 4 and limiter.throttles == 0
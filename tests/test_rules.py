@@ -0,0 +1,159 @@
+"""
+Tests for detection rules: conditions, the dispatch index, rule files and threshold windows.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from scope.aws.rules import Rule, RuleEngine, load_rules
+
+START = datetime(2024, 3, 1, 10, 0)
+
+
+def rule(count=3, window=60, group_by=('username',)):
+    return Rule({'id': 'failed-logins', 'match': {'event_name': 'ConsoleLogin'},
+                 'threshold': {'count': count, 'window': window, 'group_by': list(group_by)}})
+
+
+def event(seconds, username='alice'):
+    return {'event_name': 'ConsoleLogin', 'username': username, 'event_time': START + timedelta(seconds=seconds)}
+
+
+def fired(rule, offsets, username='alice'):
+    return [rule.observe(event(offset, username)) for offset in offsets]
+
+
+def test_threshold_fires_within_window():
+    assert fired(rule(), [0, 20, 40]) == [None, None, (('alice',), 3)]
+
+
+def test_threshold_ignores_events_spread_wider_than_window():
+    assert fired(rule(), [0, 40, 70, 120]) == [None, None, None, None]
+
+
+def test_threshold_counts_late_events_in_their_window():
+    # The event at 10s arrives after one 100s later, and still completes the 0-20s window
+    assert fired(rule(), [0, 100, 20, 10])[-1] == (('alice',), 3)
+
+
+def test_out_of_order_events_outside_window_do_not_fire():
+    assert fired(rule(), [100, 0, 50, 170]) == [None, None, None, None]
+
+
+def test_groups_are_counted_separately():
+    r = rule()
+    assert fired(r, [0, 10], 'alice') == [None, None]
+    assert fired(r, [20], 'bob') == [None]
+    assert fired(r, [30], 'alice') == [(('alice',), 3)]
+
+
+def test_group_count_starts_over_after_firing():
+    assert fired(rule(count=2), [0, 1, 2, 3]) == [None, (('alice',), 2), None, (('alice',), 2)]
+
+
+def test_evict_drops_times_before_the_window():
+    r = rule(window=30)
+    fired(r, [0, 10, 50])
+    r.evict((START + timedelta(seconds=55)).timestamp())
+    assert r.groups[('alice',)] == [(START + timedelta(seconds=50)).timestamp()]
+    r.evict((START + timedelta(seconds=200)).timestamp())
+    assert not r.groups
+
+
+def test_engine_fires_on_unordered_batch():
+    engine = RuleEngine([{'id': 'burst', 'match': {'event_name': 'ConsoleLogin'},
+                          'threshold': {'count': 3, 'window': 60, 'group_by': ['username']}}])
+    engine.process([event(300), event(30), event(0), event(10)])
+    engine.close()
+    assert engine.alerts['burst'] == 1
+
+
+def matches(condition, value, field='source_ip'):
+    return Rule({'id': 'r', 'match': {field: condition}}).matches({field: value})
+
+
+def test_regex_condition():
+    assert matches({'regex': '^Delete'}, 'DeleteTrail', field='error_code')
+    assert not matches({'regex': '^Delete'}, 'StopDelete', field='error_code')
+    assert not matches({'regex': '.*'}, None, field='error_code')
+
+
+def test_cidr_condition():
+    assert matches({'cidr': ['10.0.0.0/8', '2001:db8::/32']}, '10.1.2.3')
+    assert matches({'cidr': '2001:db8::/32'}, '2001:db8::1')
+    assert not matches({'cidr': '10.0.0.0/8'}, '192.168.0.1')
+    assert not matches({'cidr': '10.0.0.0/8'}, 'AWS Internal')
+
+
+def test_exists_and_not_conditions():
+    assert matches({'exists': True}, 'x') and not matches({'exists': True}, None)
+    assert matches({'exists': False}, None)
+    assert matches({'not': {'in': ['1.1.1.1', '8.8.8.8']}}, '9.9.9.9')
+    assert not matches({'not': {'cidr': '10.0.0.0/8'}}, '10.0.0.1')
+
+
+def test_list_conditions_do_not_match_unhashable_values():
+    assert not matches(['a', 'b'], {'key': 'a'}, field='raw_data')
+    assert not matches({'in': ['a', 'b']}, ['a'], field='raw_data')
+    assert matches({'not': {'in': ['a']}}, ['a'], field='raw_data')
+
+
+def test_candidates_come_from_the_index():
+    engine = RuleEngine([
+        {'id': 'pair', 'match': {'event_source': 'signin.amazonaws.com', 'event_name': 'ConsoleLogin'}},
+        {'id': 'source', 'match': {'event_source': ['s3.amazonaws.com']}},
+        {'id': 'name', 'match': {'event_name': {'in': ['ConsoleLogin', 'GetObject']}}},
+        {'id': 'unindexed', 'match': {'username': 'root'}},
+        {'id': 'regex-name', 'match': {'event_name': {'regex': '^Delete'}}},
+    ])
+
+    def ids(event_source, event_name):
+        return [rule.id for rule in engine.candidates(event_source, event_name)]
+
+    assert ids('signin.amazonaws.com', 'ConsoleLogin') == ['pair', 'name', 'unindexed', 'regex-name']
+    assert ids('s3.amazonaws.com', 'GetObject') == ['source', 'name', 'unindexed', 'regex-name']
+    assert ids('iam.amazonaws.com', 'CreateUser') == ['unindexed', 'regex-name']
+
+
+def test_unindexed_rules_still_apply():
+    engine = RuleEngine([
+        {'id': 'root', 'match': {'username': 'root'}},
+        {'id': 'deletes', 'match': {'event_name': {'regex': '^Delete'}}},
+        {'id': 'logins', 'match': {'event_name': 'ConsoleLogin'}},
+    ])
+    engine.process([
+        {'event_source': 'iam.amazonaws.com', 'event_name': 'CreateUser', 'username': 'root'},
+        {'event_source': 's3.amazonaws.com', 'event_name': 'DeleteBucket', 'username': 'alice'},
+        {'event_source': 'cloudtrail.amazonaws.com', 'event_name': 'DeleteTrail', 'username': 'root'},
+    ])
+    engine.close()
+    assert engine.alerts == {'root': 2, 'deletes': 2}
+
+
+def test_load_rules_from_directory(tmp_path):
+    (tmp_path / 'a.json').write_text(json.dumps({'rules': [{'id': 'a', 'match': {'event_name': 'A'}}]}))
+    (tmp_path / 'b.json').write_text(json.dumps([{'id': 'b', 'match': {'event_name': 'B'}}]))
+    (tmp_path / 'notes.txt').write_text('not a rule file')
+    assert [definition['id'] for definition in load_rules([str(tmp_path)])] == ['a', 'b']
+
+
+def test_load_rules_rejects_files_without_a_list(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps({'id': 'a'}))
+    with pytest.raises(ValueError):
+        load_rules([str(path)])
+
+
+@pytest.mark.parametrize('definitions', [
+    [{'id': 'a', 'match': {'event_name': 'A'}}, {'id': 'a', 'match': {'event_name': 'B'}}],
+    [{'id': 'a', 'severity': 'urgent', 'match': {'event_name': 'A'}}],
+    [{'match': {'event_name': 'A'}}],
+    [{'id': 'a', 'match': {'event_name': {'equals': 'A', 'in': ['B']}}}],
+    [{'id': 'a', 'match': {'error_code': {'regex': '('}}}],
+    [{'id': 'a', 'match': {'event_name': 'A'}, 'threshold': {'count': 'many'}}],
+])
+def test_invalid_rules_are_rejected(definitions):
+    with pytest.raises(ValueError):
+        RuleEngine(definitions)
@@ -0,0 +1,59 @@
+"""
+Tests for the S3 Select fallback of the S3 collector.
+"""
+
+import gzip
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+moto = pytest.importorskip('moto')
+
+from scope.aws.collector import AWSLogCollector
+
+BUCKET = 'trail-bucket'
+ACCOUNTS = ('111111111111', '222222222222')
+
+
+def put_log(s3, account_id, suffix, names):
+    key = (f"AWSLogs/{account_id}/CloudTrail/us-east-1/2024/03/01/"
+           f"{account_id}_CloudTrail_us-east-1_20240301T1000Z_{suffix}.json.gz")
+    records = [{'eventVersion': '1.08', 'eventID': f"{account_id}-{i}", 'eventName': name,
+                'eventSource': 's3.amazonaws.com', 'eventTime': '2024-03-01T10:00:00Z',
+                'awsRegion': 'us-east-1', 'recipientAccountId': account_id}
+               for i, name in enumerate(names)]
+    s3.put_object(Bucket=BUCKET, Key=key, Body=gzip.compress(json.dumps({'Records': records}).encode()))
+
+
+def test_select_refusal_only_disables_select_for_that_prefix(monkeypatch):
+    selected = []
+
+    def fake_select(self, s3, bucket_name, key, region, filters):
+        # moto can't evaluate S3Object[*].Records[*], so answer for it
+        selected.append(key)
+        if key.startswith(f"AWSLogs/{ACCOUNTS[0]}/"):
+            raise ClientError({'Error': {'Code': 'AccessDenied'}}, 'SelectObjectContent')
+        body = gzip.decompress(s3.get_object(Bucket=bucket_name, Key=key)['Body'].read())
+        records = [r for r in json.loads(body)['Records'] if r['eventName'] in filters['eventName']]
+        return records, len(body)
+
+    monkeypatch.setattr(AWSLogCollector, '_select_s3_log', fake_select)
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket=BUCKET)
+        for account_id in ACCOUNTS:
+            put_log(s3, account_id, 'a', ['GetObject', 'PutObject', 'GetObject'])
+            put_log(s3, account_id, 'b', ['ListBuckets'])
+
+        collector = AWSLogCollector(region='us-east-1')
+        batches = collector.collect_from_s3(BUCKET, start_date='2024-03-01', end_date='2024-03-01',
+                                            accounts=list(ACCOUNTS), event_names=['GetObject'],
+                                            use_s3_select=True, max_workers=1)
+        events = [event for batch in batches for event in batch]
+
+    assert sorted(e['eventID'] for e in events) == sorted(
+        f"{a}-{i}" for a in ACCOUNTS for i in (0, 2))
+    # The refused account fell back to downloading; the other one kept using Select
+    assert any(k.startswith(f"AWSLogs/{ACCOUNTS[1]}/") for k in selected)
@@ -0,0 +1,80 @@
+"""
+Tests for reconstructing sessions from CloudTrail events.
+"""
+
+import json
+from datetime import datetime, timedelta
+
+from scope.aws.sessions import SessionTracker
+
+START = datetime(2024, 3, 1, 10, 0)
+
+
+def event(minutes, key='AKIA1', ip='198.51.100.1', name='GetObject', error=None):
+    raw = {'userIdentity': {'type': 'IAMUser', 'userName': f"user-{key}", 'accessKeyId': key,
+                            'arn': f"arn:aws:iam::111111111111:user/user-{key}"},
+           'sourceIPAddress': ip}
+    if error:
+        raw['errorCode'] = error
+    return {'event_time': START + timedelta(minutes=minutes), 'event_name': name, 'source_ip': ip,
+            'aws_region': 'us-east-1', 'user_agent': 'aws-cli', 'raw_data': raw}
+
+
+def sessions(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_pause_longer_than_timeout_starts_a_new_session(tmp_path):
+    path = str(tmp_path / 'sessions.jsonl')
+    tracker = SessionTracker(path, idle_timeout=1800)
+    events = [event(0), event(20, error='AccessDenied'), event(45, name='PutObject'), event(90), event(100)]
+    assert tracker.process(events) is events
+    tracker.close()
+
+    first, second = sessions(path)
+    assert (first['first_event_time'], first['last_event_time']) == ('2024-03-01T10:00:00', '2024-03-01T10:45:00')
+    assert first['events'] == 3 and first['errors'] == 1 and first['duration_seconds'] == 45 * 60
+    assert first['event_names'] == {'GetObject': 2, 'PutObject': 1}
+    assert first['access_key_id'] == 'AKIA1' and first['source_ip'] == '198.51.100.1'
+    assert second['events'] == 2 and second['first_event_time'] == '2024-03-01T11:30:00'
+
+
+def test_credentials_and_source_ips_have_separate_sessions(tmp_path):
+    path = str(tmp_path / 'sessions.jsonl')
+    tracker = SessionTracker(path)
+    tracker.process([event(0), event(1, key='AKIA2'), event(2, ip='203.0.113.9'), event(3)])
+    tracker.close()
+    assert sorted((s['access_key_id'], s['source_ip'], s['events']) for s in sessions(path)) == [
+        ('AKIA1', '198.51.100.1', 2), ('AKIA1', '203.0.113.9', 1), ('AKIA2', '198.51.100.1', 1)]
+
+
+def test_idle_sessions_are_closed_as_time_advances(tmp_path):
+    tracker = SessionTracker(str(tmp_path / 'sessions.jsonl'), idle_timeout=600)
+    tracker.process([event(0, key='AKIA1'), event(5, key='AKIA2')])
+    assert tracker.closed == 0
+    tracker.process([event(14, key='AKIA3')])
+    assert tracker.closed == 1
+    assert [key[0] for key in tracker.sessions] == ['AKIA2', 'AKIA3']
+    tracker.close()
+
+
+def test_least_recently_active_sessions_are_evicted_beyond_max_sessions(tmp_path):
+    path = str(tmp_path / 'sessions.jsonl')
+    tracker = SessionTracker(path, max_sessions=2)
+    tracker.process([event(0, key='AKIA1'), event(1, key='AKIA2'), event(2, key='AKIA1'), event(3, key='AKIA3')])
+    assert tracker.forced == 1
+    assert [key[0] for key in tracker.sessions] == ['AKIA1', 'AKIA3']
+    tracker.close()
+    assert [s['access_key_id'] for s in sessions(path)] == ['AKIA2', 'AKIA1', 'AKIA3']
+
+
+def test_events_without_time_are_skipped(tmp_path):
+    path = str(tmp_path / 'sessions.jsonl')
+    tracker = SessionTracker(path)
+    untimed = event(0)
+    untimed['event_time'] = None
+    tracker.process([untimed, event(1)])
+    tracker.close()
+    assert tracker.untimed == 1
+    assert [s['events'] for s in sessions(path)] == [1]
@@ -0,0 +1,83 @@
+"""
+Tests for the error bounds of the stream sketches.
+"""
+
+import random
+from collections import Counter
+
+import pytest
+
+from scope.common.sketches import BloomFilter, HyperLogLog, SpaceSaving
+
+
+def skewed_stream(length, distinct, seed=7):
+    rng = random.Random(seed)
+    weights = [1.0 / rank for rank in range(1, distinct + 1)]
+    return rng.choices([f"item-{i}" for i in range(distinct)], weights=weights, k=length)
+
+
+def test_space_saving_is_exact_below_capacity():
+    stream = skewed_stream(5000, 50)
+    sketch = SpaceSaving(capacity=100)
+    for start in range(0, len(stream), 700):
+        sketch.update(stream[start:start + 700])
+
+    assert sketch.total == len(stream)
+    assert sketch.top(50) == [(item, count, 0) for item, count in Counter(stream).most_common(50)]
+
+
+def test_space_saving_error_bounds():
+    stream = skewed_stream(50000, 5000)
+    true_counts = Counter(stream)
+    sketch = SpaceSaving(capacity=200)
+    for start in range(0, len(stream), 1000):
+        sketch.update(stream[start:start + 1000] + [None])
+
+    assert sketch.total == len(stream)
+    for item, count, error in sketch.top(200):
+        assert count - error <= true_counts[item] <= count
+    # Every item more frequent than total / capacity is tracked
+    for item, count in true_counts.items():
+        if count > sketch.total / sketch.capacity:
+            assert item in sketch.counts
+    assert [item for item, _, _ in sketch.top(3)] == [item for item, _ in true_counts.most_common(3)]
+
+
+@pytest.mark.parametrize('distinct', [10, 1000, 50000])
+def test_hyperloglog_relative_error(distinct):
+    sketch = HyperLogLog()
+    items = [f"10.0.{i // 256}.{i % 256}-{i}" for i in range(distinct)]
+    for start in range(0, distinct, 5000):
+        # Duplicates don't change the estimate
+        sketch.update(items[start:start + 5000] * 2)
+
+    # Typical error is 1.04 / sqrt(2 ** 14), about 0.8%; allow four standard errors
+    assert abs(sketch.count() - distinct) <= max(1, 0.033 * distinct)
+
+
+def test_hyperloglog_merge_estimates_the_union():
+    left, right, union = HyperLogLog(precision=12), HyperLogLog(precision=12), HyperLogLog(precision=12)
+    left.update(range(0, 6000))
+    right.update(range(4000, 10000))
+    union.update(range(0, 10000))
+    left.merge(right)
+    assert left.registers == union.registers
+
+    with pytest.raises(ValueError):
+        left.merge(HyperLogLog(precision=10))
+    with pytest.raises(ValueError):
+        HyperLogLog(precision=3)
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    members = [f"AKIA{i:016d}" for i in range(5000)]
+    bloom = BloomFilter.from_items(members + [None], error_rate=0.01)
+    assert all(member in bloom for member in members)
+
+    probes = 20000
+    false_positives = sum(f"ASIA{i:016d}" in bloom for i in range(probes))
+    assert false_positives / probes < 0.02
+
+    restored = BloomFilter.from_dict(bloom.to_dict())
+    assert all(member in restored for member in members)
+    assert sum(f"ASIA{i:016d}" in restored for i in range(probes)) == false_positives
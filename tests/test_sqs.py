@@ -0,0 +1,105 @@
+"""
+Tests for collecting the log files announced on an SQS queue.
+"""
+
+import gzip
+import json
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+
+moto = pytest.importorskip('moto')
+
+from scope.aws import collector as collector_module
+from scope.aws.collector import AWSLogCollector
+
+LOG_PREFIX = 'AWSLogs/111111111111/CloudTrail/us-east-1/2024/03/01/'
+
+
+def log_key(name):
+    return f"{LOG_PREFIX}111111111111_CloudTrail_us-east-1_20240301T1000Z_{name}.json.gz"
+
+
+def notification(key):
+    return json.dumps({'Records': [{'eventName': 'ObjectCreated:Put',
+                                    's3': {'bucket': {'name': 'trail-bucket'}, 'object': {'key': key}}}]})
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    """Queue and bucket, recording the keys the collector downloads."""
+    fetched = []
+    download = AWSLogCollector._download_s3_object
+
+    def recording_download(self, s3, bucket_name, key, policy=None):
+        fetched.append(key)
+        return download(self, s3, bucket_name, key, policy)
+    monkeypatch.setattr(AWSLogCollector, '_download_s3_object', recording_download)
+
+    with moto.mock_aws():
+        s3 = boto3.client('s3', region_name='us-east-1')
+        s3.create_bucket(Bucket='trail-bucket')
+        sqs = boto3.client('sqs', region_name='us-east-1')
+        url = sqs.create_queue(QueueName='cloudtrail-logs')['QueueUrl']
+        yield s3, sqs, url, fetched
+
+
+def put_log(s3, name, count):
+    records = [{'eventID': f"{name}-{i}", 'eventName': 'GetObject'} for i in range(count)]
+    s3.put_object(Bucket='trail-bucket', Key=log_key(name), Body=gzip.compress(json.dumps({'Records': records}).encode()))
+    return log_key(name)
+
+
+def queue_counts(sqs, url):
+    attributes = sqs.get_queue_attributes(QueueUrl=url, AttributeNames=['All'])['Attributes']
+    return int(attributes['ApproximateNumberOfMessages']), int(attributes['ApproximateNumberOfMessagesNotVisible'])
+
+
+def test_messages_are_deleted_only_when_their_files_were_collected(queue):
+    s3, sqs, url, fetched = queue
+    good = put_log(s3, 'good', 3)
+    digest = 'AWSLogs/111111111111/CloudTrail-Digest/us-east-1/2024/03/01/digest_20240301T100000Z.json.gz'
+    for key in (good, log_key('missing'), digest, 'AWSLogs/111111111111/readme.txt'):
+        sqs.send_message(QueueUrl=url, MessageBody=notification(key))
+
+    batches = AWSLogCollector(region='us-east-1').consume_sqs(url, wait_time=0, visibility_timeout=30,
+                                                              stop_when_empty=True)
+    events = [event for batch in batches for event in batch]
+
+    assert sorted(event['eventID'] for event in events) == ['good-0', 'good-1', 'good-2']
+    # Digests and other objects are acknowledged without being fetched
+    assert sorted(fetched) == sorted([good, log_key('missing')])
+    # Only the message of the file that could not be collected is left, hidden until its timeout
+    assert queue_counts(sqs, url) == (0, 1)
+
+
+def test_failed_receive_is_retried(queue, monkeypatch):
+    s3, sqs, url, _ = queue
+    sqs.send_message(QueueUrl=url, MessageBody=notification(put_log(s3, 'good', 2)))
+
+    failures = ['AccessDenied']
+    original_client = boto3.session.Session.client
+
+    def client(self, service_name, *args, **kwargs):
+        sqs_client = original_client(self, service_name, *args, **kwargs)
+        if service_name == 'sqs':
+            receive_message = sqs_client.receive_message
+
+            def flaky_receive_message(**params):
+                if failures:
+                    raise ClientError({'Error': {'Code': failures.pop()}}, 'ReceiveMessage')
+                return receive_message(**params)
+            sqs_client.receive_message = flaky_receive_message
+        return sqs_client
+    monkeypatch.setattr(boto3.session.Session, 'client', client)
+    delays = []
+    monkeypatch.setattr(collector_module.time, 'sleep', delays.append)
+
+    # Without stop_when_empty the consumer runs until the generator is closed
+    batches = AWSLogCollector(region='us-east-1').consume_sqs(url, wait_time=0)
+    batch = next(batches)
+    batches.close()
+
+    assert [event['eventID'] for event in batch] == ['good-0', 'good-1']
+    assert delays == [2]
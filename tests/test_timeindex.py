@@ -0,0 +1,90 @@
+"""
+Tests for the timestamp index and slicing timelines by time.
+"""
+
+import io
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from scope.aws.timeindex import TimestampIndex, parse_time_bound, slice_timeline
+from scope.aws.timeline import CSVTimelineWriter, NDJSONWriter
+
+START = datetime(2024, 3, 1, 10, 0)
+
+
+def events(minutes):
+    return [{'event_id': str(minute), 'event_name': 'GetObject', 'event_time': START + timedelta(minutes=minute)}
+            for minute in minutes]
+
+
+def test_parse_time_bound():
+    assert parse_time_bound('2024-03-01') == '2024-03-01T00:00:00'
+    assert parse_time_bound('2024-03-01 10:30') == '2024-03-01T10:30:00'
+    assert parse_time_bound('2024-03-01T10:30:15Z') == '2024-03-01T10:30:15'
+    with pytest.raises(ValueError):
+        parse_time_bound('March 1st')
+
+
+def test_block_ranges_selects_overlapping_blocks():
+    index = TimestampIndex('timeline.csv', 'csv')
+    index.data_end = 300
+    index.blocks = [
+        [0, 2, 2, '2024-03-01T10:00:00', '2024-03-01T10:10:00'],
+        [100, 2, 2, '2024-03-01T10:20:00', '2024-03-01T10:30:00'],
+        [200, 2, 1, '2024-03-01T10:40:00', '2024-03-01T10:40:00'],
+    ]
+
+    assert index.block_ranges() == [(0, 100, 2, True), (100, 200, 2, True), (200, 300, 2, False)]
+    # The end bound is exclusive
+    assert index.block_ranges('2024-03-01T10:05:00', '2024-03-01T10:20:00') == [(0, 100, 2, False)]
+    assert index.block_ranges('2024-03-01T10:05:00', '2024-03-01T10:20:01') == [(0, 100, 2, False),
+                                                                               (100, 200, 2, False)]
+    assert index.block_ranges('2024-03-01T10:20:00', '2024-03-01T10:31:00') == [(100, 200, 2, True)]
+    assert index.block_ranges('2024-03-01T11:00:00') == []
+
+
+def test_block_ranges_of_scanned_file_cover_everything():
+    index = TimestampIndex('timeline.csv', 'csv')
+    index.data_end = 50
+    index.blocks = [[10, None, None, None, None]]
+    assert index.block_ranges('2024-03-01T10:00:00', '2024-03-01T11:00:00') == [(10, 50, None, False)]
+
+
+def test_slice_indexed_csv(tmp_path):
+    path = str(tmp_path / 'timeline.csv')
+    with CSVTimelineWriter(path, index=True) as writer:
+        writer.write(events(range(0, 10)))
+        # Streamed batches need not be in time order
+        writer.write(events([50, 30, 40]))
+
+    output = io.BytesIO()
+    count = slice_timeline(path, '2024-03-01T10:05:00', '2024-03-01T10:40:00', output)
+    lines = output.getvalue().decode('utf-8').splitlines()
+
+    assert count == 6
+    assert lines[0].startswith('event_time,')
+    assert sorted(line.split(',')[0] for line in lines[1:]) == [
+        (START + timedelta(minutes=minute)).isoformat() for minute in (5, 6, 7, 8, 9, 30)]
+
+
+def test_slice_indexed_compressed_ndjson(tmp_path):
+    path = str(tmp_path / 'timeline.ndjson.gz')
+    with NDJSONWriter(path, compression='gzip', index=True) as writer:
+        writer.write(events(range(0, 5)))
+        writer.write(events(range(5, 10)))
+
+    output = io.BytesIO()
+    count = slice_timeline(path, '2024-03-01T10:03:00', '2024-03-01T10:07:00', output)
+    assert count == 4
+    assert [json.loads(line)['event_id'] for line in output.getvalue().splitlines()] == ['3', '4', '5', '6']
+
+
+def test_slice_unindexed_file_scans_it(tmp_path):
+    path = tmp_path / 'timeline.ndjson'
+    path.write_text(''.join(json.dumps({'event_id': event['event_id'], 'event_time': event['event_time'].isoformat()}) + '\n'
+                            for event in events(range(5))))
+
+    output = io.BytesIO()
+    assert slice_timeline(str(path), '2024-03-01T10:02:00', None, output) == 3
@@ -0,0 +1,104 @@
+"""
+Tests for the streaming timeline writers.
+"""
+
+import csv
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+from scope.aws.timeline import (CSV_CHUNK_ROWS, AWSTimeline, CSVTimelineWriter, NDJSONWriter,
+                                PartitionedTimelineWriter, TimelineWriter)
+
+
+def events(count, start=0):
+    return [{'event_id': str(i), 'event_name': 'GetObject', 'event_time': datetime(2024, 3, 1, 10, i % 60)}
+            for i in range(start, start + count)]
+
+
+def test_writer_without_write_cannot_be_instantiated():
+    class Incomplete(TimelineWriter):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete('out.csv')
+
+
+def test_csv_append_keeps_a_single_header(tmp_path):
+    path = str(tmp_path / 'timeline.csv')
+    with CSVTimelineWriter(path) as writer:
+        writer.write(events(2))
+    with CSVTimelineWriter(path, append=True) as writer:
+        writer.write(events(3, start=2))
+
+    lines = open(path).read().splitlines()
+    assert len(lines) == 6
+    assert lines[0].startswith('event_time')
+    assert not any(line.startswith('event_time') for line in lines[1:])
+
+
+def test_ndjson_gzip_output_is_readable_after_each_batch(tmp_path):
+    path = str(tmp_path / 'timeline.ndjson.gz')
+    writer = NDJSONWriter(path, compression='gzip')
+    writer.write(events(2))
+    assert len(gzip.open(path).read().splitlines()) == 2
+    writer.write(events(2, start=2))
+    writer.close()
+
+    lines = [json.loads(line) for line in gzip.open(path).read().splitlines()]
+    assert [line['event_id'] for line in lines] == ['0', '1', '2', '3']
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'json'])
+def test_partitions_refuse_compression_of_csv_and_json_parts(tmp_path, output_format):
+    with pytest.raises(ValueError):
+        PartitionedTimelineWriter(str(tmp_path / 'timeline'), output_format, compression='gzip')
+
+
+def test_partitions_compress_ndjson_parts(tmp_path):
+    output = tmp_path / 'timeline'
+    with PartitionedTimelineWriter(str(output), 'ndjson', compression='gzip') as writer:
+        writer.write(events(3))
+
+    lines = gzip.open(str(output / 'date=2024-03-01' / 'part-0000.ndjson.gz')).read().splitlines()
+    assert len(lines) == 3
+
+
+def dict_writer_csv(path, events, fields):
+    # The CSV export before rows were serialized in chunks
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=fields, extrasaction='ignore')
+        writer.writeheader()
+        for event in events:
+            row = event.copy()
+            if row.get('event_time') and isinstance(row['event_time'], datetime):
+                row['event_time'] = row['event_time'].isoformat()
+            for key, value in row.items():
+                if isinstance(value, (dict, list)):
+                    row[key] = json.dumps(value)
+            writer.writerow(row)
+
+
+@pytest.mark.parametrize('count', [0, 1, CSV_CHUNK_ROWS, CSV_CHUNK_ROWS + 7])
+def test_csv_export_matches_dict_writer_output(tmp_path, count):
+    odd_values = ['plain', 'comma, quoted', 'say "hi"', 'line\nbreak', 'ünïcode', '', None, 42, 1.5]
+    timeline = AWSTimeline([])
+    timeline.events = [
+        {'event_id': str(i), 'event_time': datetime(2024, 3, 1, 10, i % 60, i % 60, i % 7 * 1000) if i % 5 else None,
+         'event_name': odd_values[i % len(odd_values)], 'username': odd_values[(i + 3) % len(odd_values)],
+         'resources': [{'ARN': f"arn:aws:s3:::bucket-{i}", 'type': 'AWS::S3::Bucket'}] if i % 2 else [],
+         'raw_data': {'eventID': str(i), 'requestParameters': {'key': odd_values[i % len(odd_values)]}},
+         'not_a_column': 'ignored'}
+        for i in range(count)
+    ]
+    fields = list(timeline.csv_fields) + ['raw_data']
+    # An event missing most fields
+    timeline.events.append({'event_id': 'sparse', 'event_time': None})
+
+    timeline.sort_events()
+    dict_writer_csv(str(tmp_path / 'expected.csv'), timeline.events, fields)
+    timeline.export_csv(str(tmp_path / 'timeline.csv'), fields=fields)
+
+    assert (tmp_path / 'timeline.csv').read_bytes() == (tmp_path / 'expected.csv').read_bytes()